@@ -1,3 +1,4 @@
+from . import caching
 from . import containers
 from .containers import *
 from . import optical_flow
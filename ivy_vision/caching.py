@@ -0,0 +1,83 @@
+"""
+Collection of Caching Utilities, shared by the modules which memoize constant arrays
+"""
+
+# global
+import numpy as _np
+from collections import OrderedDict as _OrderedDict
+
+
+class LRUCache:
+    """
+    Least-recently-used cache with a bounded number of entries, which also counts hits and misses.
+    """
+
+    def __init__(self, max_size):
+        self._entries = _OrderedDict()
+        self._max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def resize(self, max_size):
+        self._max_size = max_size
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'max_size': self._max_size}
+
+
+def broadcast_to_batch(x, batch_shape, f):
+    """
+    Broadcast a cached array to the leading batch shape. Numpy arrays are broadcast as read-only views, other
+    frameworks tile.
+
+    :param x: Array to broadcast *[dims]*
+    :type x: array
+    :param batch_shape: Shape of batch.
+    :type batch_shape: sequence of ints
+    :param f: Machine learning framework.
+    :type f: ml_framework
+    :return: Broadcast array *[batch_shape,dims]*
+    """
+    if isinstance(x, _np.ndarray):
+        return _np.broadcast_to(x, list(batch_shape) + list(x.shape))
+    num_dims = len(x.shape)
+    return f.tile(f.reshape(x, [1] * len(batch_shape) + list(x.shape)), list(batch_shape) + [1] * num_dims)
+
+
+def is_concrete(x, f):
+    """
+    Determine whether an array holds concrete values. Symbolic graph tensors cannot be converted to numpy, and must
+    not outlive the graph they were built in, so only concrete arrays may be cached.
+
+    :param x: Array to check.
+    :type x: array
+    :param f: Machine learning framework.
+    :type f: ml_framework
+    :return: Whether the array is concrete.
+    """
+    try:
+        f.to_numpy(x)
+        return True
+    except Exception:
+        return False
@@ -1,4 +1,7 @@
 # global
+import numpy as _np
+from operator import mul as _mul
+from functools import reduce as _reduce
 try:
     import tensorflow as _tf
 except (ModuleNotFoundError, ImportError):
@@ -35,6 +38,9 @@ class PrimitiveScene(_Container):
         :type f: ml_framework, optional
         """
         self._f = _get_framework([sphere_positions, sphere_radii, cuboid_ext_mats, cuboid_dims], f=f)
+        self._baked_sdf_grid = None
+        self._baked_sdf_lower_corner = None
+        self._baked_sdf_res = None
         self['sphere_positions'] = sphere_positions
         self['sphere_radii'] = sphere_radii
         self['cuboid_ext_mats'] = cuboid_ext_mats
@@ -98,6 +104,61 @@ class PrimitiveScene(_Container):
         cuboid_dims = f.ones(batch_shape + [3])
         return __class__(sphere_positions, sphere_radii, cuboid_ext_mats, cuboid_dims)
 
+    # Built-Ins #
+    # ----------#
+
+    def __setitem__(self, key, value):
+        self.invalidate_baked_sdf()
+        super().__setitem__(key, value)
+
+    # Private Methods #
+    # ----------------#
+
+    def _chunked_sdf(self, query_positions, memory_budget):
+
+        f = self._f
+
+        # shapes as list
+        batch_shape = list(query_positions.shape[:-2])
+        num_points = query_positions.shape[-2]
+
+        # primitive evaluators, each taking a primitive slice, and returning BS x NPC x 1
+        primitive_evaluators = list()
+        if self.sphere_positions is not None:
+            primitive_evaluators.append((self.sphere_positions.shape[-3], lambda prim_slc, points: (
+                ivy_sdf.sphere_signed_distances(self.sphere_positions[..., prim_slc, 0:3, -1],
+                                                self.sphere_radii[..., prim_slc, :], points))))
+        if self.cuboid_ext_mats is not None:
+            primitive_evaluators.append((self.cuboid_ext_mats.shape[-3], lambda prim_slc, points: (
+                ivy_sdf.cuboid_signed_distances(self.cuboid_ext_mats[..., prim_slc, :, :],
+                                                self.cuboid_dims[..., prim_slc, :], points))))
+
+        # the largest intermediates, for cuboids, hold up to 16 floats per primitive and point
+        bytes_per_pair = 4 * 16 * _reduce(_mul, batch_shape, 1)
+        num_pairs = max(int(memory_budget // bytes_per_pair), 1)
+
+        # chunk over the primitives only once all points fit inside the budget
+        max_num_prims = max([num_prims for num_prims, _ in primitive_evaluators])
+        prim_chunk_size = min(max_num_prims, max(num_pairs // num_points, 1))
+        point_chunk_size = min(num_points, max(num_pairs // prim_chunk_size, 1))
+
+        # BS x NP x 1
+        sdfs_list = list()
+        for point_start in range(0, num_points, point_chunk_size):
+
+            # BS x NPC x 3
+            points = query_positions[..., point_start:point_start + point_chunk_size, :]
+
+            # BS x NPC x 1
+            running_min = None
+            for num_prims, evaluator in primitive_evaluators:
+                for prim_start in range(0, num_prims, prim_chunk_size):
+                    chunk_sdfs = evaluator(slice(prim_start, prim_start + prim_chunk_size), points)
+                    running_min = chunk_sdfs if running_min is None else f.minimum(running_min, chunk_sdfs)
+            sdfs_list.append(running_min)
+
+        return f.concatenate(sdfs_list, -2) if len(sdfs_list) > 1 else sdfs_list[0]
+
     # Public Methods #
     # ---------------#
 
@@ -111,20 +172,28 @@ class PrimitiveScene(_Container):
         :type primitive_scene: Intrinsics
         :return: PrimitiveScene object, after setting desired slice.
         """
+        self.invalidate_baked_sdf()
         self.sphere_positions[slice_obj] = primitive_scene.sphere_positions
         self.sphere_radii[slice_obj] = primitive_scene.sphere_radii
         self.cuboid_ext_mats[slice_obj] = primitive_scene.cuboid_ext_mats
         self.cuboid_dims[slice_obj] = primitive_scene.cuboid_dims
 
-    def sdf(self, query_positions):
+    def sdf(self, query_positions, memory_budget=None):
         """
-        Return signed distance function for the scene
+        Return signed distance function for the scene. If a memory budget is given, the query points and primitives
+        are tiled into chunks, such that the primitives x points intermediates of each chunk fit inside the budget,
+        and a running minimum is kept across the primitive chunks.
 
         :param query_positions: Point for which to query the signed distance *[batch_shape,num_points,3]*
         :type query_positions: array
+        :param memory_budget: Memory budget (bytes) for the intermediates of each chunk. Evaluated in one pass if None.
+        :type memory_budget: int, optional
         :return: The signed distance values for each of the query points in the scene *[batch_shape,num_points,1]*
         """
 
+        if memory_budget is not None:
+            return self._chunked_sdf(query_positions, memory_budget)
+
         # BS x NP x 1
         all_sdfs_list = list()
         if self.sphere_positions is not None:
@@ -138,6 +207,113 @@ class PrimitiveScene(_Container):
         sdfs_concatted = self._f.concatenate(all_sdfs_list, -1) if len(all_sdfs_list) > 1 else all_sdfs_list[0]
         return self._f.reduce_min(sdfs_concatted, -1, keepdims=True)
 
+    def sdf_with_gradients(self, query_positions):
+        """
+        Return signed distance function for the scene, together with the analytic gradients of the signed distances,
+        and the indices of the closest primitives, all from a single evaluation. Primitive indices count the spheres
+        first, followed by the cuboids.
+
+        :param query_positions: Point for which to query the signed distance *[batch_shape,num_points,3]*
+        :type query_positions: array
+        :return: The signed distance values for each of the query points in the scene *[batch_shape,num_points,1]*,
+                 the gradients of these distances *[batch_shape,num_points,3]*, and the closest primitive indices
+                 *[batch_shape,num_points,1]*
+        """
+
+        f = self._f
+
+        # BS x NP x 1,    BS x NP x 3,    BS x NP x 1
+        results = list()
+        num_spheres = 0
+        if self.sphere_positions is not None:
+            results.append(ivy_sdf.sphere_signed_distances_with_gradients(
+                self.sphere_positions[..., 0:3, -1], self.sphere_radii, query_positions))
+            num_spheres = self.sphere_positions.shape[-3]
+        if self.cuboid_ext_mats is not None:
+            cuboid_sdfs, cuboid_gradients, cuboid_indices = ivy_sdf.cuboid_signed_distances_with_gradients(
+                self.cuboid_ext_mats, self.cuboid_dims, query_positions)
+            results.append((cuboid_sdfs, cuboid_gradients, cuboid_indices + num_spheres))
+        if len(results) == 1:
+            return results[0]
+        (sphere_sdfs, sphere_gradients, sphere_indices), (cuboid_sdfs, cuboid_gradients, cuboid_indices) = results
+
+        # BS x NP x 1
+        sphere_closest = sphere_sdfs <= cuboid_sdfs
+
+        # BS x NP x 1,    BS x NP x 3,    BS x NP x 1
+        return f.where(sphere_closest, sphere_sdfs, cuboid_sdfs), \
+            f.where(sphere_closest, sphere_gradients, cuboid_gradients), \
+            f.where(sphere_closest, sphere_indices, cuboid_indices)
+
+    def bake_sdf(self, lower_corner, dims, res, memory_budget=None):
+        """
+        Sample the signed distance function of the scene once onto a regular grid of nodes, for fast repeated lookups
+        with baked_sdf. The baked grid is invalidated whenever a container entry is set, or set_slice is called.
+        Entries modified in-place by other means must be followed by a call to invalidate_baked_sdf.
+
+        :param lower_corner: Position of the first grid node *[3]*
+        :type lower_corner: sequence of floats
+        :param dims: Number of grid nodes in x, y, z directions *[3]*
+        :type dims: sequence of ints
+        :param res: Spacing between grid nodes, either shared or in x, y, z directions.
+        :type res: float or sequence of floats
+        :param memory_budget: Memory budget (bytes) for the sdf evaluation, as used by sdf. One pass if None.
+        :type memory_budget: int, optional
+        :return: The baked signed distance grid *[batch_shape,x,y,z,1]*
+        """
+
+        f = self._f
+        dev = f.get_device(self.sphere_positions if self.sphere_positions is not None else self.cuboid_ext_mats)
+
+        # shapes as list
+        batch_shape = list((self.sphere_positions if self.sphere_positions is not None
+                            else self.cuboid_ext_mats).shape[:-3])
+        num_batch_dims = len(batch_shape)
+        dims = [int(item) for item in dims]
+        res = [float(res)] * 3 if isinstance(res, (int, float)) else [float(item) for item in res]
+        lower_corner = [float(item) for item in lower_corner]
+
+        # XYZ x 3
+        node_indices = _np.stack(_np.meshgrid(*[_np.arange(dim) for dim in dims], indexing='ij'), -1).reshape(-1, 3)
+        node_positions = f.array((_np.array(lower_corner) + node_indices * _np.array(res)).astype(_np.float32),
+                                 dev=dev)
+
+        # BS x XYZ x 3
+        node_positions = f.tile(f.reshape(node_positions, [1] * num_batch_dims + [-1, 3]), batch_shape + [1, 1])
+
+        # BS x X x Y x Z x 1
+        sdf_grid = f.reshape(self.sdf(node_positions, memory_budget), batch_shape + dims + [1])
+
+        self._baked_sdf_grid = sdf_grid
+        self._baked_sdf_lower_corner = f.array(lower_corner, dev=dev)
+        self._baked_sdf_res = f.array(res, dev=dev)
+        return sdf_grid
+
+    def baked_sdf(self, query_positions, with_gradients=False):
+        """
+        Return signed distance function for the scene, by trilinear interpolation of the grid baked with bake_sdf.
+        Query points outside of the baked grid are clamped to the grid boundary.
+
+        :param query_positions: Point for which to query the signed distance *[batch_shape,num_points,3]*
+        :type query_positions: array
+        :param with_gradients: Whether to also return the gradients of the signed distances. Default is False.
+        :type with_gradients: bool, optional
+        :return: The signed distance values for each of the query points in the scene *[batch_shape,num_points,1]*,
+                 and optionally their gradients *[batch_shape,num_points,3]*
+        """
+        if self._baked_sdf_grid is None:
+            raise Exception('The scene sdf has not been baked, or has been invalidated. Call bake_sdf() first.')
+        return ivy_sdf.sdf_grid_lookup(self._baked_sdf_grid, self._baked_sdf_lower_corner, self._baked_sdf_res,
+                                       query_positions, with_gradients, f=self._f)
+
+    def invalidate_baked_sdf(self):
+        """
+        Discard the grid baked with bake_sdf, if any.
+        """
+        self._baked_sdf_grid = None
+        self._baked_sdf_lower_corner = None
+        self._baked_sdf_res = None
+
     # Getters #
     # --------#
 
@@ -148,6 +324,13 @@ class PrimitiveScene(_Container):
         """
         return self.shape_types.batch_shape[:-1]
 
+    @property
+    def baked_sdf_grid(self):
+        """
+        Signed distance grid baked with bake_sdf, or None if not baked *[batch_shape,x,y,z,1]*
+        """
+        return self._baked_sdf_grid
+
 
 # noinspection PyMissingConstructor
 class Intrinsics(_Container):
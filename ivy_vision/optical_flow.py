@@ -66,7 +66,7 @@ def depth_from_flow_and_cam_mats(flow, full_mats, inv_full_mats=None, camera_cen
         camera_centers = _ivy_svg.inv_ext_mat_to_camera_center(inv_full_mats, f=f)
 
     if uniform_pixel_coords is None:
-        uniform_pixel_coords = _ivy_svg.create_uniform_pixel_coords_image(image_dims, batch_shape, dev=dev, f=f)
+        uniform_pixel_coords = _ivy_svg.cached_uniform_pixel_coords_image(image_dims, batch_shape, dev=dev, f=f)
 
     # BS x H x W x 3
     flow_homo = f.concatenate((flow, f.zeros(batch_shape + image_dims + [1], dev=dev)), -1)
@@ -161,7 +161,7 @@ def project_flow_to_epipolar_line(flow, fund_mat, uniform_pixel_coords=None, bat
     image_dims = list(image_dims)
 
     if uniform_pixel_coords is None:
-        uniform_pixel_coords = _ivy_svg.create_uniform_pixel_coords_image(image_dims, batch_shape, dev, f=f)
+        uniform_pixel_coords = _ivy_svg.cached_uniform_pixel_coords_image(image_dims, batch_shape, dev, f=f)
 
     # BS x H x W x 3
     epipolar_lines = _ivy_pg.transform(uniform_pixel_coords, fund_mat, batch_shape, image_dims, f=f)
@@ -298,7 +298,7 @@ def velocity_from_flow_cam_coords_and_cam_mats(flow_t_to_tm1, cam_coords_t, cam_
         dev = f.get_device(flow_t_to_tm1)
 
     if uniform_pixel_coords is None:
-        uniform_pixel_coords = _ivy_svg.create_uniform_pixel_coords_image(image_dims, batch_shape, dev, f=f)
+        uniform_pixel_coords = _ivy_svg.cached_uniform_pixel_coords_image(image_dims, batch_shape, dev, f=f)
 
     # Interpolate cam coords from frame t-1
 
@@ -4,17 +4,22 @@ Collection of Rendering Functions
 
 # global
 import math as _math
+import numpy as _np
 from operator import mul as _mul
 from functools import reduce as _reduce
 from ivy.framework_handler import get_framework as _get_framework
 
 # local
+from ivy_vision import caching as _ivy_caching
 from ivy_vision import single_view_geometry as _ivy_svg
 
 MIN_DENOMINATOR = 1e-12
 MIN_DEPTH_DIFF = 1e-2
+TRIMESH_INDICES_CACHE_SIZE = 8
 # ToDo: refactor the various render implementations, to reduce duplicate code blocks
 
+_trimesh_indices_cache = _ivy_caching.LRUCache(TRIMESH_INDICES_CACHE_SIZE)
+
 
 def _render_proj_pixel_coords_with_var(pixel_coords, prior, final_image_dims, pixel_coords_var, prior_var,
                                        var_threshold, uniform_pixel_coords, batch_shape, dev, f):
@@ -91,16 +96,24 @@ def _render_proj_pixel_coords_with_var(pixel_coords, prior, final_image_dims, pi
                                  f.reshape(values_to_scatter, [-1, 2 * (1 + d) + 1]),
                                  batch_shape + final_image_dims + [2 * (1 + d) + 1])
 
+    # BS x H x W x (3+D)    BS x H x W x (1+D)     BS x H x W x 1
+    return _finalize_proj_pixel_coords_with_var(
+        quantized_img[..., 0:1 + d], quantized_img[..., 1 + d:2 * (1 + d)], quantized_img[..., -1:], prior, prior_var,
+        var_threshold, uniform_pixel_coords, f)
+
+
+def _finalize_proj_pixel_coords_with_var(quantized_sum_mean_x_recip_var, quantized_sum_recip_var, quantized_counter,
+                                         prior, prior_var, var_threshold, uniform_pixel_coords, f):
+
+    # shapes
+    d = prior.shape[-1] - 1
+
     # BS x H x W x 1
-    quantized_counter = quantized_img[..., -1:]
     invalidity_mask = quantized_counter == 0
 
-    # BS x H x W x (1+D)
-    quantized_sum_mean_x_recip_var = quantized_img[..., 0:1 + d]
-
     # BS x H x W x D
     quantized_var_wo_increase = f.where(invalidity_mask, prior_var,
-                                        (1 / (quantized_img[..., 1 + d:2 * (1 + d)] + MIN_DENOMINATOR)))
+                                        (1 / (quantized_sum_recip_var + MIN_DENOMINATOR)))
     quantized_var = f.maximum(quantized_var_wo_increase * quantized_counter, f.expand_dims(var_threshold[..., 0], -2))
     quantized_var = f.where(invalidity_mask, prior_var, quantized_var)
     quantized_mean = f.where(invalidity_mask, prior, quantized_var_wo_increase * quantized_sum_mean_x_recip_var)
@@ -121,6 +134,285 @@ def _render_proj_pixel_coords_with_var(pixel_coords, prior, final_image_dims, pi
     return quantized_mean, quantized_var, quantized_counter
 
 
+def _quantize_proj_pixel_coords(pixel_coords, pixel_coords_var, var_threshold, final_image_dims, batch_shape, d, f):
+
+    # BS x N x (1+D)
+    mean_vals = f.reshape(pixel_coords[..., 2:], batch_shape + [-1, 1 + d])
+
+    # BS x N x 1
+    mean_depth = mean_vals[..., 0:1]
+
+    # BS x N x 2
+    pixel_xy_coords = f.reshape(pixel_coords[..., 0:2], batch_shape + [-1, 2]) / (mean_depth + MIN_DENOMINATOR)
+
+    # BS x N x 2
+    quantized_pixel_xy_coords = f.cast(f.round(pixel_xy_coords), 'int32')
+
+    # BS x N x (1+D)
+    var_vals = f.reshape(pixel_coords_var, batch_shape + [-1, 1 + d])
+
+    # BS x N x 1
+    var_validity_mask = \
+        f.reduce_sum(f.cast(var_vals < var_threshold[..., 1], 'int32'), -1, keepdims=True) == d + 1
+    bounds_validity_mask = f.logical_and(
+        f.logical_and(quantized_pixel_xy_coords[..., 0:1] >= 0, quantized_pixel_xy_coords[..., 1:2] >= 0),
+        f.logical_and(quantized_pixel_xy_coords[..., 0:1] <= final_image_dims[1] - 1,
+                      quantized_pixel_xy_coords[..., 1:2] <= final_image_dims[0] - 1)
+    )
+    validity_mask = f.logical_and(var_validity_mask, bounds_validity_mask)
+
+    # BS x N x 2,    BS x N x (1+D),    BS x N x (1+D),    BS x N x 1
+    return quantized_pixel_xy_coords, mean_vals, var_vals, validity_mask
+
+
+def _quantize_omni_pixel_coords(pixel_coords, pixel_coords_var, var_threshold, final_image_dims, batch_shape, d, dev,
+                                f):
+
+    # BS x N x 2
+    pixel_xy_coords = f.reshape(pixel_coords[..., 0:2], batch_shape + [-1, 2])
+
+    # BS x N x 2
+    quantized_pixel_xy_coords = f.cast(f.floormod(f.round(pixel_xy_coords),
+                                                  f.array([float(final_image_dims[1]),
+                                                           float(final_image_dims[0])], dev=dev)), 'int32')
+
+    # BS x N x D
+    mean_vals = f.reshape(pixel_coords[..., 2:], batch_shape + [-1, d])
+    var_vals = f.reshape(pixel_coords_var, batch_shape + [-1, d])
+
+    # BS x N x 1
+    validity_mask = f.reduce_sum(f.cast(var_vals < var_threshold[..., 1], 'int32'), -1, keepdims=True) == d
+
+    # BS x N x 2,    BS x N x D,    BS x N x D,    BS x N x 1
+    return quantized_pixel_xy_coords, mean_vals, var_vals, validity_mask
+
+
+def _flat_pixel_indices(quantized_pixel_xy_coords, validity_mask, final_image_dims, batch_shape, dev, f):
+
+    # shapes
+    batch_size = _reduce(_mul, batch_shape, 1)
+    num_pixels = final_image_dims[0] * final_image_dims[1]
+
+    # prod(BS) x N x 2
+    quantized_pixel_xy_coords = f.reshape(quantized_pixel_xy_coords, [batch_size, -1, 2])
+
+    # prod(BS) x N x 1
+    validity_mask = f.reshape(validity_mask, [batch_size, -1, 1])
+
+    # prod(BS) x 1 x 1
+    batch_offsets = f.reshape(f.arange(batch_size, dtype_str='int32', dev=dev) * num_pixels, [batch_size, 1, 1])
+
+    # prod(BS) x N x 1
+    flat_indices = batch_offsets + quantized_pixel_xy_coords[..., 1:2] * final_image_dims[1] + \
+                   quantized_pixel_xy_coords[..., 0:1]
+
+    # invalid points are all routed to a single dump index, one beyond the final pixel of the final batch
+
+    # (prod(BS)xN) x 1
+    dump_indices = f.zeros_like(flat_indices) + batch_size * num_pixels
+    return f.reshape(f.cast(f.where(validity_mask, flat_indices, dump_indices), 'int32'), [-1, 1])
+
+
+def _scatter_flat_pixel_values(flat_indices, values, final_image_dims, batch_shape, f):
+
+    # shapes
+    num_bins = _reduce(_mul, batch_shape, 1) * final_image_dims[0] * final_image_dims[1]
+    num_channels = values.shape[-1]
+
+    # (prod(BS)xHxW+1) x C
+    scattered = f.scatter_nd(flat_indices, f.reshape(values, [-1, num_channels]), [num_bins + 1, num_channels])
+
+    # BS x H x W x C
+    return f.reshape(scattered[0:num_bins], batch_shape + final_image_dims + [num_channels])
+
+
+def _render_proj_pixel_coords_with_var_fused(pixel_coords, prior, final_image_dims, pixel_coords_var, prior_var,
+                                             var_threshold, uniform_pixel_coords, batch_shape, dev, f):
+
+    # shapes
+    d = prior.shape[-1] - 1
+
+    # Quantization #
+
+    # BS x N x 2,    BS x N x (1+D),    BS x N x (1+D),    BS x N x 1
+    quantized_pixel_xy_coords, mean_vals, var_vals, validity_mask = _quantize_proj_pixel_coords(
+        pixel_coords, pixel_coords_var, var_threshold, final_image_dims, batch_shape, d, f)
+
+    if f.reduce_sum(f.cast(validity_mask, 'int32')) == 0:
+        return f.concatenate((uniform_pixel_coords[..., 0:2], prior), -1), \
+               prior_var, f.zeros_like(prior_var[..., 0:1], dev=dev)
+
+    # Flat Pixel Indices #
+
+    # (prod(BS)xN) x 1
+    flat_indices = _flat_pixel_indices(quantized_pixel_xy_coords, validity_mask, final_image_dims, batch_shape, dev, f)
+
+    # BS x N x (1+D)
+    recip_vars = 1 / (var_vals + MIN_DENOMINATOR)
+    means_x_recip_vars = mean_vals * recip_vars
+
+    # Segment Sums #
+
+    # the sums of both statistics and the counter are accumulated together, in a single scatter
+
+    # BS x H x W x (2(1+D)+1)
+    quantized_sums = _scatter_flat_pixel_values(
+        flat_indices, f.concatenate((means_x_recip_vars, recip_vars, f.ones_like(mean_vals[..., 0:1], dev=dev)), -1),
+        final_image_dims, batch_shape, f)
+
+    # BS x H x W x (3+D)    BS x H x W x (1+D)     BS x H x W x 1
+    return _finalize_proj_pixel_coords_with_var(
+        quantized_sums[..., 0:1 + d], quantized_sums[..., 1 + d:2 * (1 + d)], quantized_sums[..., -1:], prior,
+        prior_var, var_threshold, uniform_pixel_coords, f)
+
+
+def _zbuffer_winning_indices(flat_indices, depths, num_bins, dev, f):
+
+    # shapes
+    num_points = depths.shape[0]
+
+    # Packed Keys #
+
+    # the depth is quantized relative to the maximum valid depth, and packed above the point index into a single int64
+    # key, so that one min-scatter both depth tests and selects the winning point, with ties resolving to the lowest
+    # index. Point indices are offset by one, so that zero marks an empty pixel. jax must have 64 bit types enabled
+
+    # scalars
+    index_bits = int(num_points).bit_length()
+    depth_scale = float(2 ** (62 - index_bits) - 1)
+
+    # N x 1
+    valid_depths = f.where(flat_indices < num_bins, f.maximum(f.cast(depths, 'float64'), 0.),
+                           f.zeros_like(f.cast(depths, 'float64')))
+    quantized_depths = f.cast(f.round(valid_depths / (f.reduce_max(valid_depths) + MIN_DENOMINATOR) * depth_scale),
+                              'int64')
+    point_ids = f.cast(f.reshape(f.arange(num_points, dtype_str='int32', dev=dev) + 1, [-1, 1]), 'int64')
+    keys = quantized_depths * 2 ** index_bits + point_ids
+
+    # Depth Test #
+
+    # invalid points all land in the final dump bin
+
+    # NB x 1
+    winning_keys = f.scatter_nd(flat_indices, keys, [num_bins + 1, 1], reduction='min')[0:num_bins]
+
+    # NB x 1,    NB x 1
+    return f.cast(f.maximum(f.floormod(winning_keys, 2 ** index_bits) - 1, 0), 'int32'), winning_keys > 0
+
+
+def _zbuffer_pixel_values(flat_indices, mean_vals, var_vals, final_image_dims, batch_shape, dev, f):
+
+    # shapes
+    num_bins = _reduce(_mul, batch_shape, 1) * final_image_dims[0] * final_image_dims[1]
+    num_channels = mean_vals.shape[-1]
+
+    # (prod(BS)xN) x C
+    mean_vals = f.reshape(mean_vals, [-1, num_channels])
+    var_vals = f.reshape(var_vals, [-1, num_channels])
+
+    # Z-Buffer #
+
+    # (prod(BS)xHxW) x 1,    (prod(BS)xHxW) x 1
+    winning_indices, validity_mask = _zbuffer_winning_indices(flat_indices, mean_vals[:, 0:1], num_bins, dev, f)
+
+    # Gather #
+
+    # BS x H x W x C
+    pixel_means = f.reshape(f.gather_nd(mean_vals, winning_indices), batch_shape + final_image_dims + [num_channels])
+    pixel_vars = f.reshape(f.gather_nd(var_vals, winning_indices), batch_shape + final_image_dims + [num_channels])
+
+    # BS x H x W x 1
+    validity_mask = f.reshape(validity_mask, batch_shape + final_image_dims + [1])
+
+    # BS x H x W x C,    BS x H x W x C,    BS x H x W x 1
+    return pixel_means, pixel_vars, validity_mask
+
+
+def _render_proj_pixel_coords_with_zbuffer_and_var(pixel_coords, prior, final_image_dims, pixel_coords_var,
+                                                   prior_var, var_threshold, uniform_pixel_coords, batch_shape, dev, f):
+
+    # shapes
+    d = prior.shape[-1] - 1
+
+    # Quantization #
+
+    # BS x N x 2,    BS x N x (1+D),    BS x N x (1+D),    BS x N x 1
+    quantized_pixel_xy_coords, mean_vals, var_vals, validity_mask = _quantize_proj_pixel_coords(
+        pixel_coords, pixel_coords_var, var_threshold, final_image_dims, batch_shape, d, f)
+
+    # (prod(BS)xN) x 1
+    flat_indices = _flat_pixel_indices(quantized_pixel_xy_coords, validity_mask, final_image_dims, batch_shape, dev, f)
+
+    # Z-Buffer #
+
+    # BS x H x W x (1+D),    BS x H x W x (1+D),    BS x H x W x 1
+    quantized_mean, quantized_var, validity_mask = _zbuffer_pixel_values(
+        flat_indices, mean_vals, var_vals, final_image_dims, batch_shape, dev, f)
+
+    # BS x H x W x (3+D)    BS x H x W x (1+D)     BS x H x W x 1
+    return _finalize_proj_pixel_coords_with_zbuffer(quantized_mean, quantized_var, validity_mask, prior, prior_var,
+                                                    var_threshold, uniform_pixel_coords, f)
+
+
+def _finalize_proj_pixel_coords_with_zbuffer(quantized_mean, quantized_var, validity_mask, prior, prior_var,
+                                             var_threshold, uniform_pixel_coords, f):
+
+    # BS x H x W x (1+D)
+    quantized_mean = f.where(validity_mask, quantized_mean, prior)
+    quantized_var = f.where(validity_mask, f.maximum(quantized_var, f.expand_dims(var_threshold[..., 0], -2)),
+                            prior_var)
+
+    # BS x H x W x 3
+    quantized_pixel_coords = uniform_pixel_coords * quantized_mean[..., 0:1]
+
+    # BS x H x W x (3+D)
+    quantized_mean = f.concatenate((quantized_pixel_coords, quantized_mean[..., 1:]), -1)
+
+    # BS x H x W x (3+D)    BS x H x W x (1+D)     BS x H x W x 1
+    return quantized_mean, quantized_var, validity_mask
+
+
+def _render_omni_pixel_coords_with_zbuffer_and_var(pixel_coords, prior, final_image_dims, pixel_coords_var,
+                                                   prior_var, var_threshold, uniform_pixel_coords, batch_shape, dev, f):
+
+    # shapes
+    d = prior.shape[-1]
+
+    # Quantization #
+
+    # BS x N x 2,    BS x N x D,    BS x N x D,    BS x N x 1
+    quantized_pixel_xy_coords, mean_vals, var_vals, validity_mask = _quantize_omni_pixel_coords(
+        pixel_coords, pixel_coords_var, var_threshold, final_image_dims, batch_shape, d, dev, f)
+
+    # (prod(BS)xN) x 1
+    flat_indices = _flat_pixel_indices(quantized_pixel_xy_coords, validity_mask, final_image_dims, batch_shape, dev, f)
+
+    # Z-Buffer #
+
+    # BS x H x W x D,    BS x H x W x D,    BS x H x W x 1
+    quantized_mean, quantized_var, validity_mask = _zbuffer_pixel_values(
+        flat_indices, mean_vals, var_vals, final_image_dims, batch_shape, dev, f)
+
+    # BS x H x W x (2+D)    BS x H x W x D    BS x H x W x 1
+    return _finalize_omni_pixel_coords_with_zbuffer(quantized_mean, quantized_var, validity_mask, prior, prior_var,
+                                                    var_threshold, uniform_pixel_coords, f)
+
+
+def _finalize_omni_pixel_coords_with_zbuffer(quantized_mean, quantized_var, validity_mask, prior, prior_var,
+                                             var_threshold, uniform_pixel_coords, f):
+
+    # BS x H x W x D
+    quantized_mean = f.where(validity_mask, quantized_mean, prior)
+    quantized_var = f.where(validity_mask, f.maximum(quantized_var, f.expand_dims(var_threshold[..., 0], -2)),
+                            prior_var)
+
+    # BS x H x W x (2+D)
+    quantized_pixel_coords = f.concatenate((uniform_pixel_coords[..., 0:2], quantized_mean), -1)
+
+    # BS x H x W x (2+D)    BS x H x W x D    BS x H x W x 1
+    return quantized_pixel_coords, quantized_var, validity_mask
+
+
 def _render_proj_pixel_coords_with_depth_buffer_and_var(pixel_coords, prior, final_image_dims, pixel_coords_var,
                                                         prior_var, var_threshold, uniform_pixel_coords, batch_shape,
                                                         dev, f):
@@ -363,13 +655,23 @@ def _render_omni_pixel_coords_with_var(pixel_coords, prior, final_image_dims, pi
                                  f.reshape(scatter_vals_and_var_and_counter, [-1, d + d + 1]),
                                  batch_shape + final_image_dims + [d + d + 1])
 
+    # BS x H x W x (2+D)    BS x H x W x D    BS x H x W x 1
+    return _finalize_omni_pixel_coords_with_var(
+        quantized_img[..., 0:d], quantized_img[..., d:-1], quantized_img[..., -1:], prior, prior_var, var_threshold,
+        uniform_pixel_coords, f)
+
+
+def _finalize_omni_pixel_coords_with_var(quantized_sum_scat_vals_x_recip_var, quantized_sum_recip_var,
+                                         quantized_counter, prior, prior_var, var_threshold, uniform_pixel_coords, f):
+
     # BS x H x W x 1
-    quantized_counter = quantized_img[..., -1:]
-    quantized_sum_scat_vals_x_recip_var = quantized_img[..., 0:d]
     invalidity_mask = quantized_counter == 0
+
+    # BS x H x W x D
     quantized_scat_vals_var_wo_increase = f.where(invalidity_mask, prior_var,
-                                                  (1 / (quantized_img[..., d:-1] + MIN_DENOMINATOR)))
-    quantized_scat_vals_var = f.maximum(quantized_scat_vals_var_wo_increase * quantized_counter, var_threshold[..., 0])
+                                                  (1 / (quantized_sum_recip_var + MIN_DENOMINATOR)))
+    quantized_scat_vals_var = f.maximum(quantized_scat_vals_var_wo_increase * quantized_counter,
+                                        f.expand_dims(var_threshold[..., 0], -2))
     quantized_scat_vals_var = f.where(invalidity_mask, prior_var, quantized_scat_vals_var)
     quantized_scat_vals_mean = f.where(invalidity_mask, prior,
                                        quantized_scat_vals_var_wo_increase * quantized_sum_scat_vals_x_recip_var)
@@ -558,6 +860,87 @@ def _render_omni_pixel_coords_with_depth_buffer_and_var(pixel_coords, prior, fin
     return quantized_pixel_coords, quantized_var, validity_mask
 
 
+def _format_prior_var_and_var_threshold(prior_var, var_threshold, final_image_dims, batch_shape, d, f):
+    if isinstance(prior_var, float):
+        prior_var = f.ones(batch_shape + final_image_dims + [1+d]) * prior_var
+    if isinstance(var_threshold, tuple) or isinstance(var_threshold, list):
+        ones = f.ones(batch_shape + [1, 1+d, 1])
+        var_threshold = f.concatenate((ones * var_threshold[0], ones * var_threshold[1]), -1)
+    else:
+        var_threshold = f.reshape(var_threshold, batch_shape + [1, 1+d, 2])
+    return prior_var, var_threshold
+
+
+def _init_render_state(num_channels, with_db, final_image_dims, batch_shape, dev, f):
+
+    # shapes
+    image_shape = batch_shape + final_image_dims
+
+    if with_db:
+        # BS x H x W x C,    BS x H x W x C,    BS x H x W x 1
+        return f.zeros(image_shape + [num_channels], dev=dev), f.zeros(image_shape + [num_channels], dev=dev), \
+               f.cast(f.zeros(image_shape + [1], dev=dev), 'bool')
+
+    # BS x H x W x C,    BS x H x W x C,    BS x H x W x 1
+    return f.zeros(image_shape + [num_channels], dev=dev), f.zeros(image_shape + [num_channels], dev=dev), \
+           f.zeros(image_shape + [1], dev=dev)
+
+
+def _integrate_render_chunk(render_state, pixel_coords, pixel_coords_var, var_threshold, mode, with_db,
+                            final_image_dims, batch_shape, dev, f):
+
+    # shapes
+    num_channels = render_state[0].shape[-1]
+
+    if isinstance(pixel_coords_var, float):
+        pixel_coords_var = f.ones_like(pixel_coords[..., 2:]) * pixel_coords_var
+
+    # Quantization #
+
+    # BS x N x 2,    BS x N x C,    BS x N x C,    BS x N x 1
+    if mode == 'proj':
+        quantized_pixel_xy_coords, mean_vals, var_vals, validity_mask = _quantize_proj_pixel_coords(
+            pixel_coords, pixel_coords_var, var_threshold, final_image_dims, batch_shape, num_channels - 1, f)
+    elif mode == 'omni':
+        quantized_pixel_xy_coords, mean_vals, var_vals, validity_mask = _quantize_omni_pixel_coords(
+            pixel_coords, pixel_coords_var, var_threshold, final_image_dims, batch_shape, num_channels, dev, f)
+    else:
+        raise Exception('Invalid render method called. Mode must be one of [proj|omni], but found {}'.format(mode))
+
+    # (prod(BS)xN) x 1
+    flat_indices = _flat_pixel_indices(quantized_pixel_xy_coords, validity_mask, final_image_dims, batch_shape, dev, f)
+
+    if with_db:
+
+        # Z-Buffer #
+
+        # BS x H x W x C,    BS x H x W x C,    BS x H x W x 1
+        mean, var, validity_mask = render_state
+        chunk_mean, chunk_var, chunk_validity_mask = _zbuffer_pixel_values(
+            flat_indices, mean_vals, var_vals, final_image_dims, batch_shape, dev, f)
+
+        # BS x H x W x 1
+        chunk_is_closer = f.logical_and(chunk_validity_mask, f.logical_or(
+            f.logical_not(validity_mask), chunk_mean[..., 0:1] < mean[..., 0:1]))
+
+        # BS x H x W x C,    BS x H x W x C,    BS x H x W x 1
+        return f.where(chunk_is_closer, chunk_mean, mean), f.where(chunk_is_closer, chunk_var, var), \
+               f.logical_or(validity_mask, chunk_validity_mask)
+
+    # Segment Sums #
+
+    # BS x N x C
+    recip_vars = 1 / (var_vals + MIN_DENOMINATOR)
+
+    # BS x H x W x C,    BS x H x W x C,    BS x H x W x 1
+    sum_mean_x_recip_var, sum_recip_var, counter = render_state
+    return sum_mean_x_recip_var + _scatter_flat_pixel_values(
+        flat_indices, mean_vals * recip_vars, final_image_dims, batch_shape, f), \
+           sum_recip_var + _scatter_flat_pixel_values(flat_indices, recip_vars, final_image_dims, batch_shape, f), \
+           counter + _scatter_flat_pixel_values(
+               flat_indices, f.ones_like(mean_vals[..., 0:1], dev=dev), final_image_dims, batch_shape, f)
+
+
 RENDER_METHODS = {'proj':
                       {True: _render_proj_pixel_coords_with_depth_buffer_and_var,
                        False: _render_proj_pixel_coords_with_var},
@@ -566,10 +949,25 @@ RENDER_METHODS = {'proj':
                        False: _render_omni_pixel_coords_with_var}
                   }
 
+FUSED_RENDER_METHODS = {'proj':
+                            {True: _render_proj_pixel_coords_with_zbuffer_and_var,
+                             False: _render_proj_pixel_coords_with_var_fused},
+                        'omni':
+                            {True: _render_omni_pixel_coords_with_zbuffer_and_var}
+                        }
+
+FINALIZE_RENDER_METHODS = {'proj':
+                               {True: _finalize_proj_pixel_coords_with_zbuffer,
+                                False: _finalize_proj_pixel_coords_with_var},
+                           'omni':
+                               {True: _finalize_omni_pixel_coords_with_zbuffer,
+                                False: _finalize_omni_pixel_coords_with_var}
+                           }
+
 
 def render_pixel_coords(pixel_coords, prior, final_image_dims, mode='proj', with_db=False,
                         pixel_coords_var=1e-3, prior_var=1e12, var_threshold=(1e-3, 1e12), uniform_pixel_coords=None,
-                        batch_shape=None, dev=None, f=None):
+                        batch_shape=None, dev=None, f=None, fused=False):
     """
     Quantize pixel co-ordinates with d feature channels (for depth, rgb, normals etc.), from
     images :math:`\mathbf{X}\in\mathbb{R}^{input\_images\_shape×(2+d)}`, which may have been reprojected from a host of
@@ -601,6 +999,11 @@ def render_pixel_coords(pixel_coords, prior, final_image_dims, mode='proj', with
     :type dev: str, optional
     :param f: Machine learning library. Inferred from inputs if None.
     :type f: ml_framework, optional
+    :param fused: Whether to scatter directly into flat per-pixel buffers, using flat pixel indices computed once for
+                  all points, rather than first gathering the valid points. With a depth buffer, a single key packing
+                  the quantized depth and point index is min-scattered, and the features of the closest point are then
+                  gathered by index. Requires 64 bit types in jax. Default is False.
+    :type fused: bool, optional
     :return: Quantized pixel co-ordinates image with d feature channels (for depth, rgb, normals etc.) *[batch_shape,h,w,2+d]* with other d scattered, and scatter counter image *[batch_shape,h,w,1]*
     """
     f = _get_framework(pixel_coords, f=f)
@@ -617,25 +1020,178 @@ def render_pixel_coords(pixel_coords, prior, final_image_dims, mode='proj', with
     d = prior.shape[-1] - 1
 
     if uniform_pixel_coords is None:
-        uniform_pixel_coords = _ivy_svg.create_uniform_pixel_coords_image(final_image_dims, batch_shape, dev=dev, f=f)
+        uniform_pixel_coords = _ivy_svg.cached_uniform_pixel_coords_image(final_image_dims, batch_shape, dev=dev, f=f)
 
     # mode
     if isinstance(pixel_coords_var, float):
         pixel_coords_var = f.ones_like(pixel_coords[..., 2:]) * pixel_coords_var
-    if isinstance(prior_var, float):
-        prior_var = f.ones(batch_shape + final_image_dims + [1+d]) * prior_var
-    if isinstance(var_threshold, tuple) or isinstance(var_threshold, list):
-        ones = f.ones(batch_shape + [1, 1+d, 1])
-        var_threshold = f.concatenate((ones * var_threshold[0], ones * var_threshold[1]), -1)
-    else:
-        var_threshold = f.reshape(var_threshold, batch_shape + [1, 1+d, 2])
+    prior_var, var_threshold = _format_prior_var_and_var_threshold(prior_var, var_threshold, final_image_dims,
+                                                                   batch_shape, d, f)
 
     try:
-        return RENDER_METHODS[mode][with_db](
-            pixel_coords, prior, final_image_dims, pixel_coords_var, prior_var, var_threshold, uniform_pixel_coords,
-            batch_shape, dev, f)
+        render_method = FUSED_RENDER_METHODS[mode][with_db] if fused else RENDER_METHODS[mode][with_db]
     except KeyError:
+        if fused and mode in RENDER_METHODS:
+            raise Exception('Fused rendering is not supported for mode {} with with_db={}'.format(mode, with_db))
         raise Exception('Invalid render method called. Mode must be one of [proj|omni], but found {}'.format(mode))
+    return render_method(pixel_coords, prior, final_image_dims, pixel_coords_var, prior_var, var_threshold,
+                         uniform_pixel_coords, batch_shape, dev, f)
+
+
+class RenderAccumulator:
+
+    def __init__(self, prior, final_image_dims, mode='proj', with_db=False, prior_var=1e12,
+                 var_threshold=(1e-3, 1e12), uniform_pixel_coords=None, batch_shape=None, dev=None, f=None):
+        """
+        Initialize accumulator for rendering pixel co-ordinates into a persistent target view. The additive sufficient
+        statistics (sum of mean x reciprocal variance, sum of reciprocal variance, and counter), or the z-buffer when
+        rendering with depth buffer, are kept resident between integrations, so that fusing new frames costs time
+        proportional to the new points only.
+
+        :param prior: Coords prior *[batch_shape,h,w,d]*
+        :type prior: array
+        :param final_image_dims: Image dimensions of the final image.
+        :type final_image_dims: sequence of ints
+        :param mode: Rendering mode, be one [proj|omni] for projective or omni-directional rendering, default is proj
+        :type mode: str, optional
+        :param with_db: Whether or not to use depth buffer in rendering, default is false
+        :type with_db: bool, optional
+        :param prior_var: Coords prior diagonal covariance *[batch_shape,h,w,d]*
+        :type prior_var: array or float to fill with
+        :param var_threshold: Variance threshold, for projecting valid coords and clipping *[batch_shape,d,2]*
+        :type var_threshold: array or sequence of floats to fill with
+        :param uniform_pixel_coords: Homogeneous uniform (integer) pixel co-ordinate images, inferred from final_image_dims if None *[batch_shape,h,w,3]*
+        :type uniform_pixel_coords: array, optional
+        :param batch_shape: Shape of batch. Inferred from prior if None.
+        :type batch_shape: sequence of ints, optional
+        :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as prior if None.
+        :type dev: str, optional
+        :param f: Machine learning library. Inferred from inputs if None.
+        :type f: ml_framework, optional
+        """
+        f = _get_framework(prior, f=f)
+
+        if batch_shape is None:
+            batch_shape = prior.shape[:-3]
+
+        if dev is None:
+            dev = f.get_device(prior)
+
+        if mode not in FINALIZE_RENDER_METHODS:
+            raise Exception('Invalid render method called. Mode must be one of [proj|omni], but found {}'.format(mode))
+
+        # shapes as list
+        self._batch_shape = list(batch_shape)
+        self._final_image_dims = list(final_image_dims)
+        self._num_channels = prior.shape[-1]
+
+        if uniform_pixel_coords is None:
+            uniform_pixel_coords = _ivy_svg.cached_uniform_pixel_coords_image(
+                self._final_image_dims, self._batch_shape, dev=dev, f=f)
+
+        self._prior_var, self._var_threshold = _format_prior_var_and_var_threshold(
+            prior_var, var_threshold, self._final_image_dims, self._batch_shape, self._num_channels - 1, f)
+        self._prior = prior
+        self._uniform_pixel_coords = uniform_pixel_coords
+        self._mode = mode
+        self._with_db = with_db
+        self._dev = dev
+        self._f = f
+        self._render_state = None
+        self.reset()
+
+    # Public Methods #
+    # ---------------#
+
+    def reset(self):
+        """
+        Reset the accumulated per-pixel statistics, so that the next finalized image only contains the prior.
+        """
+        self._render_state = _init_render_state(self._num_channels, self._with_db, self._final_image_dims,
+                                                self._batch_shape, self._dev, self._f)
+
+    def integrate(self, pixel_coords, pixel_coords_var=1e-3):
+        """
+        Integrate new pixel co-ordinates into the accumulated per-pixel statistics.
+
+        :param pixel_coords: Coordinates to scatter (depth, rgb, normals, etc.) *[batch_shape,input_size,2+d]*
+        :type pixel_coords: array
+        :param pixel_coords_var: Pixel co-ordinates diagonal covariance *[batch_shape,input_size,d]*
+        :type pixel_coords_var: array or float to fill with
+        """
+        self._render_state = _integrate_render_chunk(
+            self._render_state, pixel_coords, pixel_coords_var, self._var_threshold, self._mode, self._with_db,
+            self._final_image_dims, self._batch_shape, self._dev, self._f)
+
+    def finalize(self):
+        """
+        Compute the rendered image from all pixel co-ordinates integrated so far. The accumulated statistics are left
+        unchanged, so integration can continue afterwards.
+
+        :return: Quantized pixel co-ordinates image with d feature channels (for depth, rgb, normals etc.) *[batch_shape,h,w,2+d]* with other d scattered, and scatter counter image *[batch_shape,h,w,1]*
+        """
+        return FINALIZE_RENDER_METHODS[self._mode][self._with_db](
+            *self._render_state, self._prior, self._prior_var, self._var_threshold, self._uniform_pixel_coords,
+            self._f)
+
+    # Getters #
+    # --------#
+
+    @property
+    def render_state(self):
+        """
+        Accumulated per-pixel statistics, either the sum of mean x reciprocal variance, sum of reciprocal variance and
+        counter images, or the z-buffer mean, variance and validity images when rendering with depth buffer.
+        """
+        return self._render_state
+
+
+def render_pixel_coords_from_chunks(pixel_coords_chunks, prior, final_image_dims, mode='proj', with_db=False,
+                                    pixel_coords_var=1e-3, prior_var=1e12, var_threshold=(1e-3, 1e12),
+                                    uniform_pixel_coords=None, batch_shape=None, dev=None, f=None):
+    """
+    Quantize pixel co-ordinates with d feature channels in the same manner as render_pixel_coords, but with the
+    input points streamed as a sequence of chunks. Only the running per-pixel sums, reciprocal variances and counters
+    (or z-buffer) are kept between chunks, and these are finalized once at the end, so that peak memory is bounded
+    by the output images plus a single chunk. Rendering with depth buffer matches the exact fused z-buffer of
+    render_pixel_coords.
+
+    :param pixel_coords_chunks: Iterable of pixel co-ordinate chunks to scatter *[batch_shape,chunk_size,2+d]*, or of
+                                (pixel_coords, pixel_coords_var) tuples, with chunk variances
+                                *[batch_shape,chunk_size,d]*
+    :type pixel_coords_chunks: iterable of arrays or tuples of arrays
+    :param prior: Coords prior *[batch_shape,h,w,d]*
+    :type prior: array
+    :param final_image_dims: Image dimensions of the final image.
+    :type final_image_dims: sequence of ints
+    :param mode: Rendering mode, be one [proj|omni] for projective or omni-directional rendering, default is proj
+    :type mode: str, optional
+    :param with_db: Whether or not to use depth buffer in rendering, default is false
+    :type with_db: bool, optional
+    :param pixel_coords_var: Variance to fill for chunks which are not passed with their own variances.
+    :type pixel_coords_var: float, optional
+    :param prior_var: Coords prior diagonal covariance *[batch_shape,h,w,d]*
+    :type prior_var: array or float to fill with
+    :param var_threshold: Variance threshold, for projecting valid coords and clipping *[batch_shape,d,2]*
+    :type var_threshold: array or sequence of floats to fill with
+    :param uniform_pixel_coords: Homogeneous uniform (integer) pixel co-ordinate images, inferred from final_image_dims if None *[batch_shape,h,w,3]*
+    :type uniform_pixel_coords: array, optional
+    :param batch_shape: Shape of batch. Inferred from prior if None.
+    :type batch_shape: sequence of ints, optional
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as prior if None.
+    :type dev: str, optional
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: Quantized pixel co-ordinates image with d feature channels (for depth, rgb, normals etc.) *[batch_shape,h,w,2+d]* with other d scattered, and scatter counter image *[batch_shape,h,w,1]*
+    """
+    accumulator = RenderAccumulator(prior, final_image_dims, mode, with_db, prior_var, var_threshold,
+                                    uniform_pixel_coords, batch_shape, dev, f)
+    for chunk in pixel_coords_chunks:
+        if isinstance(chunk, (tuple, list)):
+            accumulator.integrate(*chunk)
+        else:
+            accumulator.integrate(chunk, pixel_coords_var)
+    return accumulator.finalize()
 
 
 def rasterize_triangles(pixel_coords_triangles, image_dims, batch_shape=None, dev=None, f=None):
@@ -706,6 +1262,8 @@ def rasterize_triangles(pixel_coords_triangles, image_dims, batch_shape=None, de
     v2x = v2[..., 0:1]
     v2y = v2[..., 1:2]
 
+    # the bounding box dims depend on the triangle, and so are not cached, to avoid filling the cache with one-off keys
+
     # BS x BBX x BBY x 2
     uniform_sample_coords = _ivy_svg.create_uniform_pixel_coords_image(img_bbox_list, batch_shape, f=f)[..., 0:2]
     P = f.round(uniform_sample_coords + tri_centres - bbox / 2)
@@ -749,7 +1307,199 @@ def rasterize_triangles(pixel_coords_triangles, image_dims, batch_shape=None, de
                                       batch_shape + image_dims + [1]), -3), 'bool')
 
 
-def weighted_image_smooth(mean, weights, kernel_dim, f=None):
+def rasterize_triangles_tiled(pixel_coords_triangles, image_dims, tile_dims=(32, 32), batch_shape=None, dev=None,
+                              f=None):
+    """
+    Rasterize image-projected triangles with depth testing, by binning each triangle into the screen tiles overlapped by
+    its own bounding box, and only evaluating the edge functions of the binned triangles inside each tile. Time and
+    memory therefore scale with the triangle coverage of each tile, rather than with the number of triangles multiplied
+    by the bounding box of the full mesh. Pixels are sampled at the integer pixel co-ordinates, with image rows indexed
+    by :math:`y`, consistent with render_pixel_coords. Triangles of both windings are rasterized, while degenerate
+    triangles and triangles with any vertex at non-positive depth are culled. Depth and barycentric co-ordinates are
+    interpolated perspective-correctly. Depth ties resolve to the lowest triangle index.
+
+    :param pixel_coords_triangles: Projected image-space triangles to be rasterized, with each vertex holding the
+                                    :math:`xy` pixel co-ordinate and depth *[batch_shape,num_triangles,3,3]*
+    :type pixel_coords_triangles: array
+    :param image_dims: Image dimensions.
+    :type image_dims: sequence of ints
+    :param tile_dims: Dimensions of the screen tiles which triangles are binned into. Default is 32x32.
+    :type tile_dims: sequence of ints, optional
+    :param batch_shape: Shape of batch. Inferred from Inputs if None.
+    :type batch_shape: sequence of ints, optional
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as x if None.
+    :type dev: str, optional
+    :param f: Machine learning library. Inferred from Inputs if None.
+    :type f: ml_framework, optional
+    :return: Depth image *[batch_shape,h,w,1]*, triangle index image with -1 for empty pixels *[batch_shape,h,w,1]*,
+             and perspective-correct barycentric co-ordinate image *[batch_shape,h,w,3]*
+    """
+
+    f = _get_framework(pixel_coords_triangles, f=f)
+
+    if batch_shape is None:
+        batch_shape = pixel_coords_triangles.shape[:-3]
+
+    if dev is None:
+        dev = f.get_device(pixel_coords_triangles)
+
+    # shapes as list
+    batch_shape = list(batch_shape)
+    image_dims = list(image_dims)
+    tile_dims = list(tile_dims)
+    batch_size = _reduce(_mul, batch_shape, 1)
+    num_triangles = pixel_coords_triangles.shape[-3]
+
+    # B x N x 3 x 3
+    triangles = f.reshape(pixel_coords_triangles, [batch_size, num_triangles, 3, 3])
+
+    # Triangle Setup #
+    # ---------------#
+
+    # B x N x 3
+    xs = triangles[..., 0]
+    ys = triangles[..., 1]
+
+    # B x N
+    signed_areas = (xs[..., 1] - xs[..., 0]) * (ys[..., 2] - ys[..., 0]) -\
+                   (ys[..., 1] - ys[..., 0]) * (xs[..., 2] - xs[..., 0])
+    is_renderable = f.logical_and(f.abs(signed_areas) > MIN_DENOMINATOR, f.reduce_min(triangles[..., 2], -1) > 0)
+
+    # per-triangle bounding boxes, B x N
+    x_mins = f.reduce_min(xs, -1)
+    x_maxs = f.reduce_max(xs, -1)
+    y_mins = f.reduce_min(ys, -1)
+    y_maxs = f.reduce_max(ys, -1)
+
+    # Tiles #
+    # ------#
+
+    tile_rows = list()
+    for tile_y in range(0, image_dims[0], tile_dims[0]):
+        tile_h = min(tile_dims[0], image_dims[0] - tile_y)
+
+        # B x N
+        in_tile_row = f.logical_and(f.logical_and(y_maxs >= tile_y, y_mins <= tile_y + tile_h - 1), is_renderable)
+
+        tile_row = list()
+        for tile_x in range(0, image_dims[1], tile_dims[1]):
+            tile_w = min(tile_dims[1], image_dims[1] - tile_x)
+            num_tile_pixels = tile_h * tile_w
+
+            # Binning #
+
+            # K x 2
+            candidate_indices = f.cast(f.indices_where(f.logical_and(
+                f.logical_and(x_maxs >= tile_x, x_mins <= tile_x + tile_w - 1), in_tile_row)), 'int32')
+            num_candidates = candidate_indices.shape[0]
+
+            if num_candidates == 0:
+                tile_row.append((f.zeros((batch_size, tile_h, tile_w, 1), dev=dev),
+                                 f.zeros((batch_size, tile_h, tile_w, 1), 'int32', dev=dev) - 1,
+                                 f.zeros((batch_size, tile_h, tile_w, 3), dev=dev)))
+                continue
+
+            # K x 3 x 3
+            candidates = f.gather_nd(triangles, candidate_indices)
+
+            # K x 1
+            v0x, v0y, z0 = candidates[:, 0, 0:1], candidates[:, 0, 1:2], candidates[:, 0, 2:3]
+            v1x, v1y, z1 = candidates[:, 1, 0:1], candidates[:, 1, 1:2], candidates[:, 1, 2:3]
+            v2x, v2y, z2 = candidates[:, 2, 0:1], candidates[:, 2, 1:2], candidates[:, 2, 2:3]
+            candidate_areas = (v1x - v0x) * (v2y - v0y) - (v1y - v0y) * (v2x - v0x)
+
+            # 1 x T
+            tile_coords = f.reshape(_ivy_svg.cached_uniform_pixel_coords_image(
+                [tile_h, tile_w], dev=dev, f=f)[..., 0:2], (1, num_tile_pixels, 2))
+            px = tile_coords[..., 0] + tile_x
+            py = tile_coords[..., 1] + tile_y
+
+            # Coverage #
+
+            # edge functions divided by the signed area, giving barycentric co-ordinates for either winding
+
+            # K x T
+            b0 = ((v2x - v1x) * (py - v1y) - (v2y - v1y) * (px - v1x)) / candidate_areas
+            b1 = ((v0x - v2x) * (py - v2y) - (v0y - v2y) * (px - v2x)) / candidate_areas
+            b2 = 1 - b0 - b1
+            covered = f.logical_and(f.logical_and(b0 >= 0, b1 >= 0), b2 >= 0)
+
+            # perspective-correct interpolation, via interpolation of reciprocal depth
+
+            # K x T
+            b0_over_z = b0 / z0
+            b1_over_z = b1 / z1
+            b2_over_z = b2 / z2
+            recip_depths = f.maximum(b0_over_z + b1_over_z + b2_over_z, MIN_DENOMINATOR)
+
+            # (KxT) x 4
+            fragments = f.reshape(f.concatenate([f.expand_dims(item, -1) for item in
+                                                 [1 / recip_depths, b0_over_z / recip_depths, b1_over_z / recip_depths,
+                                                  b2_over_z / recip_depths]], -1), (-1, 4))
+
+            # Depth Test #
+
+            # (KxT) x 1
+            flat_indices = candidate_indices[:, 0:1] * num_tile_pixels +\
+                f.reshape(f.arange(num_tile_pixels, dtype_str='int32', dev=dev), (1, -1))
+            flat_indices = f.reshape(f.where(covered, flat_indices, f.zeros_like(flat_indices) +
+                                             batch_size * num_tile_pixels), (-1, 1))
+
+            # (BxTHxTW) x 1,    (BxTHxTW) x 1
+            winning_indices, tile_validity = _zbuffer_winning_indices(
+                flat_indices, fragments[:, 0:1], batch_size * num_tile_pixels, dev, f)
+
+            # B x TH x TW x 4,    B x TH x TW x 1
+            tile_fragments = f.reshape(f.gather_nd(fragments, winning_indices), [batch_size, tile_h, tile_w, 4])
+            tile_validity = f.reshape(tile_validity, [batch_size, tile_h, tile_w, 1])
+
+            # the triangle indices are gathered as integers, from the candidate of each winning fragment
+
+            # B x TH x TW x 1
+            tile_triangle_ids = f.reshape(f.gather_nd(candidate_indices[:, 1:2], winning_indices // num_tile_pixels),
+                                          [batch_size, tile_h, tile_w, 1])
+
+            # B x TH x TW x 1,    B x TH x TW x 1,    B x TH x TW x 3
+            tile_depths = f.where(tile_validity, tile_fragments[..., 0:1], f.zeros_like(tile_fragments[..., 0:1]))
+            tile_triangle_ids = f.where(tile_validity, tile_triangle_ids, f.zeros_like(tile_triangle_ids) - 1)
+            tile_validity = f.concatenate([tile_validity] * 3, -1)
+            tile_barycentrics = f.where(tile_validity, tile_fragments[..., 1:4],
+                                        f.zeros_like(tile_fragments[..., 1:4]))
+            tile_row.append((tile_depths, tile_triangle_ids, tile_barycentrics))
+
+        tile_rows.append([f.concatenate([tile[i] for tile in tile_row], 2) for i in range(3)])
+
+    # Assemble #
+    # ---------#
+
+    # BS x H x W x 1,    BS x H x W x 1,    BS x H x W x 3
+    return tuple(f.reshape(f.concatenate([tile_row[i] for tile_row in tile_rows], 1),
+                           batch_shape + image_dims + [num_channels])
+                 for i, num_channels in enumerate([1, 1, 3]))
+
+
+def _integral_box_filter(x, kernel_dim, f):
+
+    # shapes as list
+    num_batch_dims = len(x.shape) - 3
+
+    # summed-area table, accumulated in double precision to limit cancellation over large images, with the result cast
+    # back to the input dtype. jax disables double precision by default, in which case the table remains float32
+
+    # scalar
+    dtype_str = f.dtype_str(x)
+
+    # BS x (H+1) x (W+1) x D
+    sat = f.zero_pad(f.cast(x, 'float64'), [[0, 0]] * num_batch_dims + [[1, 0], [1, 0], [0, 0]])
+    sat = f.cumsum(f.cumsum(sat, -3), -2)
+
+    # BS x (H-KH+1) x (W-KW+1) x D
+    box_sums = sat[..., kernel_dim:, kernel_dim:, :] - sat[..., :-kernel_dim, kernel_dim:, :] -\
+        sat[..., kernel_dim:, :-kernel_dim, :] + sat[..., :-kernel_dim, :-kernel_dim, :]
+    return f.cast(box_sums, dtype_str)
+
+
+def weighted_image_smooth(mean, weights, kernel_dim, mode='conv', f=None):
     """
     Smooth an image using weight values from a weight image of the same size.
 
@@ -759,6 +1509,11 @@ def weighted_image_smooth(mean, weights, kernel_dim, f=None):
     :type weights: array
     :param kernel_dim: The dimension of the kernel
     :type kernel_dim: int
+    :param mode: Box filtering mode, one of [conv|integral]. conv uses depthwise convolutions, with cost growing with
+                 the kernel area, while integral uses summed-area tables, with constant cost per pixel independent of
+                 kernel size. The tables are accumulated in double precision, except in jax without double precision
+                 enabled, where they are float32 and lose accuracy for large images. Default is conv.
+    :type mode: str, optional
     :param f: Machine learning library. Inferred from Inputs if None.
     :type f: ml_framework, optional
     :return: Image smoothed based on variance image and smoothing kernel.
@@ -770,25 +1525,123 @@ def weighted_image_smooth(mean, weights, kernel_dim, f=None):
     kernel_shape = [kernel_dim, kernel_dim]
     dim = mean.shape[-1]
 
-    # KW x KW x D
-    kernel = f.ones(kernel_shape + [dim])
+    # BS x H x W x D
+    mean_x_weights = mean * weights
 
-    # D
-    kernel_sum = f.reduce_sum(kernel, [0, 1])[0]
+    if mode == 'conv':
+
+        # KW x KW x D
+        kernel = f.ones(kernel_shape + [dim])
+
+        # BS x H x W x D
+        mean_x_weights_sum = f.abs(f.depthwise_conv2d(mean_x_weights, kernel, 1, "VALID"))
+        sum_of_weights = f.depthwise_conv2d(weights, kernel, 1, "VALID")
+    elif mode == 'integral':
+
+        # BS x H x W x D
+        mean_x_weights_sum = f.abs(_integral_box_filter(mean_x_weights, kernel_dim, f))
+        sum_of_weights = _integral_box_filter(weights, kernel_dim, f)
+    else:
+        raise Exception('Invalid smoothing mode. Mode must be one of [conv|integral], but found {}'.format(mode))
+
+    # scalar
+    kernel_sum = float(kernel_dim ** 2)
 
     # BS x H x W x D
-    mean_x_weights = mean * weights
-    mean_x_weights_sum = f.abs(f.depthwise_conv2d(mean_x_weights, kernel, 1, "VALID"))
-    sum_of_weights = f.depthwise_conv2d(weights, kernel, 1, "VALID")
     new_mean = mean_x_weights_sum / (sum_of_weights + MIN_DENOMINATOR)
-
     new_weights = sum_of_weights / (kernel_sum + MIN_DENOMINATOR)
 
     # BS x H x W x D,  # BS x H x W x D
     return new_mean, new_weights
 
 
-def smooth_image_fom_var_image(mean, var, kernel_dim, kernel_scale, dev=None, f=None):
+def _smoothing_kernel(kernel_dim, kernel_scale, dims, dev, f):
+
+    # shapes as list
+    kernel_shape = [kernel_dim, kernel_dim]
+
+    # KH x KW x 2
+    uniform_pixel_coords = _ivy_svg.cached_uniform_pixel_coords_image(kernel_shape, dev=dev, f=f)[..., 0:2]
+
+    # 2
+    kernel_central_pixel_coord = f.array([float(_math.floor(kernel_shape[0] / 2)),
+                                          float(_math.floor(kernel_shape[1] / 2))], dev=dev)
+
+    # KH x KW x 2
+    kernel_xy_dists = kernel_central_pixel_coord - uniform_pixel_coords
+    kernel_xy_dists_sqrd = kernel_xy_dists ** 2
+
+    # KW x KW x D x D
+    unit_kernel = f.tile(f.reduce_sum(kernel_xy_dists_sqrd, -1, keepdims=True) ** 0.5, (1, 1, dims))
+    kernel = 1 + unit_kernel * kernel_scale
+    recip_kernel = 1 / (kernel + MIN_DENOMINATOR)
+
+    # KH x KW x D,    KH x KW x D
+    return kernel, recip_kernel
+
+
+def _separable_depthwise_conv2d(x, col_kernels, row_kernels, f):
+
+    # R
+    rank = col_kernels.shape[0]
+
+    # BS x H x W x D
+    ret = 0
+    for r in range(rank):
+        ret = ret + f.depthwise_conv2d(f.depthwise_conv2d(x, f.expand_dims(col_kernels[r], 1), 1, "VALID"),
+                                       f.expand_dims(row_kernels[r], 0), 1, "VALID")
+    return ret
+
+
+def separable_smoothing_kernels(kernel_dim, kernel_scale, dims, rank=1, dev='cpu', f=None):
+    """
+    Decompose the per-channel reciprocal smoothing kernel of smooth_image_fom_var_image into a sum of separable rank-1
+    components, via singular value decomposition. When kernel_scale is zero the kernel is constant and rank 1 is exact,
+    and any kernel is reproduced exactly for rank equal to the kernel dimension. The L1 norm of the residual kernel
+    bounds the error of the separable convolution relative to the dense convolution, as a multiple of the maximum
+    absolute value of the convolved image.
+
+    :param kernel_dim: The dimension of the kernel
+    :type kernel_dim: int
+    :param kernel_scale: The scale of the kernel along the channel dimension *[d]*
+    :type kernel_scale: array or float
+    :param dims: Number of image channels d.
+    :type dims: int
+    :param rank: Number of separable components to keep. Default is 1.
+    :type rank: int, optional
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc.
+    :type dev: str, optional
+    :param f: Machine learning library. Global framework used if None.
+    :type f: ml_framework, optional
+    :return: Column kernels *[rank,kh,d]*, row kernels *[rank,kw,d]*, and L1 norm of the residual kernel *[d]*
+    """
+
+    f = _get_framework(f=f)
+
+    # KH x KW x D
+    _, recip_kernel = _smoothing_kernel(kernel_dim, kernel_scale, dims, dev, f)
+
+    # D x KH x KW
+    recip_kernel_t = f.transpose(recip_kernel, (2, 0, 1))
+
+    # D x KH x KH,    D x K,    D x KW x KW
+    U, D, VT = f.svd(recip_kernel_t)
+
+    # D x R
+    sqrt_singular_values = D[:, 0:rank] ** 0.5
+
+    # D x KH x R,    D x R x KW
+    col_kernels = U[..., 0:rank] * f.expand_dims(sqrt_singular_values, 1)
+    row_kernels = VT[:, 0:rank] * f.expand_dims(sqrt_singular_values, -1)
+
+    # D
+    kernel_error = f.reduce_sum(f.abs(recip_kernel_t - f.matmul(col_kernels, row_kernels)), [1, 2])
+
+    # R x KH x D,    R x KW x D,    D
+    return f.transpose(col_kernels, (2, 1, 0)), f.transpose(row_kernels, (1, 2, 0)), kernel_error
+
+
+def smooth_image_fom_var_image(mean, var, kernel_dim, kernel_scale, mode='dense', rank=1, dev=None, f=None):
     """
     Smooth an image using variance values from a variance image of the same size, and a spatial smoothing kernel.
 
@@ -800,6 +1653,12 @@ def smooth_image_fom_var_image(mean, var, kernel_dim, kernel_scale, dev=None, f=
     :type kernel_dim: int
     :param kernel_scale: The scale of the kernel along the channel dimension *[d]*
     :type kernel_scale: array
+    :param mode: Convolution mode, one of [dense|separable]. separable approximates the reciprocal kernel with rank
+                 separable components, applied as 1D passes, see separable_smoothing_kernels for the error bound.
+                 Default is dense.
+    :type mode: str, optional
+    :param rank: Number of separable kernel components used in separable mode. Default is 1.
+    :type rank: int, optional
     :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as x if None.
     :type dev: str, optional
     :param f: Machine learning library. Inferred from Inputs if None.
@@ -813,41 +1672,46 @@ def smooth_image_fom_var_image(mean, var, kernel_dim, kernel_scale, dev=None, f=
         dev = f.get_device(mean)
 
     # shapes as list
-    kernel_shape = [kernel_dim, kernel_dim]
     kernel_size = kernel_dim ** 2
     dims = mean.shape[-1]
 
-    # KH x KW x 2
-    uniform_pixel_coords = _ivy_svg.create_uniform_pixel_coords_image(kernel_shape, dev=dev, f=f)[..., 0:2]
+    # KH x KW x D,    KH x KW x D
+    kernel, recip_kernel = _smoothing_kernel(kernel_dim, kernel_scale, dims, dev, f)
 
-    # 2
-    kernel_central_pixel_coord = f.array([float(_math.floor(kernel_shape[0] / 2)),
-                                          float(_math.floor(kernel_shape[1] / 2))], dev=dev)
+    # D
+    kernel_sum = f.reduce_sum(kernel, [0, 1])[0]
 
-    # KH x KW x 2
-    kernel_xy_dists = kernel_central_pixel_coord - uniform_pixel_coords
-    kernel_xy_dists_sqrd = kernel_xy_dists ** 2
+    if mode == 'dense':
 
-    # KW x KW x D x D
-    unit_kernel = f.tile(f.reduce_sum(kernel_xy_dists_sqrd, -1, keepdims=True) ** 0.5, (1, 1, dims))
-    kernel = 1 + unit_kernel * kernel_scale
-    recip_kernel = 1 / (kernel + MIN_DENOMINATOR)
+        # D
+        recip_kernel_sum = f.reduce_sum(recip_kernel, [0, 1])
 
-    # D
-    kernel_sum = f.reduce_sum(kernel, [0, 1])[0]
-    recip_kernel_sum = f.reduce_sum(recip_kernel, [0, 1])
+        def conv(x):
+            return f.depthwise_conv2d(x, recip_kernel, 1, "VALID")
+    elif mode == 'separable':
+
+        # R x KH x D,    R x KW x D
+        col_kernels, row_kernels, _ = separable_smoothing_kernels(kernel_dim, kernel_scale, dims, rank, dev, f)
+
+        # D
+        recip_kernel_sum = f.reduce_sum(f.reduce_sum(col_kernels, 1) * f.reduce_sum(row_kernels, 1), 0)
+
+        def conv(x):
+            return _separable_depthwise_conv2d(x, col_kernels, row_kernels, f)
+    else:
+        raise Exception('Invalid smoothing mode. Mode must be one of [dense|separable], but found {}'.format(mode))
 
     # BS x H x W x D
     recip_var = 1 / (var + MIN_DENOMINATOR)
     recip_var_scaled = recip_var + 1
 
-    recip_new_var_scaled = f.depthwise_conv2d(recip_var_scaled, recip_kernel, 1, "VALID")
+    recip_new_var_scaled = conv(recip_var_scaled)
     # This 0.99 prevents float32 rounding errors leading to -ve variances, the true equation would use 1.0
     recip_new_var = recip_new_var_scaled - recip_kernel_sum * 0.99
     new_var = 1 / (recip_new_var + MIN_DENOMINATOR)
 
     mean_x_recip_var = mean * recip_var
-    mean_x_recip_var_sum = f.abs(f.depthwise_conv2d(mean_x_recip_var, recip_kernel, 1, "VALID"))
+    mean_x_recip_var_sum = f.abs(conv(mean_x_recip_var))
     new_mean = new_var * mean_x_recip_var_sum
 
     new_var = new_var * kernel_size ** 2 / (kernel_sum + MIN_DENOMINATOR)
@@ -902,58 +1766,101 @@ def pad_omni_image(image, pad_size, image_dims=None, f=None):
     return f.concatenate((left_border, image_expanded, right_border), -2)
 
 
-def create_trimesh_indices_for_image(batch_shape, image_dims, dev='cpu:0', f=None):
+def create_flat_trimesh_indices_for_image(image_dims, dev='cpu:0', dtype_str='int32', f=None):
     """
-    Create triangle mesh for image with given image dimensions
+    Create flat triangle mesh indices for image with given image dimensions, as a single contiguous index buffer
+    suitable for direct upload. Indices are built once per image size and cached, and so must not be modified in-place.
 
-    :param batch_shape: Shape of batch.
-    :type batch_shape: sequence of ints
     :param image_dims: Image dimensions.
     :type image_dims: sequence of ints
     :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc.
     :type dev: str, optional
+    :param dtype_str: Data type of the indices. Default is int32.
+    :type dtype_str: str, optional
     :param f: Machine learning library. Global framework used if None.
     :type f: ml_framework, optional
-    :return: Triangle mesh indices for image *[batch_shape,h*w*some_other_stuff,3]*
+    :return: Flat triangle mesh indices for image *[2x(h-1)x(w-1)x3]*
     """
 
     f = _get_framework(f=f)
 
     # shapes as lists
-    batch_shape = list(batch_shape)
     image_dims = list(image_dims)
 
-    # other shape specs
-    num_batch_dims = len(batch_shape)
-    tri_dim = 2 * (image_dims[0] - 1) * (image_dims[1] - 1)
-    flat_shape = [1] * num_batch_dims + [tri_dim] + [3]
-    tile_shape = batch_shape + [1] * 2
-
-    # 1 x W-1
-    t00_ = f.reshape(f.arange(image_dims[1] - 1, dtype_str='float32', dev=dev), (1, -1))
+    key = (tuple(image_dims), dtype_str, dev, f)
+    flat_trimesh_indices = _trimesh_indices_cache.get(key)
+    if flat_trimesh_indices is not None:
+        return flat_trimesh_indices
 
-    # H-1 x 1
-    k_ = f.reshape(f.arange(image_dims[0] - 1, dtype_str='float32', dev=dev), (-1, 1)) * image_dims[1]
-
-    # H-1 x W-1
-    t00_ = f.matmul(f.ones((image_dims[0] - 1, 1), dev=dev), t00_, batch_shape)
-    k_ = f.matmul(k_, f.ones((1, image_dims[1] - 1), dev=dev), batch_shape)
-
-    # (H-1xW-1) x 1
-    t00 = f.expand_dims(t00_ + k_, -1)
+    # H-1 x W-1 x 1
+    t00 = f.expand_dims(f.reshape(f.arange(image_dims[0] - 1, dtype_str='int32', dev=dev), (-1, 1)) * image_dims[1] +
+                        f.reshape(f.arange(image_dims[1] - 1, dtype_str='int32', dev=dev), (1, -1)), -1)
     t01 = t00 + 1
     t02 = t00 + image_dims[1]
     t10 = t00 + image_dims[1] + 1
     t11 = t01
     t12 = t02
 
-    # (H-1xW-1) x 3
-    t0 = f.concatenate((t00, t01, t02), -1)
-    t1 = f.concatenate((t10, t11, t12), -1)
+    # 2 x H-1 x W-1 x 3
+    trimesh_indices = f.concatenate((f.expand_dims(f.concatenate((t00, t01, t02), -1), 0),
+                                     f.expand_dims(f.concatenate((t10, t11, t12), -1), 0)), 0)
+
+    # (2x(H-1xW-1)x3)
+    flat_trimesh_indices = f.cast(f.reshape(trimesh_indices, (-1,)), dtype_str)
+    if not _ivy_caching.is_concrete(flat_trimesh_indices[0:1], f):
+        return flat_trimesh_indices
+    if isinstance(flat_trimesh_indices, _np.ndarray):
+        flat_trimesh_indices.setflags(write=False)
+    _trimesh_indices_cache.put(key, flat_trimesh_indices)
+    return flat_trimesh_indices
+
+
+def create_trimesh_indices_for_image(batch_shape, image_dims, dev='cpu:0', dtype_str='int32', f=None):
+    """
+    Create triangle mesh for image with given image dimensions. Indices are built once per image size and cached, and
+    are broadcast rather than copied across the batch where the framework supports it, and so must not be modified
+    in-place.
+
+    :param batch_shape: Shape of batch.
+    :type batch_shape: sequence of ints
+    :param image_dims: Image dimensions.
+    :type image_dims: sequence of ints
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc.
+    :type dev: str, optional
+    :param dtype_str: Data type of the indices. Default is int32.
+    :type dtype_str: str, optional
+    :param f: Machine learning library. Global framework used if None.
+    :type f: ml_framework, optional
+    :return: Triangle mesh indices for image *[batch_shape,2x(h-1)x(w-1),3]*
+    """
+
+    f = _get_framework(f=f)
+
+    # shapes as lists
+    batch_shape = list(batch_shape)
+    image_dims = list(image_dims)
+
+    # 2x(H-1xW-1) x 3
+    trimesh_indices = f.reshape(create_flat_trimesh_indices_for_image(image_dims, dev, dtype_str, f), (-1, 3))
 
     # BS x 2x(H-1xW-1) x 3
-    return f.tile(f.reshape(f.concatenate((t0, t1), 0),
-                            flat_shape), tile_shape)
+    return _ivy_caching.broadcast_to_batch(trimesh_indices, batch_shape, f)
+
+
+def trimesh_indices_cache_info():
+    """
+    Return the hit and miss counters, current size, and maximum size of the trimesh indices cache.
+
+    :return: Dict of cache statistics, with keys hits, misses, size and max_size.
+    """
+    return _trimesh_indices_cache.info()
+
+
+def clear_trimesh_indices_cache():
+    """
+    Remove all entries from the trimesh indices cache, and reset the hit and miss counters.
+    """
+    _trimesh_indices_cache.clear()
 
 
 def coord_image_to_trimesh(coord_img, validity_mask=None, batch_shape=None, image_dims=None, dev=None, f=None):
@@ -1018,7 +1925,7 @@ def coord_image_to_trimesh(coord_img, validity_mask=None, batch_shape=None, imag
         trimesh_valid_indices = f.indices_where(trimesh_index_validity)
 
         # BS x 2x(H-1xW-1) x 3
-        all_trimesh_indices = create_trimesh_indices_for_image(batch_shape, image_dims, dev, f=f)
+        all_trimesh_indices = create_trimesh_indices_for_image(batch_shape, image_dims, dev=dev, f=f)
 
         # BS x N x 3
         trimesh_indices = f.gather_nd(all_trimesh_indices, trimesh_valid_indices)
@@ -1026,7 +1933,292 @@ def coord_image_to_trimesh(coord_img, validity_mask=None, batch_shape=None, imag
     else:
 
         # BS x N=2x(H-1xW-1) x 3
-        trimesh_indices = create_trimesh_indices_for_image(batch_shape, image_dims, f=f)
+        trimesh_indices = create_trimesh_indices_for_image(batch_shape, image_dims, dev=dev, f=f)
 
     # BS x (HxW) x 3,    BS x N x 3
     return vertices, trimesh_indices
+
+
+def _cumsum_compaction(validity, dev, f):
+
+    # N
+    num_elements = validity.shape[0]
+    counts = f.cumsum(f.cast(validity, 'int32'), 0)
+    num_valid = int(f.to_numpy(counts[-1:])[0]) if num_elements > 0 else 0
+
+    # N x 1
+    positions = f.reshape(f.where(validity, counts - 1, f.zeros_like(counts) + num_valid), (-1, 1))
+
+    # K
+    compact_ids = f.scatter_nd(positions, f.arange(num_elements, dtype_str='int32', dev=dev),
+                               [num_valid + 1])[0:num_valid]
+
+    # K,    N
+    return f.cast(compact_ids, 'int32'), counts - 1
+
+
+def coord_image_to_compact_trimesh(coord_img, validity_mask, batch_shape=None, image_dims=None, dev=None, f=None):
+    """
+    Create compact trimesh from co-ordinate image, containing only the valid faces and the vertices they reference.
+    Valid face ids are found with a single cumulative-sum compaction, and the vertex indices of each face are computed
+    arithmetically from its id, without materialising the full index table. Unreferenced vertices are dropped and face
+    indices remapped, so the output buffers are proportional to the valid surface area. The mesh is flattened over the
+    batch, with faces and vertices ordered as in coord_image_to_trimesh.
+
+    :param coord_img: Image of co-ordinates *[batch_shape,h,w,3]*
+    :type coord_img: array
+    :param validity_mask: Boolean mask of where the coord image contains valid values *[batch_shape,h,w,1]*
+    :type validity_mask: array
+    :param batch_shape: Shape of batch. Inferred from inputs if None.
+    :type batch_shape: sequence of ints, optional
+    :param image_dims: Image dimensions. Inferred from inputs in None.
+    :type image_dims: sequence of ints, optional
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as x if None.
+    :type dev: str, optional
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: Referenced vertices *[m,3]*, trimesh indices into these vertices *[n,3]*, and batch indices of each
+             vertex *[m,num_batch_dims]*
+    """
+
+    f = _get_framework(coord_img, f=f)
+
+    if dev is None:
+        dev = f.get_device(coord_img)
+
+    if batch_shape is None:
+        batch_shape = f.shape(coord_img)[:-3]
+
+    if image_dims is None:
+        image_dims = f.shape(coord_img)[-3:-1]
+
+    # shapes as lists
+    batch_shape = list(batch_shape)
+    image_dims = list(image_dims)
+    num_batch_dims = len(batch_shape)
+    num_pixels = image_dims[0] * image_dims[1]
+    num_cells = (image_dims[0] - 1) * (image_dims[1] - 1)
+    num_faces = 2 * num_cells
+
+    # Face Validity #
+    # --------------#
+
+    # BS x H-1 x W-1 x 1
+    t00_validity = validity_mask[..., 0:image_dims[0] - 1, 0:image_dims[1] - 1, :]
+    t01_validity = validity_mask[..., 0:image_dims[0] - 1, 1:image_dims[1], :]
+    t02_validity = validity_mask[..., 1:image_dims[0], 0:image_dims[1] - 1, :]
+    t10_validity = validity_mask[..., 1:image_dims[0], 1:image_dims[1], :]
+    t11_validity = t01_validity
+    t12_validity = t02_validity
+
+    # BS x H-1 x W-1 x 1
+    t0_validity = f.logical_and(t00_validity, f.logical_and(t01_validity, t02_validity))
+    t1_validity = f.logical_and(t10_validity, f.logical_and(t11_validity, t12_validity))
+
+    # (prod(BS)x2x(H-1xW-1))
+    face_validity = f.reshape(f.concatenate((f.reshape(t0_validity, batch_shape + [1, -1]),
+                                             f.reshape(t1_validity, batch_shape + [1, -1])), -2), (-1,))
+
+    # N
+    face_ids, _ = _cumsum_compaction(face_validity, dev, f)
+
+    # Face Vertex Indices #
+    # --------------------#
+
+    # N x 1
+    face_ids = f.reshape(face_ids, (-1, 1))
+    batch_ids = face_ids // num_faces
+    local_face_ids = f.floormod(face_ids, num_faces)
+    is_t1 = local_face_ids >= num_cells
+    cell_ids = f.floormod(local_face_ids, num_cells)
+    t00 = batch_ids * num_pixels + (cell_ids // (image_dims[1] - 1)) * image_dims[1] +\
+        f.floormod(cell_ids, image_dims[1] - 1)
+    t01 = t00 + 1
+    t02 = t00 + image_dims[1]
+    t10 = t00 + image_dims[1] + 1
+
+    # N x 3
+    trimesh_indices = f.concatenate((f.where(is_t1, t10, t00), t01, t02), -1)
+
+    # Vertex Compaction #
+    # ------------------#
+
+    # (prod(BS)xHxW)
+    vertex_validity = f.reshape(f.scatter_nd(f.reshape(trimesh_indices, (-1, 1)),
+                                             f.ones_like(f.reshape(trimesh_indices, (-1,))),
+                                             [_reduce(_mul, batch_shape, 1) * num_pixels]) > 0, (-1,))
+
+    # M,    (prod(BS)xHxW)
+    vertex_ids, new_vertex_ids = _cumsum_compaction(vertex_validity, dev, f)
+
+    # N x 3
+    trimesh_indices = f.reshape(f.gather_nd(new_vertex_ids, f.reshape(trimesh_indices, (-1, 1))), (-1, 3))
+
+    # M x 3
+    vertices = f.gather_nd(f.reshape(coord_img, (-1, 3)), f.reshape(vertex_ids, (-1, 1)))
+
+    # M x num_batch_dims
+    vertex_batch_ids = vertex_ids // num_pixels
+    vertex_batch_indices_list = list()
+    for batch_dim in reversed(batch_shape):
+        vertex_batch_indices_list.insert(0, f.reshape(f.floormod(vertex_batch_ids, batch_dim), (-1, 1)))
+        vertex_batch_ids = vertex_batch_ids // batch_dim
+    vertex_batch_indices = f.concatenate(vertex_batch_indices_list, -1) if num_batch_dims > 0 else\
+        f.zeros((vertex_ids.shape[0], 0), 'int32', dev=dev)
+
+    # M x 3,    N x 3,    M x num_batch_dims
+    return vertices, trimesh_indices, vertex_batch_indices
+
+
+def sphere_trace_primitive_scene(primitive_scene, cam_geom, image_dims, max_steps=64, hit_threshold=1e-3,
+                                 max_distance=100., compaction_interval=8, batch_shape=None, dev=None, f=None):
+    """
+    Render depth and hit primitive index images of a primitive scene by sphere tracing, marching one ray per pixel
+    from the camera center along the world ray vectors, by the scene signed distance at each step. Rays terminate on
+    reaching the hit threshold, the maximum distance, or the maximum number of steps. Finished rays are frozen, and
+    every compaction interval the rays which are still active are gathered, so finished rays stop costing work. Each
+    compaction infers the number of active rays host-side, and so the tracing is only valid in eager mode. The scene
+    is traced separately for each batch entry.\n
+    `[reference] <https://graphics.stanford.edu/courses/cs348b-20-spring-content/uploads/hart.pdf>`_
+
+    :param primitive_scene: Primitive scene to render, with batch shape matching the camera geometry.
+    :type primitive_scene: PrimitiveScene
+    :param cam_geom: Camera geometry to render from.
+    :type cam_geom: CameraGeometry
+    :param image_dims: Image dimensions.
+    :type image_dims: sequence of ints
+    :param max_steps: Maximum number of marching steps per ray. Default is 64.
+    :type max_steps: int, optional
+    :param hit_threshold: Signed distance below which a ray is considered to hit the surface. Default is 1e-3.
+    :type hit_threshold: float, optional
+    :param max_distance: Distance along the ray beyond which a ray is considered to miss the scene. Default is 100.
+    :type max_distance: float, optional
+    :param compaction_interval: Number of marching steps between compactions of the active rays, each of which
+                                synchronizes with the host. Default is 8.
+    :type compaction_interval: int, optional
+    :param batch_shape: Shape of batch. Inferred from inputs if None.
+    :type batch_shape: sequence of ints, optional
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as x if None.
+    :type dev: str, optional
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: Depth image *[batch_shape,h,w,1]*, with zero depth for missed rays, and hit primitive index image
+             *[batch_shape,h,w,1]*, counting the spheres first followed by the cuboids, with -1 for missed rays
+    """
+
+    f = _get_framework(cam_geom.inv_full_mats_homo, f=f)
+
+    if batch_shape is None:
+        batch_shape = cam_geom.inv_full_mats_homo.shape[:-2]
+
+    if dev is None:
+        dev = f.get_device(cam_geom.inv_full_mats_homo)
+
+    # shapes as list
+    batch_shape = list(batch_shape)
+    image_dims = list(image_dims)
+    batch_size = _reduce(_mul, batch_shape, 1)
+    num_pixels = image_dims[0] * image_dims[1]
+
+    # Ray Setup #
+    # ----------#
+
+    # BS x 3 x 4
+    inv_full_mat = cam_geom.inv_full_mats_homo[..., 0:3, :]
+
+    # prod(BS) x 4
+    depth_rows = f.reshape(cam_geom.full_mats_homo[..., 2, :], [batch_size, 4])
+
+    # prod(BS) x 3
+    camera_centers = f.reshape(inv_full_mat[..., -1], [batch_size, 3])
+
+    # prod(BS) x (HxW) x 3
+    ray_vectors = f.reshape(_ivy_svg.pixel_coords_to_world_ray_vectors(
+        _ivy_svg.cached_uniform_pixel_coords_image(image_dims, batch_shape, dev=dev, f=f), inv_full_mat,
+        batch_shape=batch_shape, image_dims=image_dims, f=f), [batch_size, num_pixels, 3])
+
+    # prod(BS) x num_primitives x ...
+    primitive_arrays = [None if array is None else f.reshape(array, [batch_size] + list(array.shape[-num_dims:]))
+                        for array, num_dims in [(primitive_scene.sphere_positions, 3),
+                                                (primitive_scene.sphere_radii, 2),
+                                                (primitive_scene.cuboid_ext_mats, 3),
+                                                (primitive_scene.cuboid_dims, 2)]]
+
+    # Sphere Tracing #
+    # ---------------#
+
+    depth_images = list()
+    primitive_id_images = list()
+    for batch_id in range(batch_size):
+
+        scene = primitive_scene.__class__(*[None if array is None else array[batch_id]
+                                            for array in primitive_arrays], f=f)
+
+        # 3,    (HxW) x 3
+        camera_center = camera_centers[batch_id]
+        batch_ray_vectors = ray_vectors[batch_id]
+
+        # (HxW) x 1
+        ray_ids = f.reshape(f.arange(num_pixels, dtype_str='int32', dev=dev), (-1, 1))
+        distances = f.zeros((num_pixels, 1), dev=dev)
+        active = f.cast(f.ones((num_pixels, 1), dev=dev), 'bool')
+        hits = f.logical_not(active)
+
+        hit_ray_ids_list = list()
+        hit_distances_list = list()
+        for step in range(max_steps):
+
+            # A x 1
+            sdfs = scene.sdf(camera_center + distances * f.gather_nd(batch_ray_vectors, ray_ids))
+            hit = f.logical_and(active, sdfs < hit_threshold)
+            hits = f.logical_or(hits, hit)
+            marching = f.logical_and(active, f.logical_not(hit))
+            distances = f.where(marching, distances + sdfs, distances)
+            active = f.logical_and(marching, distances < max_distance)
+
+            if (step + 1) % compaction_interval != 0 and step != max_steps - 1:
+                continue
+
+            # hit and active ray compaction
+
+            # NH x 1
+            hit_indices = f.cast(f.indices_where(f.reshape(hits, (-1,))), 'int32')
+            if hit_indices.shape[0] > 0:
+                hit_ray_ids_list.append(f.gather_nd(ray_ids, hit_indices))
+                hit_distances_list.append(f.gather_nd(distances, hit_indices))
+
+            # A x 1
+            active_indices = f.cast(f.indices_where(f.reshape(active, (-1,))), 'int32')
+            if active_indices.shape[0] == 0:
+                break
+            ray_ids, distances, active = [f.gather_nd(item, active_indices) for item in [ray_ids, distances, active]]
+            hits = f.logical_not(active)
+
+        # Images #
+        # -------#
+
+        if hit_ray_ids_list:
+
+            # NH x 1
+            hit_ray_ids = f.concatenate(hit_ray_ids_list, 0)
+            hit_distances = f.concatenate(hit_distances_list, 0)
+
+            # NH x 3
+            hit_positions = camera_center + hit_distances * f.gather_nd(batch_ray_vectors, hit_ray_ids)
+
+            # NH x 1
+            _, _, hit_primitive_ids = scene.sdf_with_gradients(hit_positions)
+            hit_depths = f.reduce_sum(hit_positions * depth_rows[batch_id, 0:3], -1, keepdims=True) + \
+                depth_rows[batch_id, 3:4]
+
+            # (HxW) x 1
+            depth_images.append(f.scatter_nd(hit_ray_ids, hit_depths, [num_pixels, 1]))
+            primitive_id_images.append(f.scatter_nd(hit_ray_ids, f.cast(hit_primitive_ids, 'int32') + 1,
+                                                    [num_pixels, 1]) - 1)
+        else:
+            depth_images.append(f.zeros((num_pixels, 1), dev=dev))
+            primitive_id_images.append(-f.cast(f.ones((num_pixels, 1), dev=dev), 'int32'))
+
+    # BS x H x W x 1,    BS x H x W x 1
+    return f.reshape(f.stack(depth_images, 0), batch_shape + image_dims + [1]), \
+        f.reshape(f.stack(primitive_id_images, 0), batch_shape + image_dims + [1])
@@ -5,8 +5,93 @@ Collection of Singed Distance Functions
 # https://www.iquilezles.org/www/articles/distfunctions/distfunctions.htm
 
 # global
+import numpy as _np
+from operator import mul as _mul
+from functools import reduce as _reduce
 from ivy.framework_handler import get_framework as _get_framework
 
+MIN_DENOMINATOR = 1e-12
+
+
+def _sphere_signed_distances_per_primitive(sphere_positions, sphere_radii, query_positions, f):
+
+    # BS x NS x 1 x 3
+    sphere_positions = f.expand_dims(sphere_positions, -2)
+
+    # BS x 1 x NP x 3
+    query_positions = f.expand_dims(query_positions, -3)
+
+    # BS x NS x NP x 3
+    offsets = query_positions - sphere_positions
+
+    # BS x NS x NP x 1
+    distances_to_centre = f.reduce_sum(offsets ** 2, -1, keepdims=True)**0.5
+
+    # BS x NS x NP x 1
+    all_sdfs = distances_to_centre - f.expand_dims(sphere_radii, -2)
+
+    # BS x NS x NP x 1,    BS x NS x NP x 3,    BS x NS x NP x 1
+    return all_sdfs, offsets, distances_to_centre
+
+
+def _cuboid_signed_distances_per_primitive(cuboid_ext_mats, cuboid_dims, query_positions, batch_shape, f):
+
+    # shapes as list
+    batch_shape = list(batch_shape)
+    num_batch_dims = len(batch_shape)
+    batch_dims_for_trans = list(range(num_batch_dims))
+    num_cuboids = cuboid_ext_mats.shape[-3]
+    num_points = query_positions.shape[-2]
+
+    # BS x 3 x NP
+    query_positions_trans = f.transpose(
+        query_positions, batch_dims_for_trans + [num_batch_dims+1, num_batch_dims])
+
+    # BS x 1 x NP
+    ones = f.ones_like(query_positions_trans[..., 0:1, :])
+
+    # BS x 4 x NP
+    query_positions_trans_homo = f.concatenate((query_positions_trans, ones), -2)
+
+    # BS x NCx3 x 4
+    cuboid_ext_mats_flat = f.reshape(cuboid_ext_mats, batch_shape + [-1, 4])
+
+    # BS x NCx3 x NP
+    rel_query_positions_trans_flat = f.matmul(cuboid_ext_mats_flat, query_positions_trans_homo)
+
+    # BS x NC x 3 x NP
+    rel_query_positions_trans = f.reshape(rel_query_positions_trans_flat, batch_shape + [num_cuboids, 3, num_points])
+
+    # BS x NC x NP x 3
+    rel_query_positions = f.transpose(rel_query_positions_trans,
+                                      batch_dims_for_trans + [num_batch_dims, num_batch_dims+2, num_batch_dims+1])
+    q = f.abs(rel_query_positions) - f.expand_dims(cuboid_dims/2, -2)
+    q_max_clipped = f.maximum(q, 1e-12)
+
+    # BS x NC x NP x 1
+    q_min_clipped = f.minimum(f.reduce_max(q, -1, keepdims=True), 0.)
+    q_max_clipped_len = f.reduce_sum(q_max_clipped**2, -1, keepdims=True)**0.5
+    sdfs = q_max_clipped_len + q_min_clipped
+
+    # BS x NC x NP x 1,    BS x NC x NP x 3,    BS x NC x NP x 3
+    return sdfs, rel_query_positions, q
+
+
+def _closest_primitive(all_sdfs, all_gradients, f):
+
+    dev = f.get_device(all_sdfs)
+
+    # BS x NP x 1
+    sdfs = f.reduce_min(all_sdfs, -3)
+    closest_indices = f.cast(f.argmin(all_sdfs, -3), 'int32')
+
+    # BS x NPrim x NP x 1
+    closest_mask = f.cast(f.reshape(f.arange(all_sdfs.shape[-3], dtype_str='int32', dev=dev), [-1, 1, 1]) ==
+                          f.expand_dims(closest_indices, -3), 'float32')
+
+    # BS x NP x 1,    BS x NP x 3,    BS x NP x 1
+    return sdfs, f.reduce_sum(closest_mask * all_gradients, -3), closest_indices
+
 
 def sphere_signed_distances(sphere_positions, sphere_radii, query_positions, f=None):
     """
@@ -26,20 +111,295 @@ def sphere_signed_distances(sphere_positions, sphere_radii, query_positions, f=N
 
     f = _get_framework(sphere_positions, f=f)
 
-    # BS x NS x 1 x 3
-    sphere_positions = f.expand_dims(sphere_positions, -2)
+    # BS x NS x NP x 1
+    all_sdfs, _, _ = _sphere_signed_distances_per_primitive(sphere_positions, sphere_radii, query_positions, f)
 
-    # BS x 1 x NP x 3
-    query_positions = f.expand_dims(query_positions, -3)
+    # BS x NP x 1
+    return f.reduce_min(all_sdfs, -3)
 
-    # BS x NS x NP x 1
-    distances_to_centre = f.reduce_sum((query_positions - sphere_positions) ** 2, -1, keepdims=True)**0.5
 
-    # BS x NS x NP x 1
-    all_sdfs = distances_to_centre - f.expand_dims(sphere_radii, -2)
+def sphere_signed_distances_with_gradients(sphere_positions, sphere_radii, query_positions, f=None):
+    """
+    Return the signed distances of a set of query points from the sphere surfaces, together with the analytic
+    gradients of the signed distances, which are the outward surface normals of the closest spheres, and the indices
+    of the closest spheres, all from a single evaluation.\n
+    `[reference] <https://www.iquilezles.org/www/articles/distfunctions/distfunctions.htm>`_
+
+    :param sphere_positions: Positions of the spheres *[batch_shape,num_spheres,3]*
+    :type sphere_positions: array
+    :param sphere_radii: Radii of the spheres *[batch_shape,num_spheres,1]*
+    :type sphere_radii: array
+    :param query_positions: Points for which to query the signed distances *[batch_shape,num_points,3]*
+    :type query_positions: array
+    :param f: Machine learning framework. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: The distances of the query points from the closest sphere surface *[batch_shape,num_points,1]*, the
+             gradients of these distances *[batch_shape,num_points,3]*, and the closest sphere indices
+             *[batch_shape,num_points,1]*
+    """
+
+    f = _get_framework(sphere_positions, f=f)
+
+    # BS x NS x NP x 1,    BS x NS x NP x 3,    BS x NS x NP x 1
+    all_sdfs, offsets, distances_to_centre = _sphere_signed_distances_per_primitive(
+        sphere_positions, sphere_radii, query_positions, f)
+
+    # BS x NS x NP x 3
+    all_gradients = offsets / (distances_to_centre + MIN_DENOMINATOR)
+
+    # BS x NP x 1,    BS x NP x 3,    BS x NP x 1
+    return _closest_primitive(all_sdfs, all_gradients, f)
+
+
+def _sphere_grid_candidate_sdfs(sphere_positions, sphere_radii, query_positions, sorted_sphere_indices, cell_table,
+                                lower_corner, cell_size, cell_radius, grid_dims, offsets, max_count, dev, f):
+
+    # shapes as list
+    num_batches, num_points = query_positions.shape[0:2]
+    num_offsets = offsets.shape[0]
+    cells_per_batch = grid_dims[0] * grid_dims[1] * grid_dims[2]
+
+    # B x NP x 3, clamped just outside the grid, so that distant query cells cannot overflow the integer cast
+    query_cells = f.floor((query_positions - lower_corner) / cell_size)
+    query_cells = f.cast(f.minimum(f.maximum(query_cells, -cell_radius - 1.), f.array(
+        [float(item + cell_radius) for item in grid_dims], dtype_str='float32', dev=dev)), 'int32')
+
+    # B x NP x O x 3
+    neighbour_cells = f.expand_dims(query_cells, -2) + offsets
+
+    # B x NP x O
+    neighbour_validity = f.logical_and(f.logical_and(
+        f.logical_and(neighbour_cells[..., 0] >= 0, neighbour_cells[..., 0] < grid_dims[0]),
+        f.logical_and(neighbour_cells[..., 1] >= 0, neighbour_cells[..., 1] < grid_dims[1])),
+        f.logical_and(neighbour_cells[..., 2] >= 0, neighbour_cells[..., 2] < grid_dims[2]))
+    neighbour_keys = f.reshape(f.arange(num_batches, dtype_str='int32', dev=dev) * cells_per_batch,
+                               (num_batches, 1, 1)) + \
+        (neighbour_cells[..., 0] * grid_dims[1] + neighbour_cells[..., 1]) * grid_dims[2] + neighbour_cells[..., 2]
+    neighbour_keys = f.where(neighbour_validity, neighbour_keys, f.zeros_like(neighbour_keys))
+
+    # B x NP x O x 2
+    cell_rows = f.gather_nd(cell_table, f.expand_dims(neighbour_keys, -1))
+
+    # B x NP x O x 1
+    cell_starts = cell_rows[..., 0:1]
+    cell_counts = f.where(f.expand_dims(neighbour_validity, -1), cell_rows[..., 1:2], f.zeros_like(cell_starts))
+
+    # B x NP x O x K
+    count_range = f.arange(max_count, dtype_str='int32', dev=dev)
+    pair_validity = count_range < cell_counts
+    slots = cell_starts + count_range
+    slots = f.where(pair_validity, slots, f.zeros_like(slots))
+
+    # B x NP x O x K x 2
+    sphere_indices = f.gather_nd(sorted_sphere_indices, f.expand_dims(slots, -1))
+
+    # B x NP x O x K x 1
+    distances_to_centre = f.reduce_sum((f.reshape(query_positions, (num_batches, num_points, 1, 1, 3)) -
+                                        f.gather_nd(sphere_positions, sphere_indices)) ** 2, -1, keepdims=True) ** 0.5
+    pair_sdfs = distances_to_centre - f.gather_nd(sphere_radii, sphere_indices)
+    pair_sdfs = f.where(f.expand_dims(pair_validity, -1), pair_sdfs, f.ones_like(pair_sdfs) * _np.inf)
+
+    # B x NP x 1
+    return f.reduce_min(f.reshape(pair_sdfs, (num_batches, num_points, num_offsets * max_count)), -1, keepdims=True)
+
+
+def sphere_signed_distances_bucketed(sphere_positions, sphere_radii, query_positions, cell_size=None, cell_radius=1,
+                                     memory_budget=2**28, batch_shape=None, f=None):
+    """
+    Return the signed distances of a set of query points from the sphere surfaces, identical to
+    sphere_signed_distances, but only evaluating nearby candidate spheres for each query point. The sphere centres are
+    bucketed into a uniform grid, and each query point is evaluated against the spheres in the
+    :math:`(2r+1)^3` cells around its own cell. Any sphere outside of these cells has a signed distance greater than
+    the cutoff :math:`r \cdot cell\_size - max\_radius`, and so query points with candidate distances beyond
+    this cutoff, or without candidates, fall back to exact evaluation against all spheres. Memory and time are then
+    proportional to the number of candidate pairs, rather than num_spheres × num_points.
+    The cells of the spheres and query points, and the candidate and fallback distances, are all computed on the
+    device, with the query points processed in chunks sized from the memory budget. Only the sort of the sphere cells
+    and the selection of the fallback query points are data-dependent, and so this is only valid in eager mode.
+
+    :param sphere_positions: Positions of the spheres *[batch_shape,num_spheres,3]*
+    :type sphere_positions: array
+    :param sphere_radii: Radii of the spheres *[batch_shape,num_spheres,1]*
+    :type sphere_radii: array
+    :param query_positions: Points for which to query the signed distances *[batch_shape,num_points,3]*
+    :type query_positions: array
+    :param cell_size: Side length of the grid cells, must be positive. Default is the larger of the largest sphere
+                      radius and the side length of the sphere bounding box volume per sphere. If this is zero, for
+                      coplanar or coincident spheres of zero radius, all query points are evaluated exactly.
+    :type cell_size: float, optional
+    :param cell_radius: Radius r of the cell neighbourhood searched around each query point. Default is 1.
+    :type cell_radius: int, optional
+    :param memory_budget: Memory budget (bytes) for the grid cell table and the intermediate arrays of each chunk of
+                          query points. Default is 256MB.
+    :type memory_budget: int, optional
+    :param batch_shape: Shape of batch. Inferred from inputs if None.
+    :type batch_shape: sequence of ints, optional
+    :param f: Machine learning framework. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: The distances of the query points from the closest sphere surface *[batch_shape,num_points,1]*
+    """
+
+    f = _get_framework(sphere_positions, f=f)
+
+    if cell_size is not None and cell_size <= 0:
+        raise Exception('cell_size must be positive, but found {}.'.format(cell_size))
+
+    if batch_shape is None:
+        batch_shape = sphere_positions.shape[:-2]
+
+    dev = f.get_device(sphere_positions)
+
+    # shapes as list
+    batch_shape = list(batch_shape)
+    num_batches = _reduce(_mul, batch_shape, 1)
+    num_spheres = sphere_positions.shape[-2]
+    num_points = query_positions.shape[-2]
+    num_offsets = (2 * cell_radius + 1) ** 3
+
+    # B x NS x 3,    B x NS x 1,    B x NP x 3
+    sphere_positions = f.reshape(sphere_positions, [num_batches, num_spheres, 3])
+    sphere_radii = f.reshape(sphere_radii, [num_batches, num_spheres, 1])
+    query_positions = f.reshape(query_positions, [num_batches, num_points, 3])
+
+    # Grid #
+    # -----#
+
+    # 1 x 1 x 3
+    lower_corner = f.reduce_min(f.reshape(sphere_positions, (1, -1, 3)), 1, keepdims=True)
+    upper_corner = f.reduce_max(f.reshape(sphere_positions, (1, -1, 3)), 1, keepdims=True)
+
+    # the sphere extents and the largest radius determine the grid shape, and so are copied host-side
+
+    # 4
+    grid_stats = f.to_numpy(f.concatenate((f.reshape(upper_corner - lower_corner, (3,)),
+                                           f.reshape(f.reduce_max(sphere_radii), (1,))), 0)).astype(_np.float64)
+    extent = grid_stats[0:3]
+    max_radius = float(grid_stats[3])
+    if cell_size is None:
+        cell_size = max(float(_np.prod(_np.maximum(extent, max_radius)) / num_spheres) ** (1 / 3), max_radius)
+    cutoff = cell_radius * cell_size - max_radius
+
+    # spheres without spatial extent cannot be bucketed, and so all query points fall back to exact evaluation
+    bucketed = cell_size >= MIN_DENOMINATOR
+    grid_dims = [int(item) + 1 for item in _np.floor(extent / cell_size)] if bucketed else [1, 1, 1]
+    num_cells = num_batches * grid_dims[0] * grid_dims[1] * grid_dims[2]
+
+    # Chunk Sizes #
+    # ------------#
+
+    # the dense cell table holds the start and count of each cell, as 4 byte integers
+    table_bytes = 8 * num_cells if bucketed else 0
+
+    # per fallback query point: the gathered sphere positions, their offsets, distances and radii, all 4 bytes
+    bytes_per_fallback_query = 4 * num_spheres * 8
+
+    if memory_budget < table_bytes + bytes_per_fallback_query:
+        raise Exception('memory_budget of {} bytes cannot hold the grid cell table and a single query point, which '
+                        'need at least {} bytes. Either cell_size or memory_budget must be increased.'.format(
+                            memory_budget, table_bytes + bytes_per_fallback_query))
+
+    if bucketed:
+
+        # B x NS x 3, clamped to the host-side grid dimensions, which may differ from the device by rounding
+        sphere_cells = f.cast(f.minimum(f.floor((sphere_positions - lower_corner) / cell_size), f.array(
+            [float(item - 1) for item in grid_dims], dtype_str='float32', dev=dev)), 'int32')
+
+        # B x NS
+        sphere_keys = f.reshape(f.arange(num_batches, dtype_str='int32', dev=dev) *
+                                (grid_dims[0] * grid_dims[1] * grid_dims[2]), (num_batches, 1)) + \
+            (sphere_cells[..., 0] * grid_dims[1] + sphere_cells[..., 1]) * grid_dims[2] + sphere_cells[..., 2]
+
+        # the data-dependent sort of the sphere cells is computed host-side
+
+        # B*NS
+        sphere_keys_np = _np.reshape(f.to_numpy(sphere_keys), (-1,)).astype(_np.int64)
+        order = _np.argsort(sphere_keys_np, kind='stable')
+
+        # NC
+        cell_counts = _np.bincount(sphere_keys_np, minlength=num_cells)
+        max_count = int(_np.max(cell_counts))
+
+    else:
+        max_count = 0
+
+    # per query point and batch: the neighbour cells and their table rows, and the gathered sphere indices,
+    # positions, offsets and distances of each candidate pair, all 4 bytes
+    bytes_per_query = 4 * num_batches * num_offsets * (8 + 11 * max_count)
+
+    required_bytes = table_bytes + max(bytes_per_query, bytes_per_fallback_query)
+    if memory_budget < required_bytes:
+        raise Exception('memory_budget of {} bytes cannot hold the grid cell table and a single query point, which '
+                        'need {} bytes. Either cell_size or memory_budget must be increased.'.format(
+                            memory_budget, required_bytes))
+    chunk_size = int((memory_budget - table_bytes) // bytes_per_query)
+    fallback_chunk_size = int((memory_budget - table_bytes) // bytes_per_fallback_query)
+
+    if bucketed:
+
+        # NC x 2
+        cell_table = f.array(_np.stack((_np.cumsum(cell_counts) - cell_counts, cell_counts), -1).astype(_np.int32),
+                             dtype_str='int32', dev=dev)
+
+        # B*NS x 2
+        sorted_sphere_indices = f.array(_np.stack((order // num_spheres, order % num_spheres), -1).astype(_np.int32),
+                                        dtype_str='int32', dev=dev)
+
+        # O x 3
+        offset_range = _np.arange(-cell_radius, cell_radius + 1)
+        offsets = f.array(_np.stack(_np.meshgrid(offset_range, offset_range, offset_range, indexing='ij'),
+                                    -1).reshape(-1, 3).astype(_np.int32), dtype_str='int32', dev=dev)
+
+    # Query Chunks #
+    # -------------#
+
+    all_sdfs = []
+    for start in range(0, num_points, chunk_size):
+
+        # B x NPC x 3
+        query_chunk = query_positions[:, start:start + chunk_size]
+        num_chunk_points = query_chunk.shape[1]
+
+        # B x NPC x 1
+        if bucketed:
+            chunk_sdfs = _sphere_grid_candidate_sdfs(
+                sphere_positions, sphere_radii, query_chunk, sorted_sphere_indices, cell_table, lower_corner,
+                cell_size, cell_radius, grid_dims, offsets, max_count, dev, f)
+        else:
+            chunk_sdfs = f.ones((num_batches, num_chunk_points, 1), dev=dev) * _np.inf
+        fallback_mask = f.logical_not(chunk_sdfs < cutoff)
+
+        # Exact Fallback #
+        # ---------------#
+
+        # NF x 2
+        fallback_indices = f.cast(f.indices_where(fallback_mask[..., 0]), 'int32')
+        num_fallback = fallback_indices.shape[0]
+        if num_fallback == 0:
+            all_sdfs.append(chunk_sdfs)
+            continue
+
+        # the fallback query points are evaluated against all spheres of their batch, in chunks of bounded size
+
+        fallback_sdfs = list()
+        for fallback_start in range(0, num_fallback, fallback_chunk_size):
+
+            # NFC x 2
+            fallback_chunk_indices = fallback_indices[fallback_start:fallback_start + fallback_chunk_size]
+            fallback_batch_indices = fallback_chunk_indices[:, 0:1]
+
+            # NFC x 1
+            fallback_sdfs.append(sphere_signed_distances(
+                f.gather_nd(sphere_positions, fallback_batch_indices),
+                f.gather_nd(sphere_radii, fallback_batch_indices),
+                f.expand_dims(f.gather_nd(query_chunk, fallback_chunk_indices), -2), f=f)[:, 0])
+
+        # B x NPC x 1
+        exact_sdfs = f.scatter_nd(fallback_indices, f.concatenate(fallback_sdfs, 0),
+                                  [num_batches, num_chunk_points, 1], reduction='sum')
+        all_sdfs.append(f.where(fallback_mask, exact_sdfs, chunk_sdfs))
 
     # BS x NP x 1
-    return f.reduce_min(all_sdfs, -3)
+    return f.reshape(f.concatenate(all_sdfs, 1), batch_shape + [num_points, 1])
 
 
 def cuboid_signed_distances(cuboid_ext_mats, cuboid_dims, query_positions, batch_shape=None, f=None):
@@ -65,42 +425,153 @@ def cuboid_signed_distances(cuboid_ext_mats, cuboid_dims, query_positions, batch
     if batch_shape is None:
         batch_shape = cuboid_ext_mats.shape[:-3]
 
-    # shapes as list
-    batch_shape = list(batch_shape)
-    num_batch_dims = len(batch_shape)
-    batch_dims_for_trans = list(range(num_batch_dims))
-    num_cuboids = cuboid_ext_mats.shape[-3]
-    num_points = query_positions.shape[-2]
+    # BS x NC x NP x 1
+    sdfs, _, _ = _cuboid_signed_distances_per_primitive(cuboid_ext_mats, cuboid_dims, query_positions, batch_shape, f)
 
-    # BS x 3 x NP
-    query_positions_trans = f.transpose(
-        query_positions, batch_dims_for_trans + [num_batch_dims+1, num_batch_dims])
+    # BS x NP x 1
+    return f.reduce_min(sdfs, -3)
 
-    # BS x 1 x NP
-    ones = f.ones_like(query_positions_trans[..., 0:1, :])
 
-    # BS x 4 x NP
-    query_positions_trans_homo = f.concatenate((query_positions_trans, ones), -2)
+def cuboid_signed_distances_with_gradients(cuboid_ext_mats, cuboid_dims, query_positions, batch_shape=None, f=None):
+    """
+    Return the signed distances of a set of query points from the cuboid surfaces, together with the analytic
+    gradients of the signed distances, and the indices of the closest cuboids, all from a single evaluation. Outside
+    of a cuboid, the gradient points from the closest surface point to the query point. Inside, it is the outward
+    normal of the closest face.\n
+    `[reference] <https://www.iquilezles.org/www/articles/distfunctions/distfunctions.htm>`_
 
-    # BS x NCx3 x 4
-    cuboid_ext_mats_flat = f.reshape(cuboid_ext_mats, batch_shape + [-1, 4])
+    :param cuboid_ext_mats: Extrinsic matrices of the cuboids *[batch_shape,num_cuboids,3,4]*
+    :type cuboid_ext_mats: array
+    :param cuboid_dims: Dimensions of the cuboids, in the order x, y, z *[batch_shape,num_cuboids,3]*
+    :type cuboid_dims: array
+    :param query_positions: Points for which to query the signed distances *[batch_shape,num_points,3]*
+    :type query_positions: array
+    :param batch_shape: Shape of batch. Assumed no batches if None.
+    :type batch_shape: sequence of ints, optional
+    :param f: Machine learning framework. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: The distances of the query points from the closest cuboid surface *[batch_shape,num_points,1]*, the
+             gradients of these distances *[batch_shape,num_points,3]*, and the closest cuboid indices
+             *[batch_shape,num_points,1]*
+    """
 
-    # BS x NCx3 x NP
-    rel_query_positions_trans_flat = f.matmul(cuboid_ext_mats_flat, query_positions_trans_homo)
+    f = _get_framework(cuboid_ext_mats, f=f)
 
-    # BS x NC x 3 x NP
-    rel_query_positions_trans = f.reshape(rel_query_positions_trans_flat, batch_shape + [num_cuboids, 3, num_points])
+    if batch_shape is None:
+        batch_shape = cuboid_ext_mats.shape[:-3]
+
+    # BS x NC x NP x 1,    BS x NC x NP x 3,    BS x NC x NP x 3
+    sdfs, rel_query_positions, q = _cuboid_signed_distances_per_primitive(
+        cuboid_ext_mats, cuboid_dims, query_positions, batch_shape, f)
 
     # BS x NC x NP x 3
-    rel_query_positions = f.transpose(rel_query_positions_trans,
-                                      batch_dims_for_trans + [num_batch_dims, num_batch_dims+2, num_batch_dims+1])
-    q = f.abs(rel_query_positions) - f.expand_dims(cuboid_dims/2, -2)
-    q_max_clipped = f.maximum(q, 1e-12)
+    signs = f.where(rel_query_positions >= 0, f.ones_like(rel_query_positions), -f.ones_like(rel_query_positions))
 
     # BS x NC x NP x 1
-    q_min_clipped = f.minimum(f.reduce_max(q, -1, keepdims=True), 0.)
-    q_max_clipped_len = f.reduce_sum(q_max_clipped**2, -1, keepdims=True)**0.5
-    sdfs = q_max_clipped_len + q_min_clipped
+    q_max = f.reduce_max(q, -1, keepdims=True)
+
+    # outside, the normalized positive part of q, inside, the axis of the closest face
+
+    # BS x NC x NP x 3
+    q_pos = f.maximum(q, 0.)
+    outside_gradients = q_pos / (f.reduce_sum(q_pos ** 2, -1, keepdims=True) ** 0.5 + MIN_DENOMINATOR)
+    inside_gradients = f.cast(f.reshape(f.arange(3, dtype_str='int32', dev=f.get_device(q)),
+                                        [1] * (len(q.shape) - 1) + [3]) ==
+                              f.expand_dims(f.cast(f.argmax(q, -1), 'int32'), -1), 'float32')
+    local_gradients = signs * f.where(q_max > 0, outside_gradients, inside_gradients)
+
+    # BS x NC x NP x 3
+    all_gradients = f.matmul(local_gradients, cuboid_ext_mats[..., 0:3])
+
+    # BS x NP x 1,    BS x NP x 3,    BS x NP x 1
+    return _closest_primitive(sdfs, all_gradients, f)
+
+
+def sdf_grid_lookup(sdf_grid, grid_lower_corner, grid_res, query_positions, with_gradients=False, f=None):
+    """
+    Return the signed distances of a set of query points, by trilinear interpolation of signed distances sampled on a
+    regular grid, with the grid values located at the grid nodes. Query points outside of the grid are clamped to the
+    grid boundary. The gradients of the trilinear interpolant with respect to the query points can also be returned.\n
+    `[reference] <https://en.wikipedia.org/wiki/Trilinear_interpolation>`_
+
+    :param sdf_grid: Signed distances sampled at the grid nodes *[batch_shape,x,y,z,1]*
+    :type sdf_grid: array
+    :param grid_lower_corner: Position of the first grid node *[batch_shape,3]* or *[3]*
+    :type grid_lower_corner: array
+    :param grid_res: Spacing between grid nodes in x, y, z directions *[batch_shape,3]* or *[3]*
+    :type grid_res: array
+    :param query_positions: Points for which to query the signed distances *[batch_shape,num_points,3]*
+    :type query_positions: array
+    :param with_gradients: Whether to also return the gradients of the signed distances. Default is False.
+    :type with_gradients: bool, optional
+    :param f: Machine learning framework. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: The interpolated signed distances of the query points *[batch_shape,num_points,1]*, and optionally their
+             gradients *[batch_shape,num_points,3]*
+    """
+
+    f = _get_framework(sdf_grid, f=f)
+    dev = f.get_device(sdf_grid)
+
+    # shapes as list
+    batch_shape = list(sdf_grid.shape[:-4])
+    grid_dims = list(sdf_grid.shape[-4:-1])
+    num_batches = _reduce(_mul, batch_shape, 1)
+    num_points = query_positions.shape[-2]
+
+    # B x X x Y x Z x 1,    B x NP x 3
+    sdf_grid = f.reshape(sdf_grid, [num_batches] + grid_dims + [1])
+    query_positions = f.reshape(query_positions, [num_batches, num_points, 3])
+
+    # B x 1 x 3 or 1 x 1 x 3
+    grid_lower_corner = f.reshape(grid_lower_corner, [-1, 1, 3])
+    grid_res = f.reshape(grid_res, [-1, 1, 3])
+
+    # 3
+    max_node_indices = f.array([float(dim - 1) for dim in grid_dims], dev=dev)
+    max_lower_node_indices = f.array([float(max(dim - 2, 0)) for dim in grid_dims], dev=dev)
+
+    # B x NP x 3
+    node_coords = f.minimum(f.maximum((query_positions - grid_lower_corner) / grid_res, 0.), max_node_indices)
+    lower_node_indices = f.minimum(f.floor(node_coords), max_lower_node_indices)
+    fractions = node_coords - lower_node_indices
+
+    # 8 x 3
+    corner_offsets = f.array([[i, j, k] for i in [0., 1.] for j in [0., 1.] for k in [0., 1.]], dev=dev)
+
+    # B x NP x 8 x 3
+    corner_indices = f.cast(f.minimum(f.expand_dims(lower_node_indices, -2) + corner_offsets, max_node_indices),
+                            'int32')
+    batch_indices = f.tile(f.reshape(f.arange(num_batches, dtype_str='int32', dev=dev), [num_batches, 1, 1, 1]),
+                           [1, num_points, 8, 1])
+
+    # B x NP x 8
+    corner_sdfs = f.gather_nd(sdf_grid, f.concatenate((batch_indices, corner_indices), -1))[..., 0]
+
+    # B x NP x 8 x 3
+    fractions = f.expand_dims(fractions, -2)
+    corner_factors = corner_offsets * fractions + (1 - corner_offsets) * (1 - fractions)
+
+    # B x NP x 8
+    corner_weights = corner_factors[..., 0] * corner_factors[..., 1] * corner_factors[..., 2]
 
     # BS x NP x 1
-    return f.reduce_min(sdfs, -3)
+    sdfs = f.reshape(f.reduce_sum(corner_weights * corner_sdfs, -1, keepdims=True), batch_shape + [num_points, 1])
+
+    if not with_gradients:
+        return sdfs
+
+    # B x NP x 8 x 3
+    corner_factor_grads = 2 * corner_offsets - 1
+
+    # B x NP x 8
+    x_grads = corner_factor_grads[..., 0] * corner_factors[..., 1] * corner_factors[..., 2]
+    y_grads = corner_factors[..., 0] * corner_factor_grads[..., 1] * corner_factors[..., 2]
+    z_grads = corner_factors[..., 0] * corner_factors[..., 1] * corner_factor_grads[..., 2]
+
+    # B x NP x 3
+    grads = f.concatenate([f.reduce_sum(grad * corner_sdfs, -1, keepdims=True)
+                           for grad in [x_grads, y_grads, z_grads]], -1) / grid_res
+
+    # BS x NP x 1,    BS x NP x 3
+    return sdfs, f.reshape(grads, batch_shape + [num_points, 3])
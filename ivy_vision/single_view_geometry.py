@@ -10,6 +10,7 @@ import ivy_mech as _ivy_mec
 from ivy.framework_handler import get_framework as _get_framework
 
 # local
+from ivy_vision import caching as _ivy_caching
 from ivy_vision import projective_geometry as _ivy_pg
 from ivy_vision.containers import Intrinsics as _Intrinsics
 from ivy_vision.containers import Extrinsics as _Extrinsics
@@ -17,6 +18,10 @@ from ivy_vision.containers import CameraGeometry as _CameraGeometry
 
 
 MIN_DENOMINATOR = 1e-12
+UNIFORM_PIXEL_COORDS_CACHE_SIZE = 32
+
+
+_uniform_pixel_coords_cache = _ivy_caching.LRUCache(UNIFORM_PIXEL_COORDS_CACHE_SIZE)
 
 
 def create_uniform_pixel_coords_image(image_dims, batch_shape=None, normalized=False, dev='cpu', f=None):
@@ -78,6 +83,87 @@ def create_uniform_pixel_coords_image(image_dims, batch_shape=None, normalized=F
                                   flat_shape), tile_shape)
 
 
+def cached_uniform_pixel_coords_image(image_dims, batch_shape=None, normalized=False, dev='cpu', f=None):
+    """
+    Memoized equivalent of create_uniform_pixel_coords_image. Images are cached in a bounded least-recently-used cache,
+    keyed on image dimensions, batch shape, normalization, device and framework. The unbatched image is built once per
+    key, and for numpy arrays the batched image is a read-only broadcast view of it, rather than a tiled copy. Returned
+    arrays are shared between calls and with the cache, and are not copied. Numpy arrays are marked read-only and jax
+    arrays are immutable, but torch tensors and mxnet arrays are not protected, and so callers must copy these before
+    any in-place modification, which would otherwise corrupt the cached image. Symbolic graph tensors are never
+    cached.
+
+    :param image_dims: Image dimensions.
+    :type image_dims: sequence of ints.
+    :param batch_shape: Shape of batch. Assumed no batch dimensions if None.
+    :type batch_shape: sequence of ints, optional
+    :param normalized: Whether to normalize x-y pixel co-ordinates to the range 0-1.
+    :type normalized: bool
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc.
+    :type dev: str
+    :param f: Machine learning framework. Global framework used if None.
+    :type f: ml_framework, optional
+    :return: Image of homogeneous pixel co-ordinates *[batch_shape,height,width,3]*
+    """
+
+    f = _get_framework(f=f)
+
+    # shapes as lists
+    batch_shape = [] if batch_shape is None else batch_shape
+    batch_shape = list(batch_shape)
+    image_dims = list(image_dims)
+
+    key = (tuple(image_dims), tuple(batch_shape), bool(normalized), dev, f)
+    uniform_pixel_coords = _uniform_pixel_coords_cache.get(key)
+    if uniform_pixel_coords is not None:
+        return uniform_pixel_coords
+
+    if batch_shape:
+        # H x W x 3
+        base_uniform_pixel_coords = cached_uniform_pixel_coords_image(image_dims, None, normalized, dev, f)
+
+        # BS x H x W x 3
+        uniform_pixel_coords = _ivy_caching.broadcast_to_batch(base_uniform_pixel_coords, batch_shape, f)
+    else:
+        # H x W x 3
+        uniform_pixel_coords = create_uniform_pixel_coords_image(image_dims, None, normalized, dev, f)
+        if isinstance(uniform_pixel_coords, np.ndarray):
+            uniform_pixel_coords.setflags(write=False)
+
+    if not _ivy_caching.is_concrete(uniform_pixel_coords[..., 0:1, 0:1, 0:1], f):
+        return uniform_pixel_coords
+
+    _uniform_pixel_coords_cache.put(key, uniform_pixel_coords)
+    return uniform_pixel_coords
+
+
+def uniform_pixel_coords_cache_info():
+    """
+    Return the hit and miss counters, current size, and maximum size of the uniform pixel co-ordinates cache.
+
+    :return: Dict of cache statistics, with keys hits, misses, size and max_size.
+    """
+    return _uniform_pixel_coords_cache.info()
+
+
+def clear_uniform_pixel_coords_cache():
+    """
+    Remove all entries from the uniform pixel co-ordinates cache, and reset the hit and miss counters.
+    """
+    _uniform_pixel_coords_cache.clear()
+
+
+def set_uniform_pixel_coords_cache_size(max_size):
+    """
+    Set the maximum number of entries in the uniform pixel co-ordinates cache, evicting the least recently used entries
+    if the cache is already larger.
+
+    :param max_size: Maximum number of cached images.
+    :type max_size: int
+    """
+    _uniform_pixel_coords_cache.resize(max_size)
+
+
 def persp_angles_to_focal_lengths(persp_angles, image_dims, dev=None, f=None):
     """
     Compute focal lengths :math:`f_x, f_y` from perspective angles :math:`θ_x, θ_y`.\n
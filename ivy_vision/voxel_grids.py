@@ -3,53 +3,20 @@ Collection of Voxel-Grid Functions
 """
 
 # global
+import os as _os
+import numpy as _np
+from operator import mul as _mul
+from functools import reduce as _reduce
 from ivy.framework_handler import get_framework as _get_framework
 
-MIN_DENOMINATOR = 1e-12
-
-
-def coords_to_voxel_grid(coords, voxel_shape_spec, mode='DIMS', coord_bounds=None, features=None, batch_shape=None,
-                         dev=None, f=None):
-    """
-    Create voxel grid :math:`\mathbf{X}_v\in\mathbb{R}^{x×y×z×(3+N+1)}` from homogeneous co-ordinates
-    :math:`\mathbf{X}_w\in\mathbb{R}^{num\_coords×4}`. Each voxel contains 3+N+1 values: the mean normalized
-    co-ordinate inside the voxel for the projected pixels with :math:`0 < x, y, z < 1`, N coordinte features (optional),
-    and also the number of projected pixels inside the voxel.
-    Grid resolutions and dimensions are also returned separately for each entry in the batch.
-    Note that the final batched voxel grid returned uses the maximum grid dimensions across the batch, this means
-    some returned grids may contain redundant space, with all but the single largest batched grid occupying a subset
-    of the grid space, originating from the corner of minimum :math:`x,y,z` values.\n
-    `[reference] <https://en.wikipedia.org/wiki/Voxel>`_
-
-    :param coords: Homogeneous co-ordinates *[batch_shape,c,4]*
-    :type coords: array
-    :param voxel_shape_spec: Either the number of voxels in x,y,z directions, or the resolutions (metres) in x,y,z
-                                directions, depending on mode. Batched or unbatched. *[batch_shape,3]* or *[3]*
-    :type voxel_shape_spec: array
-    :param mode: Shape specification mode, either "DIMS" or "RES"
-    :type mode: str
-    :param coord_bounds: Co-ordinate x, y, z boundaries *[batch_shape,6]* or *[6]*
-    :type coord_bounds: array
-    :param features: Co-ordinate features *[batch_shape,c,4]*.
-                              E.g. RGB values, low-dimensional features, etc.
-                              Features mapping to the same voxel are averaged.
-    :type features: array
-    :param batch_shape: Shape of batch. Inferred from inputs if None.
-    :type batch_shape: sequence of ints, optional
-    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as x if None.
-    :type dev: str, optional
-    :param f: Machine learning library. Inferred from inputs if None.
-    :type f: ml_framework, optional
-    :return: Voxel grid *[batch_shape,x_max,v_max,z_max,3+feature_size+1]*, dimensions *[batch_shape,3]*, resolutions *[batch_shape,3]*, voxel_grid_lower_corners *[batch_shape,3]*
-    """
+# local
+from ivy_vision import single_view_geometry as _ivy_svg
 
-    f = _get_framework(coords, f=f)
+MIN_DENOMINATOR = 1e-12
 
-    if batch_shape is None:
-        batch_shape = coords.shape[:-2]
 
-    if dev is None:
-        dev = f.get_device(coords)
+def _voxelize_coords(coords, voxel_shape_spec, mode, coord_bounds, features, batch_shape, dev, f, coord_extents=None,
+                     with_valid_indices=False):
 
     # shapes as list
     batch_shape = list(batch_shape)
@@ -107,8 +74,12 @@ def coords_to_voxel_grid(coords, voxel_shape_spec, mode='DIMS', coord_bounds=Non
         full_validity_mask = f.cast(f.ones(batch_shape + [num_coords_per_batch]), 'bool')
 
         # BS x 1 x 3
-        bb_mins = f.reduce_min(coords, axis=-2, keepdims=True)
-        bb_maxs = f.reduce_max(coords, axis=-2, keepdims=True)
+        if coord_extents is None:
+            bb_mins = f.reduce_min(coords, axis=-2, keepdims=True)
+            bb_maxs = f.reduce_max(coords, axis=-2, keepdims=True)
+        else:
+            bb_mins = coord_extents[..., 0:3]
+            bb_maxs = coord_extents[..., 3:6]
         bb_ranges = bb_maxs - bb_mins
 
     # get voxel dimensions
@@ -159,19 +130,1480 @@ def coords_to_voxel_grid(coords, voxel_shape_spec, mode='DIMS', coord_bounds=Non
     voxel_values_pruned_flat =\
         f.concatenate((voxel_values_pruned_flat, f.ones([total_num_valid_coords, 1], dev=dev)), -1)
 
-    # get max dims list for scatter
+    if with_valid_indices:
+        # TNVC x len(BS)+3,    TNVC x 4+feature_size,    BS x 1 x 3,    BS x 1 x 3,    BS x 1 x 3,    TNVC x len(BS)+1
+        return all_indices_pruned_flat, voxel_values_pruned_flat, dims, res, bb_mins, valid_coord_indices
+
+    # TNVC x len(BS)+3,    TNVC x 4+feature_size,    BS x 1 x 3,    BS x 1 x 3,    BS x 1 x 3
+    return all_indices_pruned_flat, voxel_values_pruned_flat, dims, res, bb_mins
+
+
+def _morton_order(all_indices, dims, num_batch_dims, dev, f):
+
+    # the data-dependent sort is computed host-side, ordering first by batch, then by morton code
+
+    # scalar
+    max_dim = int(_np.max(f.to_numpy(dims)))
+    num_bits = max(max_dim - 1, 1).bit_length()
+
+    # TNVC
+    morton_codes_np = f.to_numpy(voxel_morton_codes(all_indices[..., num_batch_dims:], num_bits, f))
+
+    # TNVC x len(BS)
+    batch_indices_np = f.to_numpy(all_indices[..., 0:num_batch_dims]).astype(_np.int64)
+
+    # TNVC
+    order = _np.lexsort((morton_codes_np,) + tuple(batch_indices_np.T[::-1]))
+    return f.array(_np.reshape(order, (-1, 1)).astype(_np.int32), dtype_str='int32', dev=dev) \
+        if order.shape[0] > 0 else f.zeros((0, 1), 'int32', dev=dev)
+
+
+def voxel_morton_codes(voxel_indices, num_bits=10, f=None):
+    """
+    Compute the Morton (Z-order) codes of integer voxel indices, by interleaving the bits of the x, y and z indices,
+    with x occupying the least significant bit of each triplet. Voxels which are close in the grid are mostly close in
+    Morton order, making this a cache-friendly ordering for scattering and querying voxels. Codes of up to 10 bits per
+    axis are 32 bit integers, and longer codes are 64 bit integers, which require 64 bit types in jax.\n
+    `[reference] <https://en.wikipedia.org/wiki/Z-order_curve>`_
+
+    :param voxel_indices: Integer voxel indices *[batch_shape,3]*
+    :type voxel_indices: array
+    :param num_bits: Number of bits per axis to interleave. At most 21, for the codes to fit in 64 bit integers.
+    :type num_bits: int, optional
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: Morton codes *[batch_shape]*
+    """
+
+    f = _get_framework(voxel_indices, f=f)
+
+    if num_bits > 21:
+        raise Exception('num_bits must be at most 21, for the codes to fit in 64 bit integers, '
+                        'but found {}.'.format(num_bits))
+
+    # BS x 3
+    voxel_indices = f.cast(voxel_indices, 'int32' if num_bits <= 10 else 'int64')
+
+    # BS
+    codes = f.zeros_like(voxel_indices[..., 0])
+    for bit in range(num_bits):
+        for axis in range(3):
+            codes = codes + ((voxel_indices[..., axis] // 2 ** bit) % 2) * 2 ** (3 * bit + axis)
+    return codes
+
+
+def _voxel_grid_scatter_shape(dims, batch_shape, feature_size, f):
+
+    # shapes as list
+    num_batch_dims = len(batch_shape)
+
     if num_batch_dims > 0:
         max_dims = f.reduce_max(f.reshape(dims, batch_shape + [3]), axis=list(range(num_batch_dims)))
     else:
         max_dims = f.reshape(dims, batch_shape + [3])
     batch_shape_array_list = [f.array(batch_shape, 'int32')] if num_batch_dims != 0 else []
-    total_dims_list = f.to_list(f.concatenate(batch_shape_array_list +
-                                                    [max_dims, f.array([4 + feature_size], 'int32')], -1))
+    return f.to_list(f.concatenate(batch_shape_array_list +
+                                         [max_dims, f.array([4 + feature_size], 'int32')], -1))
+
+
+def coords_to_voxel_grid(coords, voxel_shape_spec, mode='DIMS', coord_bounds=None, features=None, batch_shape=None,
+                         dev=None, f=None, morton_order=False):
+    """
+    Create voxel grid :math:`\mathbf{X}_v\in\mathbb{R}^{x×y×z×(3+N+1)}` from homogeneous co-ordinates
+    :math:`\mathbf{X}_w\in\mathbb{R}^{num\_coords×4}`. Each voxel contains 3+N+1 values: the mean normalized
+    co-ordinate inside the voxel for the projected pixels with :math:`0 < x, y, z < 1`, N coordinte features (optional),
+    and also the number of projected pixels inside the voxel.
+    Grid resolutions and dimensions are also returned separately for each entry in the batch.
+    Note that the final batched voxel grid returned uses the maximum grid dimensions across the batch, this means
+    some returned grids may contain redundant space, with all but the single largest batched grid occupying a subset
+    of the grid space, originating from the corner of minimum :math:`x,y,z` values.\n
+    `[reference] <https://en.wikipedia.org/wiki/Voxel>`_
+
+    :param coords: Homogeneous co-ordinates *[batch_shape,c,4]*
+    :type coords: array
+    :param voxel_shape_spec: Either the number of voxels in x,y,z directions, or the resolutions (metres) in x,y,z
+                                directions, depending on mode. Batched or unbatched. *[batch_shape,3]* or *[3]*
+    :type voxel_shape_spec: array
+    :param mode: Shape specification mode, either "DIMS" or "RES"
+    :type mode: str
+    :param coord_bounds: Co-ordinate x, y, z boundaries *[batch_shape,6]* or *[6]*
+    :type coord_bounds: array
+    :param features: Co-ordinate features *[batch_shape,c,4]*.
+                              E.g. RGB values, low-dimensional features, etc.
+                              Features mapping to the same voxel are averaged.
+    :type features: array
+    :param batch_shape: Shape of batch. Inferred from inputs if None.
+    :type batch_shape: sequence of ints, optional
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as x if None.
+    :type dev: str, optional
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :param morton_order: Whether to sort the valid co-ordinates by the Morton code of their voxel index before the
+                         scatter, and also return this ordering. The codes are 64 bit, supporting up to 2^21 voxels
+                         per axis. Only valid in eager mode. Default is False.
+    :type morton_order: bool, optional
+    :return: Voxel grid *[batch_shape,x_max,v_max,z_max,3+feature_size+1]*, dimensions *[batch_shape,3]*, resolutions *[batch_shape,3]*, voxel_grid_lower_corners *[batch_shape,3]*, and if morton_order, the batch and co-ordinate indices of the valid co-ordinates in Morton order *[num_valid_coords,len(batch_shape)+1]*
+    """
+
+    f = _get_framework(coords, f=f)
+
+    if batch_shape is None:
+        batch_shape = coords.shape[:-2]
+
+    if dev is None:
+        dev = f.get_device(coords)
+
+    # shapes as list
+    batch_shape = list(batch_shape)
+    num_batch_dims = len(batch_shape)
+    feature_size = 0 if features is None else features.shape[-1]
+
+    # TNVC x len(BS)+3,    TNVC x 4+feature_size,    BS x 1 x 3,    BS x 1 x 3,    BS x 1 x 3,    TNVC x len(BS)+1
+    all_indices_pruned_flat, voxel_values_pruned_flat, dims, res, bb_mins, valid_coord_indices = _voxelize_coords(
+        coords, voxel_shape_spec, mode, coord_bounds, features, batch_shape, dev, f, with_valid_indices=True)
+
+    if morton_order:
+
+        # TNVC x 1
+        order = _morton_order(all_indices_pruned_flat, dims, num_batch_dims, dev, f)
+
+        # TNVC x len(BS)+3,    TNVC x 4+feature_size,    TNVC x len(BS)+1
+        all_indices_pruned_flat = f.gather_nd(all_indices_pruned_flat, order)
+        voxel_values_pruned_flat = f.gather_nd(voxel_values_pruned_flat, order)
+        valid_coord_indices = f.gather_nd(valid_coord_indices, order)
+
+    # get max dims list for scatter
+    total_dims_list = _voxel_grid_scatter_shape(dims, batch_shape, feature_size, f)
 
     # BS x x_max x y_max x z_max x 4
     scattered = f.scatter_nd(all_indices_pruned_flat, voxel_values_pruned_flat, total_dims_list)
 
+    # BS x x_max x y_max x z_max x 4 + feature_size
+    voxel_grid = f.concatenate((
+        scattered[..., :-1] / (f.maximum(scattered[..., -1:], 1.) + MIN_DENOMINATOR),
+        scattered[..., -1:]), -1)
+
+    if morton_order:
+        # BS x x_max x y_max x z_max x 4 + feature_size, BS x 3, BS x 3, BS x 3, TNVC x len(BS)+1
+        return voxel_grid, dims[..., 0, :], res[..., 0, :], bb_mins[..., 0, :], valid_coord_indices
+
+    # BS x x_max x y_max x z_max x 4 + feature_size, BS x 3, BS x 3, BS x 3
+    return voxel_grid, dims[..., 0, :], res[..., 0, :], bb_mins[..., 0, :]
+
+
+def coords_to_voxel_grid_chunked(coords, voxel_shape_spec, mode='DIMS', coord_bounds=None, features=None,
+                                 memory_budget=2**28, batch_shape=None, dev=None, f=None):
+    """
+    Create voxel grid exactly as in coords_to_voxel_grid, but processing the co-ordinates in fixed-size slices, so
+    that the memory of the intermediate per-coordinate arrays is bounded. The occupied voxel sums and counts of each
+    slice are collected, and only scattered into the output grid once as many have been collected as there are voxels
+    in the grid, so that the number of grid-sized scatters is independent of the number of slices. The slice size is
+    chosen from the memory budget, after deducting the output grid, its scatter temporaries and the collected voxels,
+    using an estimate of the bytes of intermediate arrays per co-ordinate, and an exception is raised if the budget
+    cannot hold the grid and a single co-ordinate. When no co-ordinate bounds are given, the extents of the
+    co-ordinates are first found with an additional pass over the slices.
+
+    :param coords: Homogeneous co-ordinates *[batch_shape,c,4]*
+    :type coords: array
+    :param voxel_shape_spec: Either the number of voxels in x,y,z directions, or the resolutions (metres) in x,y,z
+                                directions, depending on mode. Batched or unbatched. *[batch_shape,3]* or *[3]*
+    :type voxel_shape_spec: array
+    :param mode: Shape specification mode, either "DIMS" or "RES"
+    :type mode: str
+    :param coord_bounds: Co-ordinate x, y, z boundaries *[batch_shape,6]* or *[6]*
+    :type coord_bounds: array
+    :param features: Co-ordinate features *[batch_shape,c,4]*.
+                              E.g. RGB values, low-dimensional features, etc.
+                              Features mapping to the same voxel are averaged.
+    :type features: array
+    :param memory_budget: Memory budget (bytes) for the output grid and the intermediate arrays. Default is 256MB.
+    :type memory_budget: int, optional
+    :param batch_shape: Shape of batch. Inferred from inputs if None.
+    :type batch_shape: sequence of ints, optional
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as x if None.
+    :type dev: str, optional
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: Voxel grid *[batch_shape,x_max,v_max,z_max,3+feature_size+1]*, dimensions *[batch_shape,3]*, resolutions *[batch_shape,3]*, voxel_grid_lower_corners *[batch_shape,3]*
+    """
+
+    f = _get_framework(coords, f=f)
+
+    if batch_shape is None:
+        batch_shape = coords.shape[:-2]
+
+    if dev is None:
+        dev = f.get_device(coords)
+
+    # shapes as list
+    batch_shape = list(batch_shape)
+    num_batch_dims = len(batch_shape)
+    num_coords_per_batch = coords.shape[-2]
+    feature_size = 0 if features is None else features.shape[-1]
+
+    # Chunk Size #
+    # -----------#
+
+    # per co-ordinate: the voxel values, their gathered and concatenated copies, and the voxel indices, all 4 bytes
+    bytes_per_coord = 4 * _reduce(_mul, batch_shape, 1) * (3 * (4 + feature_size) + 2 * (num_batch_dims + 3))
+    chunk_size = max(int(memory_budget // bytes_per_coord), 1)
+    chunk_starts = list(range(0, num_coords_per_batch, chunk_size))
+
+    # Extents #
+    # --------#
+
+    coord_extents = None
+    if coord_bounds is None:
+
+        # BS x 1 x 3
+        bb_mins = None
+        bb_maxs = None
+        for start in chunk_starts:
+            coords_chunk = coords[..., start:start + chunk_size, 0:3]
+            chunk_mins = f.reduce_min(coords_chunk, axis=-2, keepdims=True)
+            chunk_maxs = f.reduce_max(coords_chunk, axis=-2, keepdims=True)
+            bb_mins = chunk_mins if bb_mins is None else f.minimum(bb_mins, chunk_mins)
+            bb_maxs = chunk_maxs if bb_maxs is None else f.maximum(bb_maxs, chunk_maxs)
+
+        # BS x 1 x 6
+        coord_extents = f.concatenate((bb_mins, bb_maxs), -1)
+
+    # Grid Size #
+    # ----------#
+
+    # the dimensions only depend on the bounds or global extents, and so can be found from a single co-ordinate
+
+    # BS x 1 x 3,    BS x 1 x 3,    BS x 1 x 3
+    _, _, dims, res, bb_mins = _voxelize_coords(
+        coords[..., 0:1, :], voxel_shape_spec, mode, coord_bounds,
+        None if features is None else features[..., 0:1, :], batch_shape, dev, f, coord_extents)
+    scatter_shape = _voxel_grid_scatter_shape(dims, batch_shape, feature_size, f)
+    num_grid_voxels = _reduce(_mul, scatter_shape[:-1], 1)
+
+    # the running grid, the flushed grid and their sum, plus the collected voxel indices and values, all 4 bytes
+    grid_bytes = 4 * num_grid_voxels * (3 * (4 + feature_size) + (num_batch_dims + 3 + 4 + feature_size))
+    if memory_budget < grid_bytes + bytes_per_coord:
+        raise Exception('memory_budget of {} bytes cannot hold the voxel grid and a single co-ordinate, which need {} '
+                        'bytes.'.format(memory_budget, grid_bytes + bytes_per_coord))
+    chunk_size = int((memory_budget - grid_bytes) // bytes_per_coord)
+    chunk_starts = list(range(0, num_coords_per_batch, chunk_size))
+
+    # Accumulate #
+    # -----------#
+
+    scattered = None
+    pending_indices = list()
+    pending_values = list()
+    num_pending = 0
+    for i, start in enumerate(chunk_starts):
+        coords_chunk = coords[..., start:start + chunk_size, :]
+        features_chunk = None if features is None else features[..., start:start + chunk_size, :]
+
+        # TNVC x len(BS)+3,    TNVC x 4+feature_size
+        all_indices_pruned_flat, voxel_values_pruned_flat, _, _, _ = _voxelize_coords(
+            coords_chunk, voxel_shape_spec, mode, coord_bounds, features_chunk, batch_shape, dev, f, coord_extents)
+        pending_indices.append(all_indices_pruned_flat)
+        pending_values.append(voxel_values_pruned_flat)
+        num_pending += all_indices_pruned_flat.shape[0]
+        if num_pending < num_grid_voxels and i < len(chunk_starts) - 1:
+            continue
+
+        # BS x x_max x y_max x z_max x 4
+        scattered_pending = f.scatter_nd(f.concatenate(pending_indices, 0), f.concatenate(pending_values, 0),
+                                         scatter_shape)
+        scattered = scattered_pending if scattered is None else scattered + scattered_pending
+        pending_indices = list()
+        pending_values = list()
+        num_pending = 0
+
     # BS x x_max x y_max x z_max x 4 + feature_size, BS x 3, BS x 3, BS x 3
     return f.concatenate((
         scattered[..., :-1] / (f.maximum(scattered[..., -1:], 1.) + MIN_DENOMINATOR),
         scattered[..., -1:]), -1), dims[..., 0, :], res[..., 0, :], bb_mins[..., 0, :]
+
+
+def coords_to_sparse_voxel_grid(coords, voxel_shape_spec, mode='DIMS', coord_bounds=None, features=None,
+                                batch_shape=None, dev=None, f=None):
+    """
+    Create sparse voxel grid from homogeneous co-ordinates, in co-ordinate (COO) format, containing only the occupied
+    voxels. Voxel contents, dimensions, resolutions and lower corners are computed exactly as in coords_to_voxel_grid,
+    but rather than scattering into a dense grid, the occupied voxels are found by taking the unique linearised voxel
+    indices, and only the per-voxel sums are scattered. Memory therefore scales with the number of occupied voxels,
+    rather than with the grid volume. Voxels are sorted by linearised index, batch-major.
+
+    :param coords: Homogeneous co-ordinates *[batch_shape,c,4]*
+    :type coords: array
+    :param voxel_shape_spec: Either the number of voxels in x,y,z directions, or the resolutions (metres) in x,y,z
+                                directions, depending on mode. Batched or unbatched. *[batch_shape,3]* or *[3]*
+    :type voxel_shape_spec: array
+    :param mode: Shape specification mode, either "DIMS" or "RES"
+    :type mode: str
+    :param coord_bounds: Co-ordinate x, y, z boundaries *[batch_shape,6]* or *[6]*
+    :type coord_bounds: array
+    :param features: Co-ordinate features *[batch_shape,c,4]*.
+                              E.g. RGB values, low-dimensional features, etc.
+                              Features mapping to the same voxel are averaged.
+    :type features: array
+    :param batch_shape: Shape of batch. Inferred from inputs if None.
+    :type batch_shape: sequence of ints, optional
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as x if None.
+    :type dev: str, optional
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: Occupied voxel keys, as batch indices followed by x, y, z voxel indices *[num_voxels,len(batch_shape)+3]*, voxel values *[num_voxels,3+feature_size+1]*, dimensions *[batch_shape,3]*, resolutions *[batch_shape,3]*, voxel_grid_lower_corners *[batch_shape,3]*
+    """
+
+    f = _get_framework(coords, f=f)
+
+    if batch_shape is None:
+        batch_shape = coords.shape[:-2]
+
+    if dev is None:
+        dev = f.get_device(coords)
+
+    # shapes as list
+    batch_shape = list(batch_shape)
+    num_batch_dims = len(batch_shape)
+
+    # TNVC x len(BS)+3,    TNVC x 4+feature_size,    BS x 1 x 3,    BS x 1 x 3,    BS x 1 x 3
+    all_indices_pruned_flat, voxel_values_pruned_flat, dims, res, bb_mins = _voxelize_coords(
+        coords, voxel_shape_spec, mode, coord_bounds, features, batch_shape, dev, f)
+
+    # Unique Voxels #
+    # --------------#
+
+    # the data-dependent unique is computed host-side, on 64 bit linearised voxel indices
+
+    # TNVC x len(BS)+3
+    all_indices_np = f.to_numpy(all_indices_pruned_flat).astype(_np.int64)
+
+    # len(BS)+3
+    max_dims_np = _np.max(_np.reshape(f.to_numpy(dims), (-1, 3)), 0)
+    total_dims = batch_shape + [int(item) for item in max_dims_np]
+
+    # TNVC
+    linear_indices = _np.ravel_multi_index(tuple(all_indices_np.T), total_dims) if all_indices_np.shape[0] > 0 \
+        else _np.zeros((0,), _np.int64)
+
+    # NV,    NV,    TNVC
+    _, first_indices, inverse_indices = _np.unique(linear_indices, return_index=True, return_inverse=True)
+    num_voxels = first_indices.shape[0]
+
+    # Scatter #
+    # --------#
+
+    # NV x len(BS)+3
+    voxel_keys = f.gather_nd(all_indices_pruned_flat,
+                             f.array(_np.reshape(first_indices, (-1, 1)).astype(_np.int32), dtype_str='int32', dev=dev)) \
+        if num_voxels > 0 else f.zeros((0, num_batch_dims + 3), 'int32', dev=dev)
+
+    # NV x 4+feature_size
+    scattered = f.scatter_nd(
+        f.array(_np.reshape(inverse_indices, (-1, 1)).astype(_np.int32), dtype_str='int32', dev=dev),
+        voxel_values_pruned_flat, [num_voxels, voxel_values_pruned_flat.shape[-1]])
+
+    # NV x len(BS)+3, NV x 4 + feature_size, BS x 3, BS x 3, BS x 3
+    return f.cast(voxel_keys, 'int32'), f.concatenate((
+        scattered[..., :-1] / (f.maximum(scattered[..., -1:], 1.) + MIN_DENOMINATOR),
+        scattered[..., -1:]), -1), dims[..., 0, :], res[..., 0, :], bb_mins[..., 0, :]
+
+
+def voxel_downsample_coords(coords, voxel_shape_spec, mode='RES', coord_bounds=None, features=None,
+                            batch_shape=None, dev=None, f=None):
+    """
+    Downsample homogeneous co-ordinates to one centroid per occupied voxel, with averaged features. The occupied voxels
+    are found via the unique linearised voxel indices and reduced with segment sums, as in
+    coords_to_sparse_voxel_grid, so the dense voxel grid is never allocated. The centroids are averaged directly in
+    world co-ordinates. Points are ordered by voxel, batch-major.
+
+    :param coords: Homogeneous co-ordinates *[batch_shape,c,4]*
+    :type coords: array
+    :param voxel_shape_spec: Either the number of voxels in x,y,z directions, or the resolutions (metres) in x,y,z
+                                directions, depending on mode. Batched or unbatched. *[batch_shape,3]* or *[3]*
+    :type voxel_shape_spec: array
+    :param mode: Shape specification mode, either "DIMS" or "RES". Default is "RES".
+    :type mode: str
+    :param coord_bounds: Co-ordinate x, y, z boundaries *[batch_shape,6]* or *[6]*
+    :type coord_bounds: array
+    :param features: Co-ordinate features *[batch_shape,c,feature_size]*.
+    :type features: array
+    :param batch_shape: Shape of batch. Inferred from inputs if None.
+    :type batch_shape: sequence of ints, optional
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as x if None.
+    :type dev: str, optional
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: Downsampled co-ordinates with features *[num_voxels,3+feature_size]*, and batch indices of each point *[num_voxels,len(batch_shape)]*
+    """
+
+    f = _get_framework(coords, f=f)
+
+    if batch_shape is None:
+        batch_shape = coords.shape[:-2]
+
+    # shapes as list
+    num_batch_dims = len(batch_shape)
+
+    # the world co-ordinates are carried as leading features, so that their voxel means are the centroids
+
+    # BS x C x 3+feature_size
+    coord_features = coords[..., 0:3] if features is None else f.concatenate((coords[..., 0:3], features), -1)
+
+    # NV x len(BS)+3,    NV x 3+3+feature_size+1
+    voxel_keys, voxel_values, _, _, _ = coords_to_sparse_voxel_grid(
+        coords, voxel_shape_spec, mode, coord_bounds, coord_features, batch_shape, dev, f)
+
+    # NV x 3+feature_size,    NV x len(BS)
+    return voxel_values[:, 3:-1], voxel_keys[:, 0:num_batch_dims]
+
+
+def sparse_voxel_grid_to_dense(voxel_keys, voxel_values, region_lower_corner, region_dims, batch_shape=None,
+                               dev=None, f=None):
+    """
+    Densify a sub-region of a sparse voxel grid, as returned by coords_to_sparse_voxel_grid. Voxels outside of the
+    region are ignored, and unoccupied voxels inside the region are zero.
+
+    :param voxel_keys: Occupied voxel keys, as batch indices followed by x, y, z voxel indices *[num_voxels,len(batch_shape)+3]*
+    :type voxel_keys: array
+    :param voxel_values: Voxel values *[num_voxels,3+feature_size+1]*
+    :type voxel_values: array
+    :param region_lower_corner: Lower x, y, z voxel indices of the region to densify, shared across the batch.
+    :type region_lower_corner: sequence of ints
+    :param region_dims: Number of voxels in x, y, z directions of the region to densify.
+    :type region_dims: sequence of ints
+    :param batch_shape: Shape of batch. Inferred from the voxel keys if None.
+    :type batch_shape: sequence of ints, optional
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as x if None.
+    :type dev: str, optional
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: Dense voxel grid of the region *[batch_shape,region_x,region_y,region_z,3+feature_size+1]*
+    """
+
+    f = _get_framework(voxel_values, f=f)
+
+    if dev is None:
+        dev = f.get_device(voxel_values)
+
+    if batch_shape is None:
+        num_batch_dims = voxel_keys.shape[-1] - 3
+        batch_shape = [int(item) + 1 for item in _np.max(_np.reshape(
+            f.to_numpy(voxel_keys), (-1, num_batch_dims + 3))[:, 0:num_batch_dims], 0)] \
+            if voxel_keys.shape[0] > 0 else [1] * num_batch_dims
+
+    # shapes as list
+    batch_shape = list(batch_shape)
+    num_batch_dims = len(batch_shape)
+    region_lower_corner = list(region_lower_corner)
+    region_dims = list(region_dims)
+    num_channels = voxel_values.shape[-1]
+
+    # NV x 3
+    region_voxel_indices = voxel_keys[:, num_batch_dims:] - f.array(region_lower_corner, dtype_str='int32', dev=dev)
+
+    # NV
+    in_region = f.logical_and(
+        f.reduce_min(f.cast(region_voxel_indices >= 0, 'int32'), -1) > 0,
+        f.reduce_min(f.cast(region_voxel_indices < f.array(region_dims, dtype_str='int32', dev=dev), 'int32'), -1) > 0)
+
+    # NRV x 1
+    region_indices = f.cast(f.indices_where(in_region), 'int32')
+
+    # NRV x len(BS)+3
+    region_keys = f.concatenate((f.gather_nd(voxel_keys[:, 0:num_batch_dims], region_indices),
+                                 f.gather_nd(region_voxel_indices, region_indices)), -1)
+
+    # BS x region_x x region_y x region_z x 4 + feature_size
+    return f.scatter_nd(region_keys, f.gather_nd(voxel_values, region_indices),
+                        batch_shape + region_dims + [num_channels])
+
+
+def coords_to_ragged_voxel_grid(coords, voxel_shape_spec, mode='DIMS', coord_bounds=None, features=None,
+                                batch_shape=None, dev=None, f=None):
+    """
+    Create ragged voxel grids from homogeneous co-ordinates. Voxel contents, dimensions, resolutions and lower corners
+    are computed exactly as in coords_to_voxel_grid, but rather than padding every grid to the maximum grid dimensions
+    across the batch, each grid is stored at its own dimensions, flattened in x, y, z order, and concatenated into a
+    single flat storage array. Memory therefore scales with the sum of the actual grid sizes. Individual grids can be
+    recovered with ragged_voxel_grid_element.
+
+    :param coords: Homogeneous co-ordinates *[batch_shape,c,4]*
+    :type coords: array
+    :param voxel_shape_spec: Either the number of voxels in x,y,z directions, or the resolutions (metres) in x,y,z
+                                directions, depending on mode. Batched or unbatched. *[batch_shape,3]* or *[3]*
+    :type voxel_shape_spec: array
+    :param mode: Shape specification mode, either "DIMS" or "RES"
+    :type mode: str
+    :param coord_bounds: Co-ordinate x, y, z boundaries *[batch_shape,6]* or *[6]*
+    :type coord_bounds: array
+    :param features: Co-ordinate features *[batch_shape,c,4]*.
+                              E.g. RGB values, low-dimensional features, etc.
+                              Features mapping to the same voxel are averaged.
+    :type features: array
+    :param batch_shape: Shape of batch. Inferred from inputs if None.
+    :type batch_shape: sequence of ints, optional
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as x if None.
+    :type dev: str, optional
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: Flat voxel grid storage *[sum(x*y*z),3+feature_size+1]*, storage offsets of each grid *[batch_shape]*, dimensions *[batch_shape,3]*, resolutions *[batch_shape,3]*, voxel_grid_lower_corners *[batch_shape,3]*
+    """
+
+    f = _get_framework(coords, f=f)
+
+    if batch_shape is None:
+        batch_shape = coords.shape[:-2]
+
+    if dev is None:
+        dev = f.get_device(coords)
+
+    # shapes as list
+    batch_shape = list(batch_shape)
+    num_batch_dims = len(batch_shape)
+
+    # TNVC x len(BS)+3,    TNVC x 4+feature_size,    BS x 1 x 3,    BS x 1 x 3,    BS x 1 x 3
+    all_indices_pruned_flat, voxel_values_pruned_flat, dims, res, bb_mins = _voxelize_coords(
+        coords, voxel_shape_spec, mode, coord_bounds, features, batch_shape, dev, f)
+
+    # Grid Offsets #
+    # -------------#
+
+    # prod(BS) x 3
+    dims_flat = f.reshape(dims, (-1, 3))
+
+    # prod(BS)
+    grid_sizes = dims_flat[:, 0] * dims_flat[:, 1] * dims_flat[:, 2]
+    grid_ends = f.cumsum(grid_sizes, 0)
+    offsets = grid_ends - grid_sizes
+    total_size = int(f.to_list(grid_ends[-1:])[0])
+
+    # Storage Indices #
+    # ----------------#
+
+    # TNVC x 1
+    batch_indices = f.zeros_like(all_indices_pruned_flat[:, 0:1])
+    for i, batch_dim in enumerate(batch_shape):
+        batch_indices = batch_indices * batch_dim + all_indices_pruned_flat[:, i:i + 1]
+
+    # TNVC x 3
+    voxel_indices = all_indices_pruned_flat[:, num_batch_dims:]
+    coord_dims = f.gather_nd(dims_flat, batch_indices)
+
+    # TNVC x 1
+    storage_indices = f.gather_nd(f.reshape(offsets, (-1, 1)), batch_indices) +\
+        (voxel_indices[:, 0:1] * coord_dims[:, 1:2] + voxel_indices[:, 1:2]) * coord_dims[:, 2:3] +\
+        voxel_indices[:, 2:3]
+
+    # sum(XxYxZ) x 4+feature_size
+    scattered = f.scatter_nd(f.cast(storage_indices, 'int32'), voxel_values_pruned_flat,
+                             [total_size, voxel_values_pruned_flat.shape[-1]])
+
+    # sum(XxYxZ) x 4 + feature_size, BS, BS x 3, BS x 3, BS x 3
+    return f.concatenate((
+        scattered[..., :-1] / (f.maximum(scattered[..., -1:], 1.) + MIN_DENOMINATOR),
+        scattered[..., -1:]), -1), f.reshape(offsets, batch_shape), dims[..., 0, :], res[..., 0, :],\
+        bb_mins[..., 0, :]
+
+
+def ragged_voxel_grid_element(voxel_grid_flat, offsets, dims, batch_index, f=None):
+    """
+    Extract a single voxel grid from ragged voxel grid storage, as returned by coords_to_ragged_voxel_grid.
+
+    :param voxel_grid_flat: Flat voxel grid storage *[sum(x*y*z),3+feature_size+1]*
+    :type voxel_grid_flat: array
+    :param offsets: Storage offsets of each grid *[batch_shape]*
+    :type offsets: array
+    :param dims: Dimensions of each grid *[batch_shape,3]*
+    :type dims: array
+    :param batch_index: Index of the grid in the batch, with one entry per batch dimension.
+    :type batch_index: sequence of ints
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: Voxel grid *[x,y,z,3+feature_size+1]*
+    """
+
+    f = _get_framework(voxel_grid_flat, f=f)
+
+    # index as tuple
+    batch_index = tuple(batch_index)
+
+    # scalar,    3
+    offset = int(f.to_list(offsets[batch_index]))
+    grid_dims = [int(item) for item in f.to_list(dims[batch_index])]
+
+    # X x Y x Z x 4+feature_size
+    return f.reshape(voxel_grid_flat[offset:offset + grid_dims[0] * grid_dims[1] * grid_dims[2]],
+                     grid_dims + [voxel_grid_flat.shape[-1]])
+
+
+def _halve_voxel_grid(voxel_grid, num_batch_dims, f):
+
+    # shapes as list
+    batch_shape = list(voxel_grid.shape[0:num_batch_dims])
+    dims = list(voxel_grid.shape[num_batch_dims:num_batch_dims + 3])
+    half_dims = [(dim + 1) // 2 for dim in dims]
+    num_channels = voxel_grid.shape[-1]
+
+    # BS x X/2 x 2 x Y/2 x 2 x Z/2 x 2 x 4+feature_size
+    voxel_grid = f.reshape(f.zero_pad(voxel_grid, [[0, 0]] * num_batch_dims + [[0, dim % 2] for dim in dims] +
+                                      [[0, 0]]), batch_shape + [half_dims[0], 2, half_dims[1], 2, half_dims[2], 2,
+                                                                num_channels])
+
+    # the normalized co-ordinate inside each child voxel is offset to the corresponding octant of the parent voxel
+
+    # 1 x 2 x 1 x 2 x 1 x 2 x 3
+    child_offsets = f.array(_np.reshape(_np.stack(_np.meshgrid(*[_np.arange(2.)] * 3, indexing='ij'), -1), [1] *
+                                        num_batch_dims + [1, 2, 1, 2, 1, 2, 3]).astype(_np.float32),
+                            dtype_str='float32', dev=f.get_device(voxel_grid))
+
+    # BS x X/2 x 2 x Y/2 x 2 x Z/2 x 2 x 1
+    counts = voxel_grid[..., -1:]
+
+    # BS x X/2 x 2 x Y/2 x 2 x Z/2 x 2 x 3+feature_size
+    weighted_values = f.concatenate(((voxel_grid[..., 0:3] + child_offsets) / 2, voxel_grid[..., 3:-1]), -1) * counts
+
+    # BS x X/2 x Y/2 x Z/2 x 3+feature_size,    BS x X/2 x Y/2 x Z/2 x 1
+    reduction_axes = [num_batch_dims + 1, num_batch_dims + 3, num_batch_dims + 5]
+    value_sums = f.reduce_sum(weighted_values, reduction_axes)
+    count_sums = f.reduce_sum(counts, reduction_axes)
+
+    # BS x X/2 x Y/2 x Z/2 x 4+feature_size
+    return f.concatenate((value_sums / (f.maximum(count_sums, 1.) + MIN_DENOMINATOR), count_sums), -1)
+
+
+def voxel_grid_pyramid(voxel_grid, num_levels, batch_shape=None, f=None):
+    """
+    Create multi-resolution pyramid from a voxel grid, as returned by coords_to_voxel_grid. Each coarser level is
+    computed by 2×2×2 reduction of the count-weighted voxel values of the level below, so that the voxel means are
+    preserved. Odd dimensions are zero-padded at the upper end before each reduction. Level :math:`l` has resolutions
+    :math:`2^l` times those of the input grid, dimensions :math:`d/2^l` rounded up, and the same lower corner. A level
+    only matches the voxel grid computed directly with coords_to_voxel_grid for a grid created in DIMS mode with fixed
+    co-ordinate bounds and dimensions divisible by :math:`2^l`. Otherwise, and in particular in RES mode without
+    co-ordinate bounds, the direct computation derives its own extents and dimensions, which generally differ.
+
+    :param voxel_grid: Voxel grid *[batch_shape,x,y,z,3+feature_size+1]*
+    :type voxel_grid: array
+    :param num_levels: Number of pyramid levels, including the input grid.
+    :type num_levels: int
+    :param batch_shape: Shape of batch. Inferred from inputs if None.
+    :type batch_shape: sequence of ints, optional
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: List of voxel grids, from finest to coarsest *[batch_shape,x/2^l,y/2^l,z/2^l,3+feature_size+1]*
+    """
+
+    f = _get_framework(voxel_grid, f=f)
+
+    if batch_shape is None:
+        batch_shape = voxel_grid.shape[:-4]
+
+    # shapes as list
+    num_batch_dims = len(batch_shape)
+
+    voxel_grids = [voxel_grid]
+    for _ in range(num_levels - 1):
+        voxel_grids.append(_halve_voxel_grid(voxel_grids[-1], num_batch_dims, f))
+    return voxel_grids
+
+
+def sparse_voxel_grid_pyramid(voxel_keys, voxel_values, num_levels, f=None):
+    """
+    Create multi-resolution sparse pyramid from a sparse voxel grid, as returned by coords_to_sparse_voxel_grid, in an
+    implicit octree layout. Each coarser level contains the parents of the occupied voxels in the level below, with
+    keys given by halving the voxel indices, and values computed by count-weighted reduction of the children, exactly
+    as in voxel_grid_pyramid. For each level except the coarsest, the index of the parent of each voxel in the next
+    level is also returned.
+
+    :param voxel_keys: Occupied voxel keys, as batch indices followed by x, y, z voxel indices *[num_voxels,len(batch_shape)+3]*
+    :type voxel_keys: array
+    :param voxel_values: Voxel values *[num_voxels,3+feature_size+1]*
+    :type voxel_values: array
+    :param num_levels: Number of pyramid levels, including the input grid.
+    :type num_levels: int
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: List of voxel keys *[num_voxels_l,len(batch_shape)+3]*, list of voxel values *[num_voxels_l,3+feature_size+1]*, and list of parent indices *[num_voxels_l]*, from finest to coarsest
+    """
+
+    f = _get_framework(voxel_values, f=f)
+    dev = f.get_device(voxel_values)
+
+    # shapes as list
+    num_batch_dims = voxel_keys.shape[-1] - 3
+    num_channels = voxel_values.shape[-1]
+
+    keys_list = [voxel_keys]
+    values_list = [voxel_values]
+    parent_indices_list = list()
+    for _ in range(num_levels - 1):
+        child_keys = keys_list[-1]
+        child_values = values_list[-1]
+
+        # NV x 3
+        child_offsets = f.floormod(child_keys[:, num_batch_dims:], 2)
+
+        # NV x len(BS)+3
+        parent_keys = f.concatenate((child_keys[:, 0:num_batch_dims], child_keys[:, num_batch_dims:] // 2), -1)
+
+        # the data-dependent unique is computed host-side
+
+        # NP x len(BS)+3,    NV
+        parent_keys_np, inverse_indices = _np.unique(_np.reshape(f.to_numpy(parent_keys), (-1, num_batch_dims + 3)),
+                                                     axis=0, return_inverse=True)
+        num_parents = parent_keys_np.shape[0]
+
+        # NV x 1
+        parent_indices = f.array(_np.reshape(inverse_indices, (-1, 1)).astype(_np.int32), dtype_str='int32', dev=dev)
+
+        # NV x 1
+        counts = child_values[:, -1:]
+
+        # NV x 3+feature_size
+        weighted_values = f.concatenate(((child_values[:, 0:3] + f.cast(child_offsets, 'float32')) / 2,
+                                         child_values[:, 3:-1]), -1) * counts
+
+        # NP x 4+feature_size
+        scattered = f.scatter_nd(parent_indices, f.concatenate((weighted_values, counts), -1),
+                                 [num_parents, num_channels])
+
+        keys_list.append(f.array(parent_keys_np.astype(_np.int32), dtype_str='int32', dev=dev) if num_parents > 0 else
+                         f.zeros((0, num_batch_dims + 3), 'int32', dev=dev))
+        values_list.append(f.concatenate((
+            scattered[..., :-1] / (f.maximum(scattered[..., -1:], 1.) + MIN_DENOMINATOR), scattered[..., -1:]), -1))
+        parent_indices_list.append(f.reshape(parent_indices, (-1,)))
+
+    return keys_list, values_list, parent_indices_list
+
+
+def ray_cast_voxel_grid(voxel_grid, dims, res, lower_corner, cam_geom, image_dims, batch_shape=None, dev=None,
+                        f=None):
+    """
+    Render depth and feature images from a voxel grid, as returned by coords_to_voxel_grid, by casting one ray per
+    pixel through the grid with 3D digital differential analysis (DDA), terminating each ray at the first occupied
+    voxel. Only the rays which are still active are processed at each step, and each ray visits at most
+    :math:`x+y+z` voxels, so the cost scales with the image size and the distance to the first occupied voxel, rather
+    than with the number of voxels. The depth of a hit is the depth at which the ray enters the occupied voxel.\n
+    `[reference] <http://www.cse.yorku.ca/~amana/research/grid.pdf>`_
+
+    :param voxel_grid: Voxel grid *[batch_shape,x_max,y_max,z_max,3+feature_size+1]*
+    :type voxel_grid: array
+    :param dims: Dimensions of each voxel grid *[batch_shape,3]*
+    :type dims: array
+    :param res: Resolutions of each voxel grid *[batch_shape,3]*
+    :type res: array
+    :param lower_corner: Lower corners of each voxel grid *[batch_shape,3]*
+    :type lower_corner: array
+    :param cam_geom: Camera geometry to render from, with batch shape matching the voxel grid.
+    :type cam_geom: CameraGeometry
+    :param image_dims: Image dimensions.
+    :type image_dims: sequence of ints
+    :param batch_shape: Shape of batch. Inferred from inputs if None.
+    :type batch_shape: sequence of ints, optional
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as x if None.
+    :type dev: str, optional
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    :return: Depth image *[batch_shape,h,w,1]*, feature image *[batch_shape,h,w,feature_size]* and validity mask
+             *[batch_shape,h,w,1]*
+    """
+
+    f = _get_framework(voxel_grid, f=f)
+
+    if batch_shape is None:
+        batch_shape = voxel_grid.shape[:-4]
+
+    if dev is None:
+        dev = f.get_device(voxel_grid)
+
+    # shapes as list
+    batch_shape = list(batch_shape)
+    image_dims = list(image_dims)
+    batch_size = _reduce(_mul, batch_shape, 1)
+    num_pixels = image_dims[0] * image_dims[1]
+    num_rays = batch_size * num_pixels
+    grid_dims = list(voxel_grid.shape[-4:-1])
+    num_channels = voxel_grid.shape[-1]
+    feature_size = num_channels - 4
+
+    # Ray Setup #
+    # ----------#
+
+    # rays are parameterized by depth, pointing from the camera center to the world point at unit depth
+
+    # BS x 3 x 4
+    inv_full_mat = cam_geom.inv_full_mats_homo[..., 0:3, :]
+
+    # BS x H x W x 4
+    unit_depth_world_coords = _ivy_svg.pixel_to_world_coords(
+        _ivy_svg.cached_uniform_pixel_coords_image(image_dims, batch_shape, dev=dev, f=f), inv_full_mat,
+        batch_shape, image_dims, dev, f=f)
+
+    # (prod(BS)xHxW) x 3
+    ray_origins = f.reshape(f.tile(f.reshape(inv_full_mat[..., -1], [batch_size, 1, 3]), [1, num_pixels, 1]),
+                            (-1, 3))
+    ray_dirs = f.reshape(unit_depth_world_coords[..., 0:3], (-1, 3)) - ray_origins
+
+    # (prod(BS)xHxW) x 1
+    ray_ids = f.reshape(f.arange(num_rays, dtype_str='int32', dev=dev), (-1, 1))
+    ray_batch_ids = ray_ids // num_pixels
+
+    # (prod(BS)xHxW) x 3
+    ray_dims = f.gather_nd(f.reshape(f.cast(dims, 'int32'), (-1, 3)), ray_batch_ids)
+    ray_res = f.gather_nd(f.reshape(res, (-1, 3)), ray_batch_ids)
+    ray_lower_corners = f.gather_nd(f.reshape(lower_corner, (-1, 3)), ray_batch_ids)
+
+    # rays in voxel units, with zero direction components replaced by a tiny value, making their crossings infinitely far
+
+    # (prod(BS)xHxW) x 3
+    grid_origins = (ray_origins - ray_lower_corners) / ray_res
+    grid_dirs = ray_dirs / ray_res
+    grid_dirs = f.where(f.abs(grid_dirs) < MIN_DENOMINATOR, f.ones_like(grid_dirs) * MIN_DENOMINATOR, grid_dirs)
+    recip_grid_dirs = 1 / grid_dirs
+
+    # Grid Entry #
+    # -----------#
+
+    # (prod(BS)xHxW) x 3
+    t_lower = -grid_origins * recip_grid_dirs
+    t_upper = (f.cast(ray_dims, 'float32') - grid_origins) * recip_grid_dirs
+
+    # (prod(BS)xHxW) x 1
+    t_near = f.maximum(f.reduce_max(f.minimum(t_lower, t_upper), -1, keepdims=True), 0.)
+    t_far = f.reduce_min(f.maximum(t_lower, t_upper), -1, keepdims=True)
+
+    # (prod(BS)xHxW) x 3
+    voxel_indices = f.cast(f.floor(grid_origins + grid_dirs * t_near), 'int32')
+    voxel_indices = f.minimum(f.maximum(voxel_indices, 0), ray_dims - 1)
+    steps = f.cast(f.where(grid_dirs > 0, f.ones_like(grid_dirs), -f.ones_like(grid_dirs)), 'int32')
+    t_max = (f.cast(voxel_indices + f.cast(grid_dirs > 0, 'int32'), 'float32') - grid_origins) * recip_grid_dirs
+    t_delta = f.abs(recip_grid_dirs)
+
+    # DDA #
+    # ----#
+
+    # (prod(BS)xXxYxZ) x 4+feature_size
+    voxel_grid_flat = f.reshape(voxel_grid, (-1, num_channels))
+
+    state = [ray_ids, ray_batch_ids, ray_dims, voxel_indices, steps, t_near, t_max, t_delta, t_far]
+    active = t_near < t_far
+    hit_ray_ids_list = list()
+    hit_values_list = list()
+    while True:
+
+        # active ray compaction
+
+        # A x 1
+        active_indices = f.cast(f.indices_where(f.reshape(active, (-1,))), 'int32')
+        if active_indices.shape[0] == 0:
+            break
+        state = [f.gather_nd(item, active_indices) for item in state]
+        ray_ids, ray_batch_ids, ray_dims, voxel_indices, steps, t, t_max, t_delta, t_far = state
+
+        # A x 1
+        flat_voxel_indices = ((ray_batch_ids * grid_dims[0] + voxel_indices[:, 0:1]) * grid_dims[1] +
+                              voxel_indices[:, 1:2]) * grid_dims[2] + voxel_indices[:, 2:3]
+
+        # A x 4+feature_size
+        voxel_values = f.gather_nd(voxel_grid_flat, flat_voxel_indices)
+
+        # A x 1
+        hit = voxel_values[:, -1:] > 0
+
+        # NH x 1
+        hit_indices = f.cast(f.indices_where(f.reshape(hit, (-1,))), 'int32')
+        if hit_indices.shape[0] > 0:
+            hit_ray_ids_list.append(f.gather_nd(ray_ids, hit_indices))
+            hit_values_list.append(f.gather_nd(f.concatenate((t, voxel_values[:, 3:-1]), -1), hit_indices))
+
+        # step to the next voxel along the axis with the nearest voxel boundary crossing
+
+        # A x 1
+        t_max_x = t_max[:, 0:1]
+        t_max_y = t_max[:, 1:2]
+        t_max_z = t_max[:, 2:3]
+        step_x = f.logical_and(t_max_x <= t_max_y, t_max_x <= t_max_z)
+        step_y = f.logical_and(f.logical_not(step_x), t_max_y <= t_max_z)
+        step_z = f.logical_not(f.logical_or(step_x, step_y))
+
+        # A x 3
+        step_mask = f.concatenate((step_x, step_y, step_z), -1)
+        t = f.reduce_min(t_max, -1, keepdims=True)
+        voxel_indices = voxel_indices + steps * f.cast(step_mask, 'int32')
+        t_max = t_max + t_delta * f.cast(step_mask, 'float32')
+
+        # A x 1
+        in_grid = f.logical_and(f.reduce_min(voxel_indices, -1, keepdims=True) >= 0,
+                                f.reduce_min(ray_dims - voxel_indices, -1, keepdims=True) > 0)
+        active = f.logical_and(f.logical_and(f.logical_not(hit), in_grid), t < t_far)
+        state = [ray_ids, ray_batch_ids, ray_dims, voxel_indices, steps, t, t_max, t_delta, t_far]
+
+    # Images #
+    # -------#
+
+    # (prod(BS)xHxW) x 2+feature_size
+    if hit_ray_ids_list:
+        hit_ray_ids = f.concatenate(hit_ray_ids_list, 0)
+        hit_values = f.concatenate(hit_values_list, 0)
+        scattered = f.scatter_nd(hit_ray_ids, f.concatenate((hit_values, f.ones_like(hit_values[:, 0:1])), -1),
+                                 [num_rays, feature_size + 2])
+    else:
+        scattered = f.zeros((num_rays, feature_size + 2), dev=dev)
+
+    # BS x H x W x 2+feature_size
+    scattered = f.reshape(scattered, batch_shape + image_dims + [feature_size + 2])
+
+    # BS x H x W x 1,    BS x H x W x feature_size,    BS x H x W x 1
+    return scattered[..., 0:1], scattered[..., 1:-1], scattered[..., -1:] > 0
+
+
+class VoxelNeighbourhoodIndex:
+
+    def __init__(self, coords, voxel_shape_spec, mode='RES', coord_bounds=None, batch_shape=None, dev=None, f=None):
+        """
+        Initialize voxel neighbourhood index, for querying all co-ordinates inside the cubic voxel neighbourhoods of
+        many query points at once. The co-ordinates are voxelized exactly as in coords_to_voxel_grid, sorted by their
+        linearised batch and voxel index, and stored in compressed sparse row form, with one contiguous range of
+        co-ordinates per occupied voxel. Neighbouring voxels are then looked up by binary search over the sorted keys
+        of the occupied voxels. The index is built and queried host-side, and so is only valid in eager mode.
+
+        :param coords: Homogeneous co-ordinates *[batch_shape,c,4]*
+        :type coords: array
+        :param voxel_shape_spec: Either the number of voxels in x,y,z directions, or the resolutions (metres) in x,y,z
+                                    directions, depending on mode. Batched or unbatched. *[batch_shape,3]* or *[3]*
+        :type voxel_shape_spec: array
+        :param mode: Shape specification mode, either "DIMS" or "RES"
+        :type mode: str
+        :param coord_bounds: Co-ordinate x, y, z boundaries *[batch_shape,6]* or *[6]*
+        :type coord_bounds: array
+        :param batch_shape: Shape of batch. Inferred from inputs if None.
+        :type batch_shape: sequence of ints, optional
+        :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc. Same as x if None.
+        :type dev: str, optional
+        :param f: Machine learning library. Inferred from inputs if None.
+        :type f: ml_framework, optional
+        """
+        f = _get_framework(coords, f=f)
+
+        if batch_shape is None:
+            batch_shape = coords.shape[:-2]
+
+        if dev is None:
+            dev = f.get_device(coords)
+
+        # shapes as list
+        batch_shape = list(batch_shape)
+        num_batch_dims = len(batch_shape)
+
+        # TNVC x len(BS)+3,    BS x 1 x 3,    BS x 1 x 3,    BS x 1 x 3,    TNVC x len(BS)+1
+        all_indices, _, dims, res, bb_mins, valid_coord_indices = _voxelize_coords(
+            coords, voxel_shape_spec, mode, coord_bounds, None, batch_shape, dev, f, with_valid_indices=True)
+
+        # BS x 3
+        self._dims = _np.reshape(f.to_numpy(dims), batch_shape + [3]).astype(_np.int64)
+        self._res = _np.reshape(f.to_numpy(res), batch_shape + [3])
+        self._lower_corner = _np.reshape(f.to_numpy(bb_mins), batch_shape + [3])
+
+        # len(BS)+3
+        max_dims = _np.max(_np.reshape(self._dims, (-1, 3)), 0)
+        self._total_dims = batch_shape + [int(item) for item in max_dims]
+
+        # TNVC x len(BS)+3,    TNVC x len(BS)+1
+        all_indices_np = f.to_numpy(all_indices).astype(_np.int64)
+        valid_coord_indices_np = _np.reshape(f.to_numpy(valid_coord_indices), (-1, num_batch_dims + 1))
+
+        # TNVC
+        keys = _np.ravel_multi_index(tuple(all_indices_np.T), self._total_dims) if all_indices_np.shape[0] > 0 \
+            else _np.zeros((0,), _np.int64)
+        order = _np.argsort(keys, kind='stable')
+
+        # NV,    NV,    NV
+        self._voxel_keys, self._voxel_starts, self._voxel_counts = _np.unique(
+            keys[order], return_index=True, return_counts=True)
+
+        # TNVC x len(BS)+1
+        self._point_indices = valid_coord_indices_np[order].astype(_np.int64)
+
+        self._batch_shape = batch_shape
+        self._dev = dev
+        self._f = f
+
+    # Public Methods #
+    # ---------------#
+
+    def query(self, query_coords, radius=1):
+        """
+        Find all indexed co-ordinates inside the cubic neighbourhood of :math:`(2r+1)^3` voxels around the voxel of
+        each query point, with each query point only matched against the co-ordinates of the same batch entry.
+        Neighbourhoods are returned as flat pairs, sorted by query point.
+
+        :param query_coords: Query co-ordinates, either cartesian or homogeneous *[batch_shape,nq,3]* or
+                             *[batch_shape,nq,4]*
+        :type query_coords: array
+        :param radius: Neighbourhood radius r in voxels, with 1 giving the 3×3×3 neighbourhood. Default is 1.
+        :type radius: int, optional
+        :return: Batch and co-ordinate indices of the neighbours *[num_pairs,len(batch_shape)+1]*, and batch and query
+                 indices of the corresponding query points *[num_pairs,len(batch_shape)+1]*
+        """
+
+        f = self._f
+        num_batch_dims = len(self._batch_shape)
+
+        # BS x NQ x 3
+        query_coords_np = f.to_numpy(query_coords)[..., 0:3]
+        num_queries = query_coords_np.shape[-2]
+
+        # BS x 1 x 3
+        dims = _np.expand_dims(self._dims, -2)
+        upper_corner = _np.expand_dims(self._lower_corner + self._dims * self._res, -2)
+
+        # BS x NQ x 3
+        query_voxel_indices = _np.floor(
+            (query_coords_np - _np.expand_dims(self._lower_corner, -2)) /
+            (_np.expand_dims(self._res, -2) + MIN_DENOMINATOR)).astype(_np.int64)
+
+        # the upper face of the grid belongs to the last voxel, queries beyond it are left outside of the grid
+        query_voxel_indices = _np.where(query_coords_np <= upper_corner, _np.minimum(query_voxel_indices, dims - 1),
+                                        query_voxel_indices)
+
+        # O x 3
+        offset_range = _np.arange(-radius, radius + 1)
+        offsets = _np.stack(_np.meshgrid(offset_range, offset_range, offset_range, indexing='ij'), -1).reshape(-1, 3)
+
+        # BS x NQ x O x 3
+        neighbour_voxel_indices = _np.expand_dims(query_voxel_indices, -2) + offsets
+        neighbour_validity = _np.all(_np.logical_and(
+            neighbour_voxel_indices >= 0,
+            neighbour_voxel_indices < _np.expand_dims(dims, -2)), -1)
+
+        # BS x NQ x O x len(BS)+1
+        query_indices = _np.stack(_np.meshgrid(
+            *[_np.arange(dim) for dim in self._batch_shape + [num_queries, offsets.shape[0]]], indexing='ij'), -1)[
+            ..., :-1]
+
+        # NN x len(BS)+3,    NN x len(BS)+1
+        neighbour_indices = _np.concatenate((query_indices[..., :-1], neighbour_voxel_indices), -1)[
+            neighbour_validity]
+        query_indices = query_indices[neighbour_validity]
+
+        # NN
+        neighbour_keys = _np.ravel_multi_index(tuple(neighbour_indices.T), self._total_dims) \
+            if neighbour_indices.shape[0] > 0 else _np.zeros((0,), _np.int64)
+
+        # NN
+        voxel_ids = _np.minimum(_np.searchsorted(self._voxel_keys, neighbour_keys),
+                                max(self._voxel_keys.shape[0] - 1, 0))
+        found = self._voxel_keys[voxel_ids] == neighbour_keys if self._voxel_keys.shape[0] > 0 \
+            else _np.zeros((0,), bool)
+
+        # NF,    NF x len(BS)+1
+        voxel_ids = voxel_ids[found]
+        query_indices = query_indices[found]
+
+        # NP
+        counts = self._voxel_counts[voxel_ids]
+        pair_offsets = _np.arange(_np.sum(counts)) - _np.repeat(_np.cumsum(counts) - counts, counts)
+        point_positions = _np.repeat(self._voxel_starts[voxel_ids], counts) + pair_offsets
+
+        # NP x len(BS)+1,    NP x len(BS)+1
+        point_indices = self._point_indices[point_positions]
+        query_indices = _np.repeat(query_indices, counts, 0)
+
+        if point_indices.shape[0] == 0:
+            return f.zeros((0, num_batch_dims + 1), 'int32', dev=self._dev), \
+                   f.zeros((0, num_batch_dims + 1), 'int32', dev=self._dev)
+        return f.array(point_indices.astype(_np.int32), dtype_str='int32', dev=self._dev), \
+            f.array(query_indices.astype(_np.int32), dtype_str='int32', dev=self._dev)
+
+    # Getters #
+    # --------#
+
+    @property
+    def num_occupied_voxels(self):
+        """
+        Number of occupied voxels in the index
+        """
+        return self._voxel_keys.shape[0]
+
+    @property
+    def dims(self):
+        """
+        Number of voxels in x, y, z directions *[batch_shape,3]*
+        """
+        return self._f.array(self._dims.astype(_np.int32), dtype_str='int32', dev=self._dev)
+
+    @property
+    def res(self):
+        """
+        Resolution (metres) of each voxel in x, y, z directions *[batch_shape,3]*
+        """
+        return self._f.array(self._res.astype(_np.float32), dtype_str='float32', dev=self._dev)
+
+    @property
+    def lower_corner(self):
+        """
+        World-centric x, y, z co-ordinate of the lower corner of the voxel grid *[batch_shape,3]*
+        """
+        return self._f.array(self._lower_corner.astype(_np.float32), dtype_str='float32', dev=self._dev)
+
+
+class TSDFVolume:
+
+    def __init__(self, lower_corner, dims, res, trunc_dist=None, dev='cpu', f=None):
+        """
+        Initialize persistent truncated signed distance function (TSDF) volume, which integrates one depth image at a
+        time by projective association, with each voxel centre projected into the depth image using
+        world_to_pixel_coords. Only the voxels inside the axis aligned bounding box of the camera frustum section
+        between the nearest and furthest observed depths, expanded by the truncation distance, are projected, and only
+        voxels inside the truncation band are updated. The weighted TSDF sum and the weight sum are stored as arrays on
+        the device, so that integration is additive, with the processed sub-block scattered into them.
+
+        :param lower_corner: World-centric x, y, z co-ordinate of the lower corner of the volume *[3]*
+        :type lower_corner: sequence of floats
+        :param dims: Number of voxels in x, y, z directions *[3]*
+        :type dims: sequence of ints
+        :param res: Resolution (metres) of each voxel, either shared or in x, y, z directions.
+        :type res: float or sequence of floats
+        :param trunc_dist: Truncation distance (metres). Default is three times the largest voxel resolution.
+        :type trunc_dist: float, optional
+        :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc.
+        :type dev: str, optional
+        :param f: Machine learning library. Global framework used if None.
+        :type f: ml_framework, optional
+        """
+        f = _get_framework(f=f)
+
+        self._res_list = [float(res)] * 3 if isinstance(res, (int, float)) else [float(item) for item in res]
+        self._lower_corner_list = [float(item) for item in lower_corner]
+        self._dims = [int(item) for item in dims]
+        self._trunc_dist = 3 * max(self._res_list) if trunc_dist is None else float(trunc_dist)
+        self._lower_corner = f.array(self._lower_corner_list, dtype_str='float32', dev=dev)
+        self._res = f.array(self._res_list, dtype_str='float32', dev=dev)
+        self._dev = dev
+        self._f = f
+        self._weighted_tsdf_sum = None
+        self._weight_sum = None
+        self.reset()
+
+    # Private Methods #
+    # ----------------#
+
+    def _frustum_voxel_bounds(self, depth_image, inv_full_mat, image_dims):
+
+        f = self._f
+
+        # the frustum bounds determine the shape of the processed sub-block, so only the six voxel bounds are copied
+        # host-side, with the depth range and the frustum corners computed on the device
+
+        # H x W x 1
+        valid = depth_image > 0
+
+        # 1 x 1
+        near = f.maximum(f.reduce_min(f.where(valid, depth_image, f.ones_like(depth_image) * _np.inf), [0, 1]) -
+                         self._trunc_dist, MIN_DENOMINATOR)
+        max_depth = f.reduce_max(f.where(valid, depth_image, f.zeros_like(depth_image)), [0, 1])
+        far = max_depth + self._trunc_dist
+
+        # 4 x 3
+        pixel_corners = f.array([[u, v, 1.] for v in [-0.5, image_dims[0] - 0.5] for u in [-0.5, image_dims[1] - 0.5]],
+                                dtype_str='float32', dev=self._dev)
+
+        # 8 x 4
+        corners = f.concatenate((f.concatenate((pixel_corners * near, pixel_corners * far), 0),
+                                 f.ones((8, 1), dev=self._dev)), -1)
+
+        # 8 x 3
+        world_corners = f.matmul(corners, f.transpose(inv_full_mat))[:, 0:3]
+
+        # 2 x 3
+        bounds = f.concatenate((f.floor((f.reduce_min(world_corners, 0, keepdims=True) - self._lower_corner) /
+                                        self._res),
+                                f.ceil((f.reduce_max(world_corners, 0, keepdims=True) - self._lower_corner) /
+                                       self._res)), 0)
+
+        # the bounds are undefined without any valid depths
+        bounds_np = f.to_numpy(f.concatenate((bounds, f.tile(f.reshape(max_depth, (1, 1)), (1, 3))), 0))
+        if bounds_np[2, 0] <= 0:
+            return None
+        lower_indices = [int(item) for item in _np.clip(bounds_np[0], 0, self._dims)]
+        upper_indices = [int(item) for item in _np.clip(bounds_np[1], 0, self._dims)]
+        if any([lower >= upper for lower, upper in zip(lower_indices, upper_indices)]):
+            return None
+        return lower_indices, upper_indices
+
+    # Public Methods #
+    # ---------------#
+
+    def reset(self):
+        """
+        Reset the volume to be entirely unobserved.
+        """
+        self._weighted_tsdf_sum = self._f.zeros(self._dims + [1], dev=self._dev)
+        self._weight_sum = self._f.zeros(self._dims + [1], dev=self._dev)
+
+    def integrate(self, depth_image, cam_geom, weight=1.):
+        """
+        Integrate depth image into the volume. Each voxel in the camera frustum is associated with the depth image pixel
+        it projects into, and its signed distance is the difference between the pixel depth and the voxel depth along
+        the camera axis, positive in front of the surface.
+
+        :param depth_image: Depth image, with non-positive values for invalid pixels *[h,w,1]*
+        :type depth_image: array
+        :param cam_geom: Camera geometry of the depth image, unbatched.
+        :type cam_geom: CameraGeometry
+        :param weight: Weight of the new observations.
+        :type weight: float, optional
+        """
+
+        f = self._f
+
+        # shapes as list
+        image_dims = list(depth_image.shape[0:2])
+
+        bounds = self._frustum_voxel_bounds(depth_image, cam_geom.inv_full_mats_homo, image_dims)
+        if bounds is None:
+            return
+        lower_indices, upper_indices = bounds
+        block_dims = [upper - lower for lower, upper in zip(lower_indices, upper_indices)]
+        num_block_voxels = block_dims[0] * block_dims[1] * block_dims[2]
+
+        # Voxel Centres #
+        # --------------#
+
+        # BX x BY x BZ x 3
+        block_indices = f.concatenate([f.tile(f.reshape(f.arange(
+            upper_indices[i], lower_indices[i], dtype_str='float32', dev=self._dev),
+            [block_dims[i] if j == i else 1 for j in range(3)] + [1]),
+            [1 if j == i else block_dims[j] for j in range(3)] + [1]) for i in range(3)], -1)
+        voxel_centres = self._lower_corner + (block_indices + 0.5) * self._res
+
+        # 1 x (BXxBYxBZ) x 4
+        voxel_centres_homo = f.concatenate((f.reshape(voxel_centres, (1, num_block_voxels, 3)),
+                                            f.ones((1, num_block_voxels, 1), dev=self._dev)), -1)
+
+        # Projective Association #
+        # -----------------------#
+
+        # (BXxBYxBZ) x 3
+        pixel_coords = f.reshape(_ivy_svg.world_to_pixel_coords(
+            voxel_centres_homo, cam_geom.full_mats_homo[0:3], [], [1, num_block_voxels], f=f), (-1, 3))
+
+        # (BXxBYxBZ) x 1
+        voxel_depths = pixel_coords[:, 2:3]
+        safe_voxel_depths = f.maximum(voxel_depths, MIN_DENOMINATOR)
+        pixel_x = f.round(pixel_coords[:, 0:1] / safe_voxel_depths)
+        pixel_y = f.round(pixel_coords[:, 1:2] / safe_voxel_depths)
+        in_image = f.logical_and(f.logical_and(pixel_x >= 0, pixel_x <= image_dims[1] - 1),
+                                 f.logical_and(pixel_y >= 0, pixel_y <= image_dims[0] - 1))
+        in_image = f.logical_and(in_image, voxel_depths > MIN_DENOMINATOR)
+
+        # (BXxBYxBZ) x 2
+        pixel_indices = f.cast(f.concatenate((f.minimum(f.maximum(pixel_y, 0), image_dims[0] - 1),
+                                              f.minimum(f.maximum(pixel_x, 0), image_dims[1] - 1)), -1), 'int32')
+
+        # (BXxBYxBZ) x 1
+        measured_depths = f.gather_nd(depth_image, pixel_indices)
+        signed_dists = measured_depths - voxel_depths
+        in_band = f.logical_and(f.logical_and(in_image, measured_depths > 0),
+                                f.abs(signed_dists) <= self._trunc_dist)
+        tsdf = signed_dists / self._trunc_dist
+
+        # Update #
+        # -------#
+
+        # (BXxBYxBZ) x 2
+        block_updates = f.concatenate((f.where(in_band, tsdf * weight, f.zeros_like(tsdf)),
+                                       f.where(in_band, f.ones_like(tsdf) * weight, f.zeros_like(tsdf))), -1)
+
+        # only the voxels of the processed sub-block are projected and scattered, the sums stay on the device
+
+        # (BXxBYxBZ) x 3
+        block_voxel_indices = f.cast(f.reshape(block_indices, (-1, 3)), 'int32')
+
+        # X x Y x Z x 2
+        updates = f.scatter_nd(block_voxel_indices, block_updates, self._dims + [2], reduction='sum')
+
+        # X x Y x Z x 1
+        self._weighted_tsdf_sum = self._weighted_tsdf_sum + updates[..., 0:1]
+        self._weight_sum = self._weight_sum + updates[..., 1:2]
+
+    # Getters #
+    # --------#
+
+    @property
+    def tsdf(self):
+        """
+        Truncated signed distance values, normalized by the truncation distance, with unobserved voxels set to one
+        *[x,y,z,1]*
+        """
+        f = self._f
+        return f.where(self._weight_sum > 0, self._weighted_tsdf_sum / (self._weight_sum + MIN_DENOMINATOR),
+                       f.ones_like(self._weight_sum))
+
+    @property
+    def weights(self):
+        """
+        Accumulated observation weights *[x,y,z,1]*
+        """
+        return self._weight_sum
+
+    @property
+    def dims(self):
+        """
+        Number of voxels in x, y, z directions
+        """
+        return self._dims
+
+    @property
+    def res(self):
+        """
+        Resolution (metres) of each voxel in x, y, z directions *[3]*
+        """
+        return self._res
+
+    @property
+    def lower_corner(self):
+        """
+        World-centric x, y, z co-ordinate of the lower corner of the volume *[3]*
+        """
+        return self._lower_corner
+
+    @property
+    def trunc_dist(self):
+        """
+        Truncation distance (metres)
+        """
+        return self._trunc_dist
+
+
+# Persistence #
+# ------------#
+
+
+def _save_arrays(dir_path, arrays, f):
+    if not _os.path.exists(dir_path):
+        _os.makedirs(dir_path)
+    for name, array in arrays.items():
+        _np.save(_os.path.join(dir_path, name + '.npy'), _np.ascontiguousarray(f.to_numpy(array)))
+
+
+def _load_arrays(dir_path, names, mmap_mode):
+    return [_np.load(_os.path.join(dir_path, name + '.npy'), mmap_mode=mmap_mode) for name in names]
+
+
+def save_voxel_grid(dir_path, voxel_grid, dims, res, lower_corner, f=None):
+    """
+    Save dense voxel grid, as returned by coords_to_voxel_grid, to a directory of uncompressed .npy files, one per
+    array, which can later be opened with memory mapping, so that readers only page in the regions they access.
+
+    :param dir_path: Directory to save the voxel grid to. Created if it does not exist.
+    :type dir_path: str
+    :param voxel_grid: Voxel grid *[batch_shape,x_max,v_max,z_max,3+feature_size+1]*
+    :type voxel_grid: array
+    :param dims: Voxel grid dimensions *[batch_shape,3]*
+    :type dims: array
+    :param res: Voxel grid resolutions *[batch_shape,3]*
+    :type res: array
+    :param lower_corner: Voxel grid lower corners *[batch_shape,3]*
+    :type lower_corner: array
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    """
+
+    f = _get_framework(voxel_grid, f=f)
+    _save_arrays(dir_path, {'voxel_grid': voxel_grid, 'dims': dims, 'res': res, 'lower_corner': lower_corner}, f)
+
+
+def load_voxel_grid(dir_path, mmap_mode='r'):
+    """
+    Load dense voxel grid saved with save_voxel_grid. With memory mapping, the returned voxel grid is a lazily paged
+    numpy memmap, which can be sliced before conversion to the framework of choice.
+
+    :param dir_path: Directory the voxel grid was saved to.
+    :type dir_path: str
+    :param mmap_mode: Numpy memory mapping mode, or None to read the voxel grid fully into memory. Default is 'r'.
+    :type mmap_mode: str, optional
+    :return: Voxel grid *[batch_shape,x_max,v_max,z_max,3+feature_size+1]*, dimensions *[batch_shape,3]*, resolutions *[batch_shape,3]*, voxel_grid_lower_corners *[batch_shape,3]*, all as numpy arrays
+    """
+    voxel_grid, = _load_arrays(dir_path, ['voxel_grid'], mmap_mode)
+    dims, res, lower_corner = _load_arrays(dir_path, ['dims', 'res', 'lower_corner'], None)
+    return voxel_grid, dims, res, lower_corner
+
+
+def load_voxel_grid_region(dir_path, lower_indices, upper_indices, dev='cpu', f=None):
+    """
+    Load a region of a dense voxel grid saved with save_voxel_grid, reading only the memory mapped voxels inside the
+    region from disk. The region is shared across all batch entries.
+
+    :param dir_path: Directory the voxel grid was saved to.
+    :type dir_path: str
+    :param lower_indices: Inclusive lower x, y, z voxel indices of the region *[3]*
+    :type lower_indices: sequence of ints
+    :param upper_indices: Exclusive upper x, y, z voxel indices of the region, at most the saved grid dimensions *[3]*
+    :type upper_indices: sequence of ints
+    :param dev: device on which to create the array 'cuda:0', 'cuda:1', 'cpu' etc.
+    :type dev: str, optional
+    :param f: Machine learning library. Global framework used if None.
+    :type f: ml_framework, optional
+    :return: Voxel grid region *[batch_shape,rx,ry,rz,3+feature_size+1]*, and its lower corners *[batch_shape,3]*
+    """
+
+    f = _get_framework(f=f)
+
+    voxel_grid, _, res, lower_corner = load_voxel_grid(dir_path, 'r')
+
+    # numpy slicing silently clips out-of-range indices, which would misplace the region lower corner
+    grid_dims = list(voxel_grid.shape[-4:-1])
+    if not all([0 <= lower < upper <= dim for lower, upper, dim in zip(lower_indices, upper_indices, grid_dims)]):
+        raise Exception('Region indices must satisfy 0 <= lower < upper <= {} for the saved voxel grid, but found '
+                        'lower {} and upper {}.'.format(grid_dims, list(lower_indices), list(upper_indices)))
+
+    # BS x RX x RY x RZ x 4+feature_size
+    region = _np.array(voxel_grid[..., lower_indices[0]:upper_indices[0], lower_indices[1]:upper_indices[1],
+                                  lower_indices[2]:upper_indices[2], :])
+
+    # BS x 3
+    region_lower_corner = lower_corner + res * _np.array(lower_indices, dtype=res.dtype)
+
+    return f.array(region, dev=dev), f.array(region_lower_corner, dev=dev)
+
+
+def save_sparse_voxel_grid(dir_path, voxel_keys, voxel_values, dims, res, lower_corner, f=None):
+    """
+    Save sparse voxel grid, as returned by coords_to_sparse_voxel_grid, to a directory of uncompressed .npy files, one
+    per array, which can later be opened with memory mapping.
+
+    :param dir_path: Directory to save the voxel grid to. Created if it does not exist.
+    :type dir_path: str
+    :param voxel_keys: Integer batch and x, y, z indices of the occupied voxels *[num_voxels,len(batch_shape)+3]*
+    :type voxel_keys: array
+    :param voxel_values: Voxel values of the occupied voxels *[num_voxels,3+feature_size+1]*
+    :type voxel_values: array
+    :param dims: Voxel grid dimensions *[batch_shape,3]*
+    :type dims: array
+    :param res: Voxel grid resolutions *[batch_shape,3]*
+    :type res: array
+    :param lower_corner: Voxel grid lower corners *[batch_shape,3]*
+    :type lower_corner: array
+    :param f: Machine learning library. Inferred from inputs if None.
+    :type f: ml_framework, optional
+    """
+
+    f = _get_framework(voxel_values, f=f)
+    _save_arrays(dir_path, {'voxel_keys': voxel_keys, 'voxel_values': voxel_values, 'dims': dims, 'res': res,
+                            'lower_corner': lower_corner}, f)
+
+
+def load_sparse_voxel_grid(dir_path, mmap_mode='r'):
+    """
+    Load sparse voxel grid saved with save_sparse_voxel_grid. With memory mapping, the returned voxel keys and values
+    are lazily paged numpy memmaps.
+
+    :param dir_path: Directory the voxel grid was saved to.
+    :type dir_path: str
+    :param mmap_mode: Numpy memory mapping mode, or None to read the voxels fully into memory. Default is 'r'.
+    :type mmap_mode: str, optional
+    :return: Voxel keys *[num_voxels,len(batch_shape)+3]*, voxel values *[num_voxels,3+feature_size+1]*, dimensions *[batch_shape,3]*, resolutions *[batch_shape,3]*, voxel_grid_lower_corners *[batch_shape,3]*, all as numpy arrays
+    """
+    voxel_keys, voxel_values = _load_arrays(dir_path, ['voxel_keys', 'voxel_values'], mmap_mode)
+    dims, res, lower_corner = _load_arrays(dir_path, ['dims', 'res', 'lower_corner'], None)
+    return voxel_keys, voxel_values, dims, res, lower_corner
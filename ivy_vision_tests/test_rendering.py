@@ -1,9 +1,11 @@
 # global
 import numpy as np
+import ivy.numpy as ivy_np
 
 # local
 import ivy_vision_tests.helpers as helpers
 from ivy_vision import rendering as ivy_ren
+from ivy_vision.containers import PrimitiveScene, CameraGeometry
 from ivy_vision_tests.data import TestData
 
 
@@ -111,6 +113,17 @@ class RenderingTestData(TestData):
         self.rasterized_image = np.array([[[True], [False], [False]],
                                           [[True], [True], [False]],
                                           [[True], [True], [True]]])
+        self.mesh_triangles = np.array([[[0., 0., 1.], [0., 2., 1.], [2., 0., 1.]],
+                                        [[2., 2., 0.5], [2., 0., 0.5], [0., 2., 0.5]]])
+        self.rasterized_depth = np.array([[[1.], [1.], [0.5]],
+                                          [[1.], [0.5], [0.5]],
+                                          [[0.5], [0.5], [0.5]]])
+        self.rasterized_triangle_ids = np.array([[[0], [0], [1]],
+                                                 [[0], [1], [1]],
+                                                 [[1], [1], [1]]])
+        self.rasterized_barycentrics = np.array([[[1., 0., 0.], [0.5, 0., 0.5], [0., 1., 0.]],
+                                                 [[0.5, 0.5, 0.], [0., 0.5, 0.5], [0.5, 0.5, 0.]],
+                                                 [[0., 0., 1.], [0.5, 0., 0.5], [1., 0., 0.]]])
 
         # Image Smoothing #
         # ----------------#
@@ -176,6 +189,50 @@ class RenderingTestData(TestData):
                                                     [11.,  8., 10.]])
 
         self.tri_mesh_4x3_vertices = np.reshape(self.coord_img, [1, -1, 3])
+        self.compact_tri_mesh_4x3_vertex_ids = np.array([2, 3, 4, 5, 6, 8, 10, 11])
+        self.compact_tri_mesh_4x3_indices = np.array([[1, 2, 4],
+                                                      [3, 0, 2],
+                                                      [7, 5, 6]])
+
+        # Sphere Tracing #
+        # ---------------#
+
+        # a unit sphere and an axis aligned cuboid, in front of a camera at the origin looking along positive z
+        self.tracing_image_dims = [16, 16]
+        calib_mat = np.array([[8., 0., 7.5], [0., 8., 7.5], [0., 0., 1.]])
+        self.tracing_full_mat = np.expand_dims(np.identity(4), 0)
+        self.tracing_full_mat[:, 0:3, 0:3] = calib_mat
+        self.tracing_inv_full_mat = np.linalg.inv(self.tracing_full_mat)
+        self.tracing_sphere_ext_mats = np.array([[[[1., 0., 0., -1.], [0., 1., 0., 0.], [0., 0., 1., 5.]]]])
+        self.tracing_sphere_radii = np.array([[[1.]]])
+        self.tracing_cuboid_ext_mats = np.array([[[[1., 0., 0., -1.5], [0., 1., 0., 0.], [0., 0., 1., -6.]]]])
+        self.tracing_cuboid_dims = np.array([[[2.4, 3., 1.]]])
+
+        # analytic ray intersections, with rays parameterized by depth
+
+        # H x W x 2
+        pixel_coords = np.flip(np.stack(np.meshgrid(np.arange(16.), np.arange(16.), indexing='ij'), -1), -1)
+
+        # H x W x 3
+        ray_dirs = np.concatenate(((pixel_coords - 7.5) / 8., np.ones((16, 16, 1))), -1)
+
+        # H x W
+        sphere_centre = np.array([-1., 0., 5.])
+        a = np.sum(ray_dirs ** 2, -1)
+        b = -2 * np.sum(ray_dirs * sphere_centre, -1)
+        c = np.sum(sphere_centre ** 2) - 1.
+        discriminant = b ** 2 - 4 * a * c
+        sphere_depths = np.where(discriminant >= 0, (-b - np.maximum(discriminant, 0.) ** 0.5) / (2 * a), np.inf)
+        front_face_coords = ray_dirs[..., 0:2] * 5.5
+        cuboid_depths = np.where(np.logical_and(
+            np.logical_and(front_face_coords[..., 0] >= 0.3, front_face_coords[..., 0] <= 2.7),
+            np.abs(front_face_coords[..., 1]) <= 1.5), 5.5, np.inf)
+
+        # 1 x H x W x 1
+        depths = np.minimum(sphere_depths, cuboid_depths)
+        self.traced_depth = np.reshape(np.where(np.isinf(depths), 0., depths), (1, 16, 16, 1))
+        self.traced_primitive_ids = np.reshape(np.where(
+            np.isinf(depths), -1, np.where(sphere_depths <= cuboid_depths, 0, 1)), (1, 16, 16, 1))
 
 
 td = RenderingTestData()
@@ -223,6 +280,33 @@ def test_quantize_pixel_coordinates_with_var():
                     var_threshold=np.array([[0.]*2]*2))
 
 
+def test_quantize_pixel_coordinates_with_var_fused():
+    for lib, call in helpers.calls:
+        if call in [helpers.mx_call, helpers.mx_graph_call]:
+            # mxnet does not support sum for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        mean, var, counter = call(ivy_ren.render_pixel_coords,
+                                  td.coords_to_scatter,
+                                  np.zeros_like(td.simple_uniform_pixel_coords[..., -2:]),
+                                  [3, 3],
+                                  pixel_coords_var=td.vars_to_scatter,
+                                  prior_var=np.ones_like(td.simple_uniform_pixel_coords[..., -2:]) * 10,
+                                  var_threshold=np.array([[0., 1e4]]*2), fused=True)
+        assert np.allclose(counter, td.quantized_counter, atol=1e-6)
+        assert np.allclose(mean, td.quantized_pixel_coords_from_cov, atol=1e-3)
+        assert np.allclose(var, td.quantized_cov_values, atol=1e-3)
+
+        mean_b, var_b, counter_b = call(ivy_ren.render_pixel_coords,
+                                        np.tile(np.expand_dims(td.coords_to_scatter, 0), (2, 1, 1)),
+                                        np.zeros((2, 3, 3, 2)),
+                                        [3, 3],
+                                        pixel_coords_var=np.tile(np.expand_dims(td.vars_to_scatter, 0), (2, 1, 1)),
+                                        prior_var=np.ones((2, 3, 3, 2)) * 10,
+                                        var_threshold=(0., 1e4), fused=True)
+        assert np.allclose(counter_b, np.tile(np.expand_dims(td.quantized_counter, 0), (2, 1, 1, 1)), atol=1e-6)
+        assert np.allclose(mean_b[1], td.quantized_pixel_coords_from_cov, atol=1e-3)
+
+
 def test_quantize_pixel_coords_with_var_db():
     for lib, call in helpers.calls:
         if call in [helpers.mx_call, helpers.mx_graph_call]:
@@ -256,6 +340,24 @@ def test_quantize_pixel_coords_with_var_db():
                     var_threshold=np.array([[0., 0.]]*2))
 
 
+def test_quantize_pixel_coords_with_var_zbuffer():
+    for lib, call in helpers.calls:
+        if call in [helpers.mx_call, helpers.mx_graph_call]:
+            # mxnet does not support min for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        mean, var, validity_mask = call(ivy_ren.render_pixel_coords,
+                                        td.coords_to_scatter,
+                                        np.zeros_like(td.simple_uniform_pixel_coords[..., -2:]),
+                                        [3, 3],
+                                        with_db=True,
+                                        pixel_coords_var=td.vars_to_scatter,
+                                        prior_var=np.ones_like(td.simple_uniform_pixel_coords[..., -2:]) * 10,
+                                        var_threshold=np.array([[0., 1e4]]*2), fused=True)
+        assert np.allclose(validity_mask, td.validity_mask, atol=1e-6)
+        assert np.allclose(mean, td.quantized_pixel_coords_from_cov_db, atol=1e-3)
+        assert np.allclose(var, td.quantized_cov_values_db, atol=1e-3)
+
+
 def test_quantize_omni_pixel_coords():
     for lib, call in helpers.calls:
         if call is helpers.mx_graph_call:
@@ -319,6 +421,91 @@ def test_quantize_omni_pixel_coords_with_var_db():
                     var_threshold=np.array([[0., 0.5]]))
 
 
+def test_quantize_omni_pixel_coords_with_var_zbuffer():
+    for lib, call in helpers.calls:
+        if call in [helpers.mx_call, helpers.mx_graph_call]:
+            # mxnet does not support min for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        mean, var, validity_mask = call(ivy_ren.render_pixel_coords,
+                                        td.simple_projected_omni_pixel_coords,
+                                        np.zeros_like(td.simple_uniform_pixel_coords[..., -2:]),
+                                        [3, 3], mode='omni', with_db=True,
+                                        pixel_coords_var=td.vars_to_scatter,
+                                        prior_var=np.ones_like(td.simple_uniform_pixel_coords[..., -2:]) * 10,
+                                        var_threshold=np.array([[0., 1e4]]*2), fused=True)
+        assert np.allclose(validity_mask, td.validity_mask, atol=1e-6)
+        assert np.allclose(mean, td.quantized_omni_pixel_coords_from_cov_db, atol=1e-3)
+        assert np.allclose(var, td.quantized_cov_values_db, atol=1e-3)
+
+
+def test_render_pixel_coords_from_chunks():
+    for lib, call in helpers.calls:
+        if call in [helpers.mx_call, helpers.mx_graph_call]:
+            # mxnet does not support sum or min for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        if call is helpers.tf_graph_call:
+            # chunks are consumed from a python iterable, which is only valid in eager mode
+            continue
+        for mode, coords, with_db, true_mean, true_var, true_counter in [
+                ('proj', td.coords_to_scatter, False, td.quantized_pixel_coords_from_cov, td.quantized_cov_values,
+                 td.quantized_counter),
+                ('proj', td.coords_to_scatter, True, td.quantized_pixel_coords_from_cov_db,
+                 td.quantized_cov_values_db, td.validity_mask),
+                ('omni', td.simple_projected_omni_pixel_coords, False, td.quantized_omni_pixel_coords_from_cov,
+                 td.quantized_cov_values, td.quantized_counter),
+                ('omni', td.simple_projected_omni_pixel_coords, True, td.quantized_omni_pixel_coords_from_cov_db,
+                 td.quantized_cov_values_db, td.validity_mask)]:
+            chunks = [(coords[0:4], td.vars_to_scatter[0:4]), (coords[4:7], td.vars_to_scatter[4:7]),
+                      (coords[7:], td.vars_to_scatter[7:])]
+            mean, var, counter = call(ivy_ren.render_pixel_coords_from_chunks,
+                                      chunks,
+                                      np.zeros_like(td.simple_uniform_pixel_coords[..., -2:]),
+                                      [3, 3], mode=mode, with_db=with_db,
+                                      prior_var=np.ones_like(td.simple_uniform_pixel_coords[..., -2:]) * 10,
+                                      var_threshold=np.array([[0., 1e4]]*2))
+            assert np.allclose(counter, true_counter, atol=1e-6)
+            assert np.allclose(mean, true_mean, atol=1e-3)
+            assert np.allclose(var, true_var, atol=1e-3)
+
+
+def test_render_accumulator():
+
+    def _accumulate(coords, coords_var, prior, prior_var, var_threshold, mode, with_db):
+        accumulator = ivy_ren.RenderAccumulator(prior, [3, 3], mode, with_db, prior_var, var_threshold)
+        accumulator.integrate(coords[0:5], coords_var[0:5])
+        accumulator.integrate(coords[5:], coords_var[5:])
+        rendered = accumulator.finalize()
+        accumulator.reset()
+        accumulator.integrate(coords[5:], coords_var[5:])
+        accumulator.integrate(coords[0:5], coords_var[0:5])
+        return rendered, accumulator.finalize()
+
+    for lib, call in helpers.calls:
+        if call in [helpers.mx_call, helpers.mx_graph_call]:
+            # mxnet does not support sum or min for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        if call is helpers.tf_graph_call:
+            # the accumulator holds python-side state between integrations, which is only valid in eager mode
+            continue
+        for mode, coords, with_db, true_mean, true_var, true_counter in [
+                ('proj', td.coords_to_scatter, False, td.quantized_pixel_coords_from_cov, td.quantized_cov_values,
+                 td.quantized_counter),
+                ('proj', td.coords_to_scatter, True, td.quantized_pixel_coords_from_cov_db,
+                 td.quantized_cov_values_db, td.validity_mask),
+                ('omni', td.simple_projected_omni_pixel_coords, False, td.quantized_omni_pixel_coords_from_cov,
+                 td.quantized_cov_values, td.quantized_counter),
+                ('omni', td.simple_projected_omni_pixel_coords, True, td.quantized_omni_pixel_coords_from_cov_db,
+                 td.quantized_cov_values_db, td.validity_mask)]:
+            rendered, re_rendered = call(_accumulate, coords, td.vars_to_scatter,
+                                         np.zeros_like(td.simple_uniform_pixel_coords[..., -2:]),
+                                         np.ones_like(td.simple_uniform_pixel_coords[..., -2:]) * 10,
+                                         np.array([[0., 1e4]]*2), mode, with_db)
+            for mean, var, counter in [rendered, re_rendered]:
+                assert np.allclose(counter, true_counter, atol=1e-6)
+                assert np.allclose(mean, true_mean, atol=1e-3)
+                assert np.allclose(var, true_var, atol=1e-3)
+
+
 def test_rasterize_triangles():
     for lib, call in helpers.calls:
         if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
@@ -329,6 +516,28 @@ def test_rasterize_triangles():
                                 batch_shape=[1])[0], td.rasterized_image, atol=1e-3)
 
 
+def test_rasterize_triangles_tiled():
+    for lib, call in helpers.calls:
+        if call in [helpers.mx_call, helpers.mx_graph_call]:
+            # mxnet does not support min for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        if call is helpers.tf_graph_call:
+            # the need to dynamically infer the number of binned triangles makes this only valid in eager mode
+            continue
+        for tile_dims in [[3, 3], [2, 2], [1, 3]]:
+            depth, triangle_ids, barycentrics = call(ivy_ren.rasterize_triangles_tiled, td.mesh_triangles, [3, 3],
+                                                     tile_dims)
+            assert np.allclose(depth, td.rasterized_depth, atol=1e-6)
+            assert np.array_equal(triangle_ids, td.rasterized_triangle_ids)
+            assert np.allclose(barycentrics, td.rasterized_barycentrics, atol=1e-6)
+        depth, triangle_ids, barycentrics = call(ivy_ren.rasterize_triangles_tiled,
+                                                 np.tile(np.expand_dims(td.mesh_triangles, 0), (2, 1, 1, 1)),
+                                                 [3, 3], [2, 2])
+        assert np.allclose(depth[1], td.rasterized_depth, atol=1e-6)
+        assert np.array_equal(triangle_ids[1], td.rasterized_triangle_ids)
+        assert np.allclose(barycentrics[1], td.rasterized_barycentrics, atol=1e-6)
+
+
 def test_weighted_image_smooth():
     for lib, call in helpers.calls:
         if call in [helpers.np_call, helpers.jnp_call, helpers.mx_graph_call]:
@@ -338,6 +547,16 @@ def test_weighted_image_smooth():
         assert np.allclose(mean_ret, td.smoothed_img_from_weights, atol=1e-6)
 
 
+def test_weighted_image_smooth_integral():
+    for lib, call in helpers.calls:
+        if call is helpers.mx_graph_call:
+            # mxnet symbolic does not fully support array slicing
+            continue
+        mean_ret, _ = call(ivy_ren.weighted_image_smooth, td.mean_img, 1/td.var_img, td.kernel_size, 'integral',
+                           f=lib)
+        assert np.allclose(mean_ret, td.smoothed_img_from_weights, atol=1e-6)
+
+
 def test_smooth_image_fom_var_image():
     for lib, call in helpers.calls:
         if call in [helpers.np_call, helpers.jnp_call, helpers.mx_graph_call]:
@@ -349,6 +568,52 @@ def test_smooth_image_fom_var_image():
         assert np.allclose(var_ret, td.smoothed_var_from_var, atol=1e-6)
 
 
+def test_separable_smoothing_kernels():
+    for lib, call in helpers.calls:
+        if call is helpers.mx_graph_call:
+            # mxnet symbolic does not fully support array slicing
+            continue
+        col_kernels, row_kernels, kernel_error = call(ivy_ren.separable_smoothing_kernels, td.kernel_size,
+                                                      td.kernel_scale, 2, f=lib)
+        assert col_kernels.shape == (1, td.kernel_size, 2)
+        assert row_kernels.shape == (1, td.kernel_size, 2)
+        assert np.allclose(np.einsum('rid,rjd->ijd', col_kernels, row_kernels), 1., atol=1e-5)
+        assert np.allclose(kernel_error, 0., atol=1e-5)
+        _, _, kernel_error = call(ivy_ren.separable_smoothing_kernels, td.kernel_size, np.array([0.5, 2.]), 2,
+                                  td.kernel_size, f=lib)
+        assert np.allclose(kernel_error, 0., atol=1e-5)
+
+
+def test_smooth_image_fom_var_image_separable():
+
+    def _np_depthwise_conv(x, kernel):
+        kernel_height, kernel_width = kernel.shape[0:2]
+        out_height, out_width = x.shape[-3] - kernel_height + 1, x.shape[-2] - kernel_width + 1
+        return sum([x[..., i:i + out_height, j:j + out_width, :] * kernel[i, j]
+                    for i in range(kernel_height) for j in range(kernel_width)])
+
+    # numpy does not yet support depthwise 2d convolutions, so the separable error bound is checked with numpy kernels
+    image = np.random.uniform(-1., 1., (1, 8, 8, 2))
+    for kernel_scale in [td.kernel_scale, np.array([0.5, 2.])]:
+        col_kernels, row_kernels, kernel_error = ivy_ren.separable_smoothing_kernels(td.kernel_size, kernel_scale, 2,
+                                                                                     f=ivy_np)
+        dense_kernel = np.einsum('rid,rjd->ijd', *ivy_ren.separable_smoothing_kernels(
+            td.kernel_size, kernel_scale, 2, td.kernel_size, f=ivy_np)[0:2])
+        separable_ret = sum([_np_depthwise_conv(_np_depthwise_conv(image, col_kernels[r][:, None]),
+                                                row_kernels[r][None]) for r in range(col_kernels.shape[0])])
+        dense_ret = _np_depthwise_conv(image, dense_kernel)
+        assert np.all(np.abs(separable_ret - dense_ret) <= kernel_error * np.max(np.abs(image), (0, 1, 2)) + 1e-5)
+
+    for lib, call in helpers.calls:
+        if call in [helpers.np_call, helpers.jnp_call, helpers.mx_graph_call]:
+            # numpy and jax do not yet support depthwise 2d convolutions, and mxnet symbolic not fully array slicing
+            continue
+        mean_ret, var_ret = call(ivy_ren.smooth_image_fom_var_image, td.mean_img, td.var_img, td.kernel_size,
+                                 td.kernel_scale, 'separable', td.kernel_size, f=lib)
+        assert np.allclose(mean_ret, td.smoothed_img_from_var, atol=1e-5)
+        assert np.allclose(var_ret, td.smoothed_var_from_var, atol=1e-4)
+
+
 def test_pad_omni_image():
     for lib, call in helpers.calls:
         if call is helpers.mx_graph_call:
@@ -359,11 +624,29 @@ def test_pad_omni_image():
 
 def test_create_trimesh_indices_for_image():
     for lib, call in helpers.calls:
-        if call in [helpers.mx_call, helpers.mx_graph_call]:
-            # mxnet matmul only support N-D*N-D array (N >= 3)
+        if call is helpers.mx_graph_call:
+            # mxnet symbolic does not fully support array slicing
             continue
         assert np.allclose(call(ivy_ren.create_trimesh_indices_for_image, [1], [4, 3], f=lib),
                            td.tri_mesh_4x3_indices, atol=1e-3)
+        assert np.array_equal(call(ivy_ren.create_trimesh_indices_for_image, [2, 2], [4, 3], f=lib)[1, 0],
+                              td.tri_mesh_4x3_indices[0])
+
+
+def test_create_flat_trimesh_indices_for_image():
+    for lib, call in helpers.calls:
+        if call is helpers.mx_graph_call:
+            # mxnet symbolic does not fully support array slicing
+            continue
+        ivy_ren.clear_trimesh_indices_cache()
+        for _ in range(2):
+            flat_trimesh_indices = call(ivy_ren.create_flat_trimesh_indices_for_image, [4, 3], f=lib)
+            assert flat_trimesh_indices.shape == (np.prod(td.tri_mesh_4x3_indices.shape),)
+            assert np.array_equal(flat_trimesh_indices, np.reshape(td.tri_mesh_4x3_indices, (-1,)))
+        if call is not helpers.tf_graph_call:
+            cache_info = ivy_ren.trimesh_indices_cache_info()
+            assert cache_info['misses'] == 1
+            assert cache_info['hits'] == 1
 
 
 def test_coord_image_to_trimesh():
@@ -383,3 +666,52 @@ def test_coord_image_to_trimesh():
                                          batch_shape=[1], image_dims=[4, 3], dev='cpu', f=lib)
         assert np.allclose(vertices, td.tri_mesh_4x3_vertices, atol=1e-3)
         assert np.allclose(trimesh_indices, td.tri_mesh_4x3_valid_indices, atol=1e-3)
+
+
+def test_coord_image_to_compact_trimesh():
+    for lib, call in helpers.calls:
+        if call in [helpers.mx_call, helpers.mx_graph_call]:
+            # mxnet does not support sum for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        if call is helpers.tf_graph_call:
+            # the need to dynamically infer the number of valid faces makes this only valid in eager mode
+            continue
+        vertices, trimesh_indices, vertex_batch_indices = call(
+            ivy_ren.coord_image_to_compact_trimesh, td.coord_img, td.coord_validity_img, f=lib)
+        assert np.allclose(vertices, td.tri_mesh_4x3_vertices[0][td.compact_tri_mesh_4x3_vertex_ids], atol=1e-6)
+        assert np.array_equal(trimesh_indices, td.compact_tri_mesh_4x3_indices)
+        assert np.array_equal(vertex_batch_indices, np.zeros((8, 1)))
+        vertices, trimesh_indices, vertex_batch_indices = call(
+            ivy_ren.coord_image_to_compact_trimesh, np.tile(td.coord_img, (2, 1, 1, 1)),
+            np.tile(td.coord_validity_img, (2, 1, 1, 1)), f=lib)
+        assert np.allclose(vertices[8:], td.tri_mesh_4x3_vertices[0][td.compact_tri_mesh_4x3_vertex_ids], atol=1e-6)
+        assert np.array_equal(trimesh_indices[3:], td.compact_tri_mesh_4x3_indices + 8)
+        assert np.array_equal(vertex_batch_indices[:, 0], np.array([0] * 8 + [1] * 8))
+
+
+def test_sphere_trace_primitive_scene():
+
+    def _trace(sphere_ext_mats, sphere_radii, cuboid_ext_mats, cuboid_dims, full_mat, inv_full_mat, image_dims,
+               compaction_interval):
+        scene = PrimitiveScene(sphere_ext_mats, sphere_radii, cuboid_ext_mats, cuboid_dims)
+        cam_geom = CameraGeometry(None, None, full_mat, inv_full_mat)
+        return ivy_ren.sphere_trace_primitive_scene(scene, cam_geom, image_dims,
+                                                    compaction_interval=compaction_interval)
+
+    for lib, call in helpers.calls:
+        if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
+            # the number of active rays is inferred at each compaction, which is only valid in eager mode
+            continue
+        if call is helpers.mx_call:
+            # mxnet does not support sum for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        for batch_shape, compaction_interval in [([1], 1), ([1], 8), ([2, 1], 8)]:
+            depth, primitive_ids = call(
+                _trace, np.tile(td.tracing_sphere_ext_mats, batch_shape + [1, 1, 1]),
+                np.tile(td.tracing_sphere_radii, batch_shape + [1, 1]),
+                np.tile(td.tracing_cuboid_ext_mats, batch_shape + [1, 1, 1]),
+                np.tile(td.tracing_cuboid_dims, batch_shape + [1, 1]),
+                np.tile(td.tracing_full_mat, batch_shape + [1, 1]),
+                np.tile(td.tracing_inv_full_mat, batch_shape + [1, 1]), td.tracing_image_dims, compaction_interval)
+            assert np.array_equal(primitive_ids, np.tile(td.traced_primitive_ids, batch_shape + [1, 1, 1]))
+            assert np.allclose(depth, np.tile(td.traced_depth, batch_shape + [1, 1, 1]), atol=5e-3)
@@ -1,10 +1,12 @@
 # global
 import numpy as np
+import ivy.numpy as ivy_np
 
 # local
 import ivy_vision_tests.helpers as helpers
 from ivy_vision_tests.data import TestData
 from ivy_vision import sdf as ivy_sdf
+from ivy_vision.containers import PrimitiveScene
 
 
 class SDFTestData(TestData):
@@ -17,6 +19,14 @@ class SDFTestData(TestData):
         self.sphere_radii = np.array([[[1.], [0.5]]])
         self.sphere_query_positions = np.array([[[0., 0., 0.], [0., 1., 0.], [0., 1., 2.], [0., 1.5, 2.]]])
         self.sphere_sdf_vals = np.array([[[-1.], [0.], [-0.5], [0.]]])
+        self.sphere_sdf_gradients = np.array([[[0., 0., 0.], [0., 1., 0.], [0., 0., 0.], [0., 1., 0.]]])
+        self.sphere_closest_indices = np.array([[[0], [0], [1], [1]]])
+
+        # many spheres
+        rng = np.random.RandomState(0)
+        self.many_sphere_positions = rng.uniform(0., 5., (2, 50, 3))
+        self.many_sphere_radii = rng.uniform(0.05, 0.3, (2, 50, 1))
+        self.many_sphere_query_positions = rng.uniform(-2., 7., (2, 200, 3))
 
         # cuboid
         self.cuboid_ext_mats = np.concatenate((np.expand_dims(np.expand_dims(np.identity(4)[0:3], 0), 0),
@@ -27,6 +37,24 @@ class SDFTestData(TestData):
         self.cuboid_dims = np.array([[[1., 1., 1.], [0.5, 1.0, 0.75]]])
         self.cuboid_query_positions = np.array([[[0., 0., 0.], [0., 0.5, 0.], [1., 2., 3.], [1., 2, 3.25]]])
         self.cuboid_sdf_vals = np.array([[[-0.5], [0.], [-0.25], [0.]]])
+        self.cuboid_gradient_query_positions = np.array([[[0.2, 0.1, -0.3], [0.9, 0.2, 0.1], [1.3, 2.1, 2.6],
+                                                          [2., 3., 4.]]])
+        self.cuboid_closest_indices = np.array([[[0], [0], [1], [1]]])
+
+        # primitive scene
+        self.scene_sphere_ext_mats = np.tile(np.identity(4)[0:3], (1, 2, 1, 1))
+        self.scene_sphere_ext_mats[..., -1] = self.sphere_positions
+        self.scene_query_positions = np.concatenate((self.sphere_query_positions, self.cuboid_query_positions), 1)
+
+        # sdf grid, sampled from a linear function, which trilinear interpolation reproduces exactly
+        self.sdf_grid_lower_corner = np.array([-1., 0., 1.])
+        self.sdf_grid_res = np.array([0.5, 0.25, 1.])
+        self.sdf_grid_linear_coeffs = np.array([0.3, -1.2, 2.])
+        grid_node_positions = self.sdf_grid_lower_corner + np.stack(np.meshgrid(
+            np.arange(5), np.arange(4), np.arange(3), indexing='ij'), -1) * self.sdf_grid_res
+        self.sdf_grid = np.expand_dims(np.sum(grid_node_positions * self.sdf_grid_linear_coeffs, -1, keepdims=True), 0)
+        self.sdf_grid_query_positions = np.array([[[-1., 0., 1.], [0.1, 0.3, 2.7], [0.99, 0.74, 2.5], [-0.2, 0.5, 1.]]])
+        self.sdf_grid_sdf_vals = np.sum(self.sdf_grid_query_positions * self.sdf_grid_linear_coeffs, -1, keepdims=True)
 
 
 td = SDFTestData()
@@ -43,6 +71,88 @@ def test_sphere_signed_distance():
                                 td.sphere_query_positions[0]), td.sphere_sdf_vals[0], atol=1e-6)
 
 
+def test_sphere_signed_distance_bucketed():
+    for lib, call in helpers.calls:
+        if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
+            # the host-side sort of the sphere cells makes this only valid in eager mode
+            continue
+        if call is helpers.mx_call:
+            # mxnet does not support sum for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        assert np.allclose(call(ivy_sdf.sphere_signed_distances_bucketed, td.sphere_positions, td.sphere_radii,
+                                td.sphere_query_positions), td.sphere_sdf_vals, atol=1e-6)
+        assert np.allclose(call(ivy_sdf.sphere_signed_distances_bucketed, td.sphere_positions[0], td.sphere_radii[0],
+                                td.sphere_query_positions[0]), td.sphere_sdf_vals[0], atol=1e-6)
+        # many spheres, with both candidate and exact fallback query points, in one or several query chunks
+        for cell_size, cell_radius in [(None, 1), (0.5, 1), (1., 2)]:
+            for memory_budget in [2**28, 5*10**4]:
+                assert np.allclose(call(ivy_sdf.sphere_signed_distances_bucketed, td.many_sphere_positions,
+                                        td.many_sphere_radii, td.many_sphere_query_positions, cell_size, cell_radius,
+                                        memory_budget),
+                                   ivy_sdf.sphere_signed_distances(td.many_sphere_positions, td.many_sphere_radii,
+                                                                   td.many_sphere_query_positions, f=ivy_np), atol=1e-5)
+        # budget too small for a single query point
+        rejected = False
+        try:
+            call(ivy_sdf.sphere_signed_distances_bucketed, td.many_sphere_positions, td.many_sphere_radii,
+                 td.many_sphere_query_positions, memory_budget=1)
+        except Exception:
+            rejected = True
+        assert rejected
+        # coplanar spheres of zero radius give a zero default cell size, and are all evaluated exactly
+        planar_sphere_positions = td.many_sphere_positions * np.array([1., 1., 0.], np.float32)
+        zero_sphere_radii = td.many_sphere_radii * 0
+        assert np.allclose(call(ivy_sdf.sphere_signed_distances_bucketed, planar_sphere_positions, zero_sphere_radii,
+                                td.many_sphere_query_positions),
+                           ivy_sdf.sphere_signed_distances(planar_sphere_positions, zero_sphere_radii,
+                                                           td.many_sphere_query_positions, f=ivy_np), atol=1e-5)
+
+
+def test_cuboid_signed_distance_with_gradients():
+    for lib, call in helpers.calls:
+        if call is helpers.mx_graph_call:
+            # mxnet symbolic does not fully support array slicing
+            continue
+        sdfs, gradients, closest_indices = call(ivy_sdf.cuboid_signed_distances_with_gradients, td.cuboid_ext_mats,
+                                                td.cuboid_dims, td.cuboid_gradient_query_positions)
+        assert np.allclose(sdfs, ivy_sdf.cuboid_signed_distances(
+            td.cuboid_ext_mats, td.cuboid_dims, td.cuboid_gradient_query_positions, f=ivy_np), atol=1e-6)
+        assert np.array_equal(closest_indices, td.cuboid_closest_indices)
+        # central finite differences
+        delta = 1e-4
+        true_gradients = np.concatenate([(ivy_sdf.cuboid_signed_distances(
+            td.cuboid_ext_mats, td.cuboid_dims, td.cuboid_gradient_query_positions + delta * offset, f=ivy_np) -
+            ivy_sdf.cuboid_signed_distances(
+                td.cuboid_ext_mats, td.cuboid_dims, td.cuboid_gradient_query_positions - delta * offset, f=ivy_np))
+            / (2 * delta) for offset in np.identity(3)], -1)
+        assert np.allclose(gradients, true_gradients, atol=1e-4)
+
+
+def test_sdf_grid_lookup():
+    for lib, call in helpers.calls:
+        if call is helpers.mx_graph_call:
+            # mxnet symbolic does not fully support array slicing
+            continue
+        assert np.allclose(call(ivy_sdf.sdf_grid_lookup, td.sdf_grid, td.sdf_grid_lower_corner, td.sdf_grid_res,
+                                td.sdf_grid_query_positions), td.sdf_grid_sdf_vals, atol=1e-5)
+        sdfs, grads = call(ivy_sdf.sdf_grid_lookup, td.sdf_grid[0], td.sdf_grid_lower_corner, td.sdf_grid_res,
+                           td.sdf_grid_query_positions[0], True)
+        assert np.allclose(sdfs, td.sdf_grid_sdf_vals[0], atol=1e-5)
+        assert np.allclose(grads, np.tile(td.sdf_grid_linear_coeffs, (4, 1)), atol=1e-5)
+
+
+def test_sphere_signed_distance_with_gradients():
+    for lib, call in helpers.calls:
+        if call is helpers.mx_graph_call:
+            # mxnet symbolic does not fully support array slicing
+            continue
+        sdfs, gradients, closest_indices = call(ivy_sdf.sphere_signed_distances_with_gradients, td.sphere_positions,
+                                                td.sphere_radii, td.sphere_query_positions)
+        assert np.allclose(sdfs, td.sphere_sdf_vals, atol=1e-6)
+        assert np.allclose(gradients, td.sphere_sdf_gradients, atol=1e-6)
+        assert np.array_equal(closest_indices, td.sphere_closest_indices)
+
+
 def test_cuboid_signed_distance():
     for lib, call in helpers.calls:
         if call is helpers.mx_graph_call:
@@ -52,3 +162,76 @@ def test_cuboid_signed_distance():
                                 td.cuboid_query_positions), td.cuboid_sdf_vals, atol=1e-6)
         assert np.allclose(call(ivy_sdf.cuboid_signed_distances, td.cuboid_ext_mats[0], td.cuboid_dims[0],
                                 td.cuboid_query_positions[0]), td.cuboid_sdf_vals[0], atol=1e-6)
+
+
+def test_primitive_scene_sdf_chunked():
+
+    def _scene_sdfs(sphere_ext_mats, sphere_radii, cuboid_ext_mats, cuboid_dims, query_positions, memory_budget):
+        scene = PrimitiveScene(sphere_ext_mats, sphere_radii, cuboid_ext_mats, cuboid_dims)
+        return scene.sdf(query_positions), scene.sdf(query_positions, memory_budget)
+
+    for lib, call in helpers.calls:
+        if call is helpers.mx_graph_call:
+            # mxnet symbolic does not fully support array slicing
+            continue
+        for memory_budget in [1, 4 * 16 * 8, 2**28]:
+            sdfs, chunked_sdfs = call(_scene_sdfs, td.scene_sphere_ext_mats, td.sphere_radii, td.cuboid_ext_mats,
+                                      td.cuboid_dims, td.scene_query_positions, memory_budget)
+            assert np.allclose(chunked_sdfs, sdfs, atol=1e-6)
+            assert np.allclose(chunked_sdfs, np.minimum(
+                ivy_sdf.sphere_signed_distances(td.sphere_positions, td.sphere_radii, td.scene_query_positions,
+                                                f=ivy_np),
+                ivy_sdf.cuboid_signed_distances(td.cuboid_ext_mats, td.cuboid_dims, td.scene_query_positions,
+                                                f=ivy_np)), atol=1e-6)
+
+
+def test_primitive_scene_baked_sdf():
+
+    def _baked_scene_sdfs(sphere_ext_mats, sphere_radii, cuboid_ext_mats, cuboid_dims, query_positions):
+        scene = PrimitiveScene(sphere_ext_mats, sphere_radii, cuboid_ext_mats, cuboid_dims)
+        scene.bake_sdf([-1., -1., -1.], [9, 13, 21], 0.25)
+        baked_sdfs, baked_grads = scene.baked_sdf(query_positions, True)
+        scene['sphere_radii'] = sphere_radii * 2
+        assert scene.baked_sdf_grid is None
+        return scene.sdf(query_positions), baked_sdfs, baked_grads
+
+    for lib, call in helpers.calls:
+        if call is helpers.mx_graph_call:
+            # mxnet symbolic does not fully support array slicing
+            continue
+        # query positions at the grid nodes
+        query_positions = np.array([[[-1., -1., -1.], [0., 1., 2.], [1., 0.5, 4.], [0.5, 1.5, 3.25], [0., 0.5, 3.]]])
+        sdfs, baked_sdfs, baked_grads = call(_baked_scene_sdfs, td.scene_sphere_ext_mats, td.sphere_radii,
+                                             td.cuboid_ext_mats, td.cuboid_dims, query_positions)
+        assert np.allclose(baked_sdfs, np.minimum(
+            ivy_sdf.sphere_signed_distances(td.sphere_positions, td.sphere_radii, query_positions, f=ivy_np),
+            ivy_sdf.cuboid_signed_distances(td.cuboid_ext_mats, td.cuboid_dims, query_positions, f=ivy_np)),
+            atol=1e-5)
+        assert baked_grads.shape == (1, 5, 3)
+        # entries set after baking are used by sdf
+        assert np.allclose(sdfs, np.minimum(
+            ivy_sdf.sphere_signed_distances(td.sphere_positions, td.sphere_radii * 2, query_positions, f=ivy_np),
+            ivy_sdf.cuboid_signed_distances(td.cuboid_ext_mats, td.cuboid_dims, query_positions, f=ivy_np)),
+            atol=1e-5)
+
+
+def test_primitive_scene_sdf_with_gradients():
+
+    def _scene_sdfs_with_gradients(sphere_ext_mats, sphere_radii, cuboid_ext_mats, cuboid_dims, query_positions):
+        return PrimitiveScene(sphere_ext_mats, sphere_radii, cuboid_ext_mats, cuboid_dims).sdf_with_gradients(
+            query_positions)
+
+    for lib, call in helpers.calls:
+        if call is helpers.mx_graph_call:
+            # mxnet symbolic does not fully support array slicing
+            continue
+        sdfs, gradients, closest_indices = call(_scene_sdfs_with_gradients, td.scene_sphere_ext_mats, td.sphere_radii,
+                                                td.cuboid_ext_mats, td.cuboid_dims, td.scene_query_positions)
+        sphere_sdfs, sphere_gradients, sphere_indices = ivy_sdf.sphere_signed_distances_with_gradients(
+            td.sphere_positions, td.sphere_radii, td.scene_query_positions, f=ivy_np)
+        cuboid_sdfs, cuboid_gradients, cuboid_indices = ivy_sdf.cuboid_signed_distances_with_gradients(
+            td.cuboid_ext_mats, td.cuboid_dims, td.scene_query_positions, f=ivy_np)
+        sphere_closest = sphere_sdfs <= cuboid_sdfs
+        assert np.allclose(sdfs, np.minimum(sphere_sdfs, cuboid_sdfs), atol=1e-6)
+        assert np.allclose(gradients, np.where(sphere_closest, sphere_gradients, cuboid_gradients), atol=1e-6)
+        assert np.array_equal(closest_indices, np.where(sphere_closest, sphere_indices, cuboid_indices + 2))
@@ -41,6 +41,29 @@ def test_get_uniform_pixel_coords_image():
         call(ivy_svg.create_uniform_pixel_coords_image, td.image_dims, (td.num_cameras,), True, f=lib)
 
 
+def test_cached_uniform_pixel_coords_image():
+    for lib, call in helpers.calls:
+        if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
+            # symbolic tensors are never cached
+            continue
+        ivy_svg.clear_uniform_pixel_coords_cache()
+        for _ in range(2):
+            assert np.array_equal(
+                call(ivy_svg.cached_uniform_pixel_coords_image, td.image_dims, (td.batch_size, td.num_cameras),
+                     f=lib), td.uniform_pixel_coords)
+        assert np.array_equal(call(ivy_svg.cached_uniform_pixel_coords_image, td.image_dims, (td.num_cameras,),
+                                   f=lib), td.uniform_pixel_coords[0])
+        cache_info = ivy_svg.uniform_pixel_coords_cache_info()
+        assert cache_info['misses'] == 3
+        assert cache_info['hits'] == 2
+        assert cache_info['size'] == 3
+        ivy_svg.set_uniform_pixel_coords_cache_size(1)
+        assert ivy_svg.uniform_pixel_coords_cache_info()['size'] == 1
+        ivy_svg.set_uniform_pixel_coords_cache_size(ivy_svg.UNIFORM_PIXEL_COORDS_CACHE_SIZE)
+        ivy_svg.clear_uniform_pixel_coords_cache()
+        assert ivy_svg.uniform_pixel_coords_cache_info()['size'] == 0
+
+
 def test_persp_angles_to_focal_lengths():
     for lib, call in helpers.calls:
         if call is helpers.mx_graph_call:
@@ -1,10 +1,13 @@
 # global
+import os
+import tempfile
 import numpy as np
 import ivy.numpy as ivy_np
 
 # local
 import ivy_vision_tests.helpers as helpers
 import ivy_vision.voxel_grids as ivy_vg
+from ivy_vision.containers import CameraGeometry
 from ivy_vision_tests.data import TestData
 
 
@@ -58,6 +61,28 @@ class VoxelGridsTestData(TestData):
         # world coords
         self.world_coords_flat = np.reshape(self.world_coords, (1, 2, 480*640, 4))
 
+        # tsdf
+        self.wall_depth_image = np.ones((8, 8, 1)) * 2.
+        self.wall_full_mat = np.array([[4., 0., 3.5, 0.],
+                                       [0., 4., 3.5, 0.],
+                                       [0., 0., 1., 0.],
+                                       [0., 0., 0., 1.]])
+        self.wall_inv_full_mat = np.linalg.inv(self.wall_full_mat)
+        self.wall_voxel_depths = (np.arange(8) + 0.5) * 0.5
+        self.wall_tsdf = 2. - self.wall_voxel_depths
+
+        # ray casting
+        self.slab_voxel_grid = np.zeros((4, 4, 4, 5))
+        self.slab_voxel_grid[:, :, 2, 3] = 7.
+        self.slab_voxel_grid[:, :, 2, 4] = 1.
+        self.slab_full_mat = np.array([[2., 0., 1.5, 0.],
+                                       [0., 2., 1.5, 0.],
+                                       [0., 0., 1., 0.],
+                                       [0., 0., 0., 1.]])
+        self.slab_inv_full_mat = np.linalg.inv(self.slab_full_mat)
+        self.slab_validity = np.zeros((4, 4, 1), dtype=bool)
+        self.slab_validity[1:3, 1:3] = True
+
 
 td = VoxelGridsTestData()
 
@@ -98,3 +123,321 @@ def test_world_coords_to_bounding_voxel_grid():
         assert np.allclose(
             call(ivy_vg.coords_to_voxel_grid, td.simple_world_coords_flat, (3, 3, 3),
                  features=td.simple_world_features_flat)[0][..., 3], td.simple_voxel_grid, atol=1e-6)
+
+
+def test_voxel_morton_codes():
+    for lib, call in helpers.calls:
+        voxel_indices = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 1], [2, 0, 0], [3, 2, 1]])
+        assert np.array_equal(call(ivy_vg.voxel_morton_codes, voxel_indices), np.array([0, 1, 2, 4, 7, 8, 29]))
+        if call is helpers.jnp_call:
+            # jax only supports 64 bit integers with 64 bit types enabled
+            continue
+        voxel_indices = np.array([[2 ** 11, 0, 0], [0, 0, 2 ** 11], [2 ** 20, 0, 1]])
+        assert np.array_equal(call(ivy_vg.voxel_morton_codes, voxel_indices, 21),
+                              np.array([2 ** 33, 2 ** 35, 2 ** 60 + 4]))
+
+
+def test_coords_to_voxel_grid_morton_order():
+    for lib, call in helpers.calls:
+        if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
+            # the host-side sort of the morton codes makes this only valid in eager mode
+            continue
+        if call is helpers.mx_call:
+            # mxnet does not support sum for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        for coords, batch_shape, kwargs in [(td.simple_world_coords_flat, [], {}),
+                                            (td.simple_world_coords_batched_flat, [2],
+                                             {'coord_bounds': [0.5]*3 + [2.5]*3})]:
+            voxel_grid = ivy_vg.coords_to_voxel_grid(coords, (3, 3, 3), f=ivy_np, **kwargs)[0]
+            morton_voxel_grid, _, res, lower, order = call(ivy_vg.coords_to_voxel_grid, coords, (3, 3, 3),
+                                                           morton_order=True, **kwargs)
+            assert np.allclose(morton_voxel_grid, voxel_grid, atol=1e-6)
+            assert order.shape == (np.sum(voxel_grid[..., -1]), len(batch_shape) + 1)
+            batch_indices = tuple(order[:, :-1].T)
+            voxel_indices = np.minimum(np.floor((coords[tuple(order.T)][:, 0:3] - lower[batch_indices]) /
+                                                res[batch_indices]), 2).astype(np.int32)
+            sort_keys = ivy_vg.voxel_morton_codes(voxel_indices, f=ivy_np)
+            if batch_shape:
+                sort_keys = np.reshape(order[:, :-1], (-1,)) * 2 ** 30 + sort_keys
+            assert np.all(np.diff(sort_keys) >= 0)
+
+        if call is helpers.jnp_call:
+            # jax only supports 64 bit integers with 64 bit types enabled
+            continue
+        # grids with more than 2^10 voxels along an axis use 64 bit codes
+        coords = np.array([[0., 0., 0., 1.], [4000., 0., 0., 1.], [1., 0., 0., 1.], [3000., 1., 1., 1.]], np.float32)
+        order = call(ivy_vg.coords_to_voxel_grid, coords, (1, 1, 1), 'RES', morton_order=True)[-1]
+        assert np.array_equal(np.reshape(order, (-1,)), np.array([0, 2, 3, 1]))
+
+
+def test_coords_to_voxel_grid_chunked():
+    for lib, call in helpers.calls:
+        if call is helpers.mx_call:
+            # mxnet does not support sum for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        # the smallest budgets holding the grid and a single co-ordinate
+        for coords, features, kwargs, min_budget in [(td.simple_world_coords_flat, None, {}, 2124),
+                                                     (td.simple_world_coords_flat, td.simple_world_features_flat,
+                                                      {'coord_bounds': [-1]*3 + [4]*3}, 2568),
+                                                     (td.simple_world_coords_batched_flat, None,
+                                                      {'coord_bounds': [0.5]*3 + [2.5]*3}, 4480)]:
+            voxel_grid = ivy_vg.coords_to_voxel_grid(coords, (3, 3, 3), features=features, f=ivy_np, **kwargs)[0]
+            # small budget, one co-ordinate per chunk
+            assert np.allclose(call(ivy_vg.coords_to_voxel_grid_chunked, coords, (3, 3, 3), features=features,
+                                    memory_budget=min_budget, **kwargs)[0], voxel_grid, atol=1e-6)
+            # default budget, single chunk
+            assert np.allclose(call(ivy_vg.coords_to_voxel_grid_chunked, coords, (3, 3, 3), features=features,
+                                    **kwargs)[0], voxel_grid, atol=1e-6)
+            # budget too small for the grid
+            rejected = False
+            try:
+                call(ivy_vg.coords_to_voxel_grid_chunked, coords, (3, 3, 3), features=features,
+                     memory_budget=min_budget - 1, **kwargs)
+            except Exception:
+                rejected = True
+            assert rejected
+
+
+def test_coords_to_sparse_voxel_grid():
+    for lib, call in helpers.calls:
+        if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
+            # the need to dynamically infer the number of occupied voxels makes this only valid in eager mode
+            continue
+        if call is helpers.mx_call:
+            # mxnet does not support sum for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        for coords, batch_shape, kwargs in [(td.simple_world_coords_flat, [], {}),
+                                            (td.simple_world_coords_flat, [], {'coord_bounds': [-1]*3 + [4]*3}),
+                                            (td.simple_world_coords_batched_flat, [2],
+                                             {'coord_bounds': [0.5]*3 + [2.5]*3})]:
+            voxel_grid = ivy_vg.coords_to_voxel_grid(coords, (3, 3, 3), f=ivy_np, **kwargs)[0]
+            voxel_keys, voxel_values, dims, _, _ = call(ivy_vg.coords_to_sparse_voxel_grid, coords, (3, 3, 3),
+                                                        **kwargs)
+            assert voxel_keys.shape[0] == np.sum(voxel_grid[..., -1] > 0)
+            assert np.array_equal(dims, np.ones(batch_shape + [3]) * 3)
+            assert np.allclose(call(ivy_vg.sparse_voxel_grid_to_dense, voxel_keys, voxel_values, [0, 0, 0],
+                                    [3, 3, 3], batch_shape), voxel_grid, atol=1e-6)
+            assert np.allclose(call(ivy_vg.sparse_voxel_grid_to_dense, voxel_keys, voxel_values, [1, 0, 1],
+                                    [2, 2, 2], batch_shape), voxel_grid[..., 1:3, 0:2, 1:3, :], atol=1e-6)
+
+
+def test_coords_to_ragged_voxel_grid():
+    for lib, call in helpers.calls:
+        if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
+            # the need to dynamically infer array shapes for scatter makes this only valid in eager mode currently
+            continue
+        coords = np.stack((td.simple_world_coords_flat, td.simple_world_coords_flat * np.array([0.5, 0.5, 0.5, 1.])))
+        voxel_grid, dims, _, _ = ivy_vg.coords_to_voxel_grid(coords, (1, 1, 1), 'RES', f=ivy_np)
+        voxel_grid_flat, offsets, ragged_dims, _, _ = call(ivy_vg.coords_to_ragged_voxel_grid, coords, (1, 1, 1),
+                                                           'RES')
+        assert np.array_equal(ragged_dims, np.array([[3, 3, 3], [2, 2, 2]]))
+        assert np.array_equal(offsets, np.array([0, 27]))
+        assert voxel_grid_flat.shape[0] == 35
+        for i in range(2):
+            x, y, z = dims[i]
+            assert np.allclose(call(ivy_vg.ragged_voxel_grid_element, voxel_grid_flat, offsets, ragged_dims, [i]),
+                               voxel_grid[i, 0:x, 0:y, 0:z], atol=1e-6)
+
+
+def test_voxel_neighbourhood_index():
+
+    def _query(coords, queries, radius):
+        index = ivy_vg.VoxelNeighbourhoodIndex(coords, (3, 3, 3), 'DIMS')
+        point_indices, query_indices = index.query(queries, radius)
+        return point_indices, query_indices, index.dims, index.res, index.lower_corner
+
+    for lib, call in helpers.calls:
+        if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
+            # the host-side index construction and lookup makes this only valid in eager mode
+            continue
+        for coords, batch_shape in [(td.simple_world_coords_flat, []), (td.simple_world_coords_batched_flat, [2])]:
+            queries = coords[..., 0:3]
+            for radius in [0, 1, 3]:
+                point_indices, query_indices, dims, res, lower = call(_query, coords, queries, radius)
+
+                # brute force
+                voxel_indices = np.floor((np.reshape(queries, (-1, 4, 3)) - np.reshape(lower, (-1, 1, 3))) /
+                                         (np.reshape(res, (-1, 1, 3)) + ivy_vg.MIN_DENOMINATOR))
+                voxel_indices = np.minimum(voxel_indices, np.reshape(dims, (-1, 1, 3)) - 1)
+                true_pairs = set()
+                for b in range(voxel_indices.shape[0]):
+                    batch_index = (b,) if batch_shape else ()
+                    for i in range(4):
+                        for j in range(4):
+                            if np.max(np.abs(voxel_indices[b, i] - voxel_indices[b, j])) <= radius:
+                                true_pairs.add(batch_index + (j,) + batch_index + (i,))
+
+                pairs = set([tuple(p) + tuple(q) for p, q in zip(point_indices, query_indices)])
+                assert len(pairs) == point_indices.shape[0]
+                assert pairs == true_pairs
+
+            # queries outside of the grid are not associated with the boundary voxels
+            point_indices, _, _, _, _ = call(_query, coords, queries + 100., 1)
+            assert point_indices.shape[0] == 0
+
+
+def test_tsdf_volume():
+
+    def _integrate(depth_image, full_mat, inv_full_mat, num_frames, f):
+        cam_geom = CameraGeometry(None, None, full_mat, inv_full_mat)
+        tsdf_volume = ivy_vg.TSDFVolume([-2., -2., 0.], [8, 8, 8], 0.5, 1., f=f)
+        for _ in range(num_frames):
+            tsdf_volume.integrate(depth_image, cam_geom)
+        return tsdf_volume.tsdf, tsdf_volume.weights
+
+    for lib, call in helpers.calls:
+        if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
+            # the frustum sub-block shape is inferred from the depth values, which is only valid in eager mode
+            continue
+        for num_frames in [1, 2]:
+            tsdf, weights = call(_integrate, td.wall_depth_image, td.wall_full_mat, td.wall_inv_full_mat, num_frames,
+                                 lib)
+            observed = weights[..., 0] > 0
+            observed_depth_indices = np.unique(np.nonzero(observed)[2])
+            assert np.array_equal(observed_depth_indices, np.array([2, 3, 4, 5]))
+            assert np.all(weights[observed] == num_frames)
+            assert np.allclose(tsdf[..., 0], np.where(observed, td.wall_tsdf, 1.), atol=1e-5)
+
+
+def test_voxel_grid_pyramid():
+    for lib, call in helpers.calls:
+        if call is helpers.mx_graph_call:
+            # mxnet symbolic does not fully support array slicing
+            continue
+        for coords, batch_shape in [(td.simple_world_coords_flat, []), (td.simple_world_coords_batched_flat, [2])]:
+            voxel_grid = ivy_vg.coords_to_voxel_grid(coords, (4, 4, 4), coord_bounds=[0.]*3 + [4.]*3,
+                                                     features=np.ones(batch_shape + [4, 1]), f=ivy_np)[0]
+            coarse_voxel_grid = ivy_vg.coords_to_voxel_grid(coords, (2, 2, 2), coord_bounds=[0.]*3 + [4.]*3,
+                                                            features=np.ones(batch_shape + [4, 1]), f=ivy_np)[0]
+            voxel_grids = call(ivy_vg.voxel_grid_pyramid, voxel_grid, 3)
+            assert len(voxel_grids) == 3
+            assert np.allclose(voxel_grids[0], voxel_grid, atol=1e-6)
+            assert np.allclose(voxel_grids[1], coarse_voxel_grid, atol=1e-5)
+            assert np.allclose(voxel_grids[2][..., 0, 0, 0, -1], np.sum(voxel_grid[..., -1], (-3, -2, -1)), atol=1e-6)
+
+
+def test_sparse_voxel_grid_pyramid():
+    for lib, call in helpers.calls:
+        if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
+            # the need to dynamically infer the number of occupied voxels makes this only valid in eager mode
+            continue
+        if call is helpers.mx_call:
+            # mxnet does not support sum for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        for coords, batch_shape in [(td.simple_world_coords_flat, []), (td.simple_world_coords_batched_flat, [2])]:
+            voxel_keys, voxel_values, _, _, _ = ivy_vg.coords_to_sparse_voxel_grid(
+                coords, (4, 4, 4), coord_bounds=[0.]*3 + [4.]*3, f=ivy_np)
+            coarse_voxel_grid = ivy_vg.coords_to_voxel_grid(coords, (2, 2, 2), coord_bounds=[0.]*3 + [4.]*3,
+                                                            f=ivy_np)[0]
+            keys_list, values_list, parent_indices_list = call(ivy_vg.sparse_voxel_grid_pyramid, voxel_keys,
+                                                               voxel_values, 2)
+            assert np.array_equal(keys_list[1][parent_indices_list[0]][:, -3:], voxel_keys[:, -3:] // 2)
+            assert np.allclose(ivy_vg.sparse_voxel_grid_to_dense(keys_list[1], values_list[1], [0, 0, 0], [2, 2, 2],
+                                                                 batch_shape, f=ivy_np), coarse_voxel_grid, atol=1e-5)
+
+
+def test_ray_cast_voxel_grid():
+
+    def _ray_cast(voxel_grid, dims, res, lower_corner, full_mat, inv_full_mat):
+        return ivy_vg.ray_cast_voxel_grid(voxel_grid, dims, res, lower_corner,
+                                          CameraGeometry(None, None, full_mat, inv_full_mat), [4, 4], batch_shape=[])
+
+    for lib, call in helpers.calls:
+        if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
+            # the number of active rays is inferred at every step, which is only valid in eager mode
+            continue
+        if call is helpers.mx_call:
+            # mxnet does not support indices_where
+            continue
+        depth, features, validity = call(_ray_cast, td.slab_voxel_grid, np.array([4, 4, 4]), np.array([0.5] * 3),
+                                         np.array([-1., -1., 1.]), td.slab_full_mat, td.slab_inv_full_mat)
+        assert np.array_equal(validity, td.slab_validity)
+        assert np.allclose(depth, np.where(td.slab_validity, 2., 0.), atol=1e-5)
+        assert np.allclose(features, np.where(td.slab_validity, 7., 0.), atol=1e-5)
+
+
+def test_voxel_downsample_coords():
+    for lib, call in helpers.calls:
+        if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
+            # the need to dynamically infer the number of occupied voxels makes this only valid in eager mode
+            continue
+        if call is helpers.mx_call:
+            # mxnet does not support sum for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        coords = np.array([[0.1, 0.1, 0.1, 1.], [1.9, 1.9, 1.9, 1.], [0.3, 0.3, 0.3, 1.]])
+        features = np.array([[1.], [5.], [3.]])
+        points, batch_indices = call(ivy_vg.voxel_downsample_coords, coords, (1., 1., 1.), features=features)
+        assert np.allclose(points, np.array([[0.2, 0.2, 0.2, 2.], [1.9, 1.9, 1.9, 5.]]), atol=1e-6)
+        assert batch_indices.shape == (2, 0)
+        shifted_coords = coords + np.array([1., 1., 1., 0.])
+        points, batch_indices = call(ivy_vg.voxel_downsample_coords, np.stack((coords, shifted_coords)), (1., 1., 1.))
+        assert np.allclose(points, np.array([[0.2, 0.2, 0.2], [1.9, 1.9, 1.9], [1.2, 1.2, 1.2], [2.9, 2.9, 2.9]]),
+                           atol=1e-6)
+        assert np.array_equal(batch_indices, np.array([[0], [0], [1], [1]]))
+
+
+def test_save_and_load_voxel_grid():
+
+    def _save_and_load(coords, dir_path, f):
+        voxel_grid, dims, res, lower = ivy_vg.coords_to_voxel_grid(coords, (3, 3, 3),
+                                                                   coord_bounds=[0.5]*3 + [2.5]*3)
+        ivy_vg.save_voxel_grid(dir_path, voxel_grid, dims, res, lower)
+        region, region_lower = ivy_vg.load_voxel_grid_region(dir_path, [1, 0, 1], [3, 2, 3], f=f)
+        return voxel_grid, dims, res, lower, region, region_lower
+
+    for lib, call in helpers.calls:
+        if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
+            # saving requires concrete arrays, which is only valid in eager mode
+            continue
+        if call is helpers.mx_call:
+            # mxnet does not support sum for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dir_path = os.path.join(tmp_dir, 'voxel_grid')
+            voxel_grid, dims, res, lower, region, region_lower = call(
+                _save_and_load, td.simple_world_coords_batched_flat, dir_path, lib)
+            loaded_voxel_grid, loaded_dims, loaded_res, loaded_lower = ivy_vg.load_voxel_grid(dir_path)
+            assert isinstance(loaded_voxel_grid, np.memmap)
+            assert np.allclose(loaded_voxel_grid, voxel_grid)
+            assert np.array_equal(loaded_dims, dims)
+            assert np.allclose(loaded_res, res)
+            assert np.allclose(loaded_lower, lower)
+            assert np.allclose(region, voxel_grid[..., 1:3, 0:2, 1:3, :])
+            assert np.allclose(region_lower, lower + res * np.array([1, 0, 1]))
+            del loaded_voxel_grid
+            # regions outside of the saved grid are rejected
+            for lower_indices, upper_indices in [([-1, 0, 0], [2, 2, 2]), ([0, 0, 0], [2, 4, 2]),
+                                                 ([2, 0, 0], [2, 2, 2])]:
+                rejected = False
+                try:
+                    ivy_vg.load_voxel_grid_region(dir_path, lower_indices, upper_indices, f=ivy_np)
+                except Exception:
+                    rejected = True
+                assert rejected
+
+
+def test_save_and_load_sparse_voxel_grid():
+
+    def _save(coords, dir_path):
+        sparse_voxel_grid = ivy_vg.coords_to_sparse_voxel_grid(coords, (3, 3, 3), coord_bounds=[0.5]*3 + [2.5]*3)
+        ivy_vg.save_sparse_voxel_grid(dir_path, *sparse_voxel_grid)
+        return sparse_voxel_grid
+
+    for lib, call in helpers.calls:
+        if call in [helpers.tf_graph_call, helpers.mx_graph_call]:
+            # the need to dynamically infer the number of occupied voxels makes this only valid in eager mode
+            continue
+        if call is helpers.mx_call:
+            # mxnet does not support sum for scatter nd, only non-deterministic replacement for duplicates
+            continue
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dir_path = os.path.join(tmp_dir, 'sparse_voxel_grid')
+            sparse_voxel_grid = call(_save, td.simple_world_coords_batched_flat, dir_path)
+            loaded = ivy_vg.load_sparse_voxel_grid(dir_path)
+            for loaded_array, array in zip(loaded, sparse_voxel_grid):
+                assert np.allclose(loaded_array, array)
+            assert np.allclose(ivy_vg.sparse_voxel_grid_to_dense(loaded[0], loaded[1], [0, 0, 0], [3, 3, 3], [2],
+                                                                 f=ivy_np),
+                               ivy_vg.sparse_voxel_grid_to_dense(sparse_voxel_grid[0], sparse_voxel_grid[1], [0, 0, 0],
+                                                                 [3, 3, 3], [2], f=ivy_np), atol=1e-6)
+            del loaded